@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import logging
+import resource
+import tempfile
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'etl'))
+
+from weather_etl.transform import transform_hourly_frame
+from weather_etl.arrow import block_table, concat_tables, transform_hourly_table, write_staging
+
+logging.basicConfig(level=logging.INFO)
+
+HOURLY_VARIABLES = [
+    'temperature_2m', 'relative_humidity_2m', 'dew_point_2m', 'apparent_temperature', 'precipitation',
+    'weather_code', 'cloud_cover', 'wind_speed_10m', 'wind_direction_10m', 'wind_gusts_10m', 'is_day',
+    'sunshine_duration',
+]
+
+# minimal stand-ins for the Open-Meteo SDK objects, holding float32 buffers like the real client
+class Variable:
+    def __init__(self, values):
+        self.values = values
+
+    def ValuesAsNumpy(self):
+        return self.values
+
+class Block:
+    def __init__(self, start, n_rows, interval, variables):
+        self.start, self.n_rows, self.interval, self.variables = start, n_rows, interval, variables
+
+    def Time(self):
+        return self.start
+
+    def TimeEnd(self):
+        return self.start + self.n_rows * self.interval
+
+    def Interval(self):
+        return self.interval
+
+    def Variables(self, idx):
+        return Variable(self.variables[idx])
+
+def make_blocks(years, locations):
+    n_rows = years * 365 * 24
+    blocks = []
+    for location in range(locations):
+        rng = np.random.default_rng(location)
+        variables = [(rng.random(n_rows) * 40).astype(np.float32) for _ in HOURLY_VARIABLES]
+        variables[HOURLY_VARIABLES.index('weather_code')] = rng.choice([0, 1, 3, 61, 95], n_rows).astype(np.float32)
+        variables[HOURLY_VARIABLES.index('is_day')] = rng.choice([0, 1], n_rows).astype(np.float32)
+        blocks.append((f'loc{location}', Block(1577836800, n_rows, 3600, variables)))
+    return blocks
+
+def pandas_path(blocks, staging_dir):
+    frames = []
+    for location_id, block in blocks:
+        data = {variable: block.Variables(idx).ValuesAsNumpy() for idx, variable in enumerate(HOURLY_VARIABLES)}
+        data['date'] = pd.date_range(
+            start=pd.to_datetime(block.Time(), unit='s', utc=True),
+            end=pd.to_datetime(block.TimeEnd(), unit='s', utc=True),
+            freq=pd.Timedelta(seconds=block.Interval()),
+            inclusive='left'
+        )
+        df = pd.DataFrame(data)
+        df.insert(0, 'location_id', location_id)
+        frames.append(df)
+    df = transform_hourly_frame(pd.concat(frames, ignore_index=True))
+    # load_table_from_dataframe serializes the frame to parquet before uploading
+    df.to_parquet(os.path.join(staging_dir, 'pandas.parquet'), index=False)
+    return df.shape[0]
+
+def arrow_path(blocks, staging_dir):
+    table = concat_tables([
+        block_table(block, {variable: block.Variables(idx).ValuesAsNumpy() for idx, variable in enumerate(HOURLY_VARIABLES)}, location_id)
+        for location_id, block in blocks
+    ])
+    table = transform_hourly_table(table)
+    write_staging(table, 'hourly', {'start_date': 'bench', 'end_date': 'bench'}, staging_dir)
+    return table.num_rows
+
+def measure(name, years, locations, queue):
+    logging.getLogger().setLevel(logging.WARNING)
+    blocks = make_blocks(years, locations)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with tempfile.TemporaryDirectory() as staging_dir:
+        start = time.perf_counter()
+        n_rows = {'pandas': pandas_path, 'arrow': arrow_path}[name](blocks, staging_dir)
+        elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    queue.put((n_rows, elapsed, peak / 1024))
+
+def run(years, locations):
+    # each path runs in a fresh process so its peak RSS is not hidden by the other's
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for name in ['pandas', 'arrow']:
+        queue = context.Queue()
+        process = context.Process(target=measure, args=(name, years, locations, queue))
+        process.start()
+        results[name] = queue.get()
+        process.join()
+
+    n_rows = results['pandas'][0]
+    logging.info(f'{years} years x {locations} locations = {n_rows:,} rows')
+    for name, (_, elapsed, peak) in results.items():
+        logging.info(f'{name}: {elapsed:.2f}s, peak memory +{peak:.0f} MB')
+    (_, pandas_time, pandas_peak), (_, arrow_time, arrow_peak) = results['pandas'], results['arrow']
+    logging.info(f'arrow vs pandas: {pandas_time / arrow_time:.1f}x faster, {pandas_peak / max(arrow_peak, 1):.1f}x less peak memory')
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5, int(sys.argv[2]) if len(sys.argv) > 2 else 10)
@@ -0,0 +1,81 @@
+import os
+import re
+import subprocess
+import sys
+import time
+import logging
+
+ETL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'etl')
+
+logging.basicConfig(level=logging.INFO)
+
+# import time one CLI start may add to the interpreter's own startup
+STARTUP_BUDGET_MS = float(os.getenv('CLI_STARTUP_BUDGET_MS', 100))
+REPEATS = int(os.getenv('CLI_STARTUP_REPEATS', 5))
+# none of these may be imported before a subcommand actually loads or fetches data
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'google', 'openmeteo_requests', 'openmeteo_sdk', 'requests_cache', 'duckdb']
+COMMANDS = [
+    ['--help'],
+    ['hourly', '--dry-run'],
+    ['daily', '--dry-run'],
+    ['combined', '--dry-run'],
+    ['backfill', 'hourly', '--start', '2024-01-01', '--end', '2024-12-31', '--dry-run'],
+    ['dims', '--dry-run'],
+    ['rollups', '--dry-run'],
+    ['climatology', '--dry-run'],
+    ['schedule', '--dry-run'],
+]
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+def import_times(stderr):
+    # module -> (cumulative microseconds, nesting depth), depth 1 being a top-level import
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(2)), len(match.group(3)))
+    return modules
+
+def importtime(args):
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [ETL_DIR, os.getenv('PYTHONPATH')]))}
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', *args], capture_output=True, text=True, env=env, cwd=ETL_DIR)
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} exited with {result.returncode}: {result.stderr[-500:]}")
+    return wall_ms, import_times(result.stderr)
+
+def cli_import_ms(modules, interpreter_modules):
+    # what the interpreter imports on its own (site, encodings, ...) is not the CLI's startup cost
+    return sum(
+        cumulative for name, (cumulative, depth) in modules.items() if depth == 1 and name not in interpreter_modules
+    ) / 1000
+
+def run():
+    _, interpreter_modules = importtime(['-c', 'pass'])
+    logging.info(f'startup budget: {STARTUP_BUDGET_MS:.0f}ms of imports beyond the bare interpreter, best of {REPEATS}')
+    failures = []
+    for args in COMMANDS:
+        runs = [importtime(['-m', 'weather_etl', *args]) for _ in range(REPEATS)]
+        wall_ms = min(wall for wall, _ in runs)
+        import_ms = min(cli_import_ms(modules, interpreter_modules) for _, modules in runs)
+        modules = runs[0][1]
+        heavy = sorted({name.split('.')[0] for name in modules} & set(HEAVY_MODULES))
+        slowest = sorted(
+            (cumulative, name) for name, (cumulative, depth) in modules.items()
+            if depth == 1 and name not in interpreter_modules
+        )[::-1][:3]
+        logging.info(
+            f"weather-etl {' '.join(args)}: imports {import_ms:.1f}ms, wall {wall_ms:.0f}ms, "
+            f"slowest {', '.join(f'{name} {cumulative / 1000:.1f}ms' for cumulative, name in slowest)}"
+        )
+        if heavy:
+            failures.append(f"weather-etl {' '.join(args)} imported {', '.join(heavy)}")
+        if import_ms > STARTUP_BUDGET_MS:
+            failures.append(f"weather-etl {' '.join(args)} spent {import_ms:.1f}ms importing, over the {STARTUP_BUDGET_MS:.0f}ms budget")
+    for failure in failures:
+        logging.error(failure)
+    return not failures
+
+if __name__ == '__main__':
+    sys.exit(0 if run() else 1)
@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dashboard'))
+
+from downsample import downsample_frame, point_budget
+
+logging.basicConfig(level=logging.INFO)
+
+MEASURES = ['temperature_2m', 'relative_humidity_2m', 'wind_speed_10m', 'precipitation']
+
+def make_frame(years, locations):
+    n_rows = years * 365 * 24
+    frames = []
+    for location in range(locations):
+        rng = np.random.default_rng(location)
+        df = pd.DataFrame({'period': pd.date_range('2020-01-01', periods=n_rows, freq='h'), 'location_id': f'loc{location}'})
+        for measure in MEASURES:
+            df[measure] = 25 + np.cumsum(rng.normal(scale=0.3, size=n_rows))
+        df['precipitation'] = np.where(rng.random(n_rows) > 0.95, rng.gamma(2, 4, n_rows), 0)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+def payload_bytes(df):
+    # roughly what plotly serializes: one x and one y list per trace
+    traces = [
+        {'x': group['period'].astype(str).tolist(), 'y': group['value'].tolist()}
+        for _, group in df.groupby(['location_id', 'measure'])
+    ]
+    return len(json.dumps(traces))
+
+def run(years, locations, width_px):
+    df = make_frame(years, locations)
+    raw = df.melt(id_vars=['period', 'location_id'], value_vars=MEASURES, var_name='measure')
+    start = time.perf_counter()
+    sampled = downsample_frame(df, 'period', MEASURES, point_budget(width_px), by='location_id')
+    elapsed = time.perf_counter() - start
+    raw_bytes, sampled_bytes = payload_bytes(raw), payload_bytes(sampled)
+    logging.info(f'{years} years x {locations} locations x {len(MEASURES)} measures, {width_px}px chart')
+    logging.info(f'points: {len(raw):,} -> {len(sampled):,} in {elapsed * 1000:.0f} ms')
+    logging.info(f'payload: {raw_bytes / 1024 ** 2:.1f} MB -> {sampled_bytes / 1024 ** 2:.2f} MB ({raw_bytes / sampled_bytes:.0f}x)')
+
+if __name__ == '__main__':
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 2,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 1200,
+    )
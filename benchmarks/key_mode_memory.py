@@ -0,0 +1,53 @@
+import os
+import sys
+import logging
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'etl'))
+
+from weather_etl.transform import transform_hourly_frame
+from transform_benchmark import make_hourly_frame
+
+logging.basicConfig(level=logging.INFO)
+
+WEATHER_CODE_NAMES = {0: 'Clear sky', 1: 'Mainly clear', 2: 'Partly cloudy', 3: 'Overcast', 51: 'Drizzle: Light',
+                      61: 'Rain: Slight', 63: 'Rain: Moderate', 80: 'Rain showers: Slight', 95: 'Thunderstorm: Slight'}
+IS_DAY_NAMES = {0: 'Night', 1: 'Day'}
+
+def megabytes(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+def dashboard_frame(df, compact):
+    # shape of the dashboard result: dimension names instead of codes
+    codes = df['weather_code'].astype(int)
+    is_day = df['is_day'].astype(int)
+    result = df.drop(columns=['id']).assign(
+        weather_code=codes.map(WEATHER_CODE_NAMES),
+        is_day=is_day.map(IS_DAY_NAMES),
+    )
+    if not compact:
+        return result.astype({col: object for col in ['weather_code', 'is_day']})
+    measures = result.select_dtypes(include='number').columns.difference(['date_id', 'time_id'])
+    return result.astype({'weather_code': 'category', 'is_day': 'category', **{col: 'float32' for col in measures}})
+
+def run(years, locations):
+    n_rows = years * 365 * 24
+    frames = {}
+    for compact in (False, True):
+        parts = []
+        for location in range(locations):
+            df = make_hourly_frame(n_rows, seed=location)
+            df.insert(0, 'location_id', f'loc{location}')
+            parts.append(transform_hourly_frame(df, compact=compact))
+        frames[compact] = pd.concat(parts, ignore_index=True)
+
+    string_etl, compact_etl = megabytes(frames[False]), megabytes(frames[True])
+    string_dash = megabytes(dashboard_frame(frames[False], compact=False))
+    compact_dash = megabytes(dashboard_frame(frames[True], compact=True))
+    logging.info(f'{years} years x {locations} locations = {len(frames[False]):,} rows')
+    logging.info(f'ETL frame: string keys {string_etl:.1f} MB, compact keys {compact_etl:.1f} MB ({string_etl / compact_etl:.1f}x)')
+    logging.info(f'dashboard frame: object {string_dash:.1f} MB, compact {compact_dash:.1f} MB ({string_dash / compact_dash:.1f}x)')
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5, int(sys.argv[2]) if len(sys.argv) > 2 else 10)
@@ -0,0 +1,401 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import multiprocessing
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'etl'))
+
+logging.basicConfig(level=logging.INFO)
+
+BASELINE_PATH = os.getenv('BENCH_BASELINE_PATH', os.path.join(BENCH_DIR, 'baselines', 'pipeline.json'))
+REGRESSION_THRESHOLD = float(os.getenv('BENCH_REGRESSION_THRESHOLD', 0.2))
+# a stage has to lose at least this much as well, a 50% swing on 3ms is timer and scheduler noise
+NOISE_FLOOR_SECONDS = float(os.getenv('BENCH_NOISE_FLOOR_SECONDS', 0.05))
+REPEATS = int(os.getenv('BENCH_REPEATS', 3))
+# cases above this many rows run once, they take long enough to be stable and too long to repeat
+REPEAT_MAX_ROWS = int(os.getenv('BENCH_REPEAT_MAX_ROWS', 5_000_000))
+START_DATE = '2020-01-01'
+# name -> (locations, days)
+SIZES = {
+    'location_day': (1, 1),
+    'small': (10, 30),
+    'medium': (100, 365),
+    'large': (1000, 5 * 365),
+}
+DEFAULT_SIZES = ['location_day', 'small', 'medium']
+PIPELINES = ['hourly', 'hourly_arrow', 'daily', 'dashboard']
+# the dashboard case charts a few measures over everything the hourly pipeline loaded
+DASHBOARD_MEASURES = ['temperature_2m', 'relative_humidity_2m', 'precipitation', 'wind_speed_10m', 'weather_code', 'is_day']
+TABLE_ENVS = [
+    'HOURLY_WEATHER_TABLE', 'DAILY_WEATHER_TABLE', 'AIR_QUALITY_TABLE', 'WIDE_WEATHER_TABLE', 'DAILY_ROLLUP_TABLE',
+    'MONTHLY_ROLLUP_TABLE', 'DATE_TABLE', 'TIME_TABLE', 'TIMESHIFT_TABLE', 'WEATHER_CODE_TABLE',
+]
+# the replica opens every configured table, so the dashboard case configures only the tables it loads
+DASHBOARD_TABLE_ENVS = [
+    'HOURLY_WEATHER_TABLE', 'DAILY_WEATHER_TABLE', 'DATE_TABLE', 'TIME_TABLE', 'TIMESHIFT_TABLE', 'WEATHER_CODE_TABLE',
+]
+MAPPING_FILE = os.getenv('MAPPING_FILE', os.path.join(BENCH_DIR, '..', 'weather mapping.xlsx'))
+
+# stand-ins for the Open-Meteo SDK objects the extract step reads, carrying the same metadata and buffers
+class SyntheticVariable:
+    def __init__(self, metadata, values):
+        self.variable, self.altitude, self.aggregation = metadata
+        self.values = values
+
+    def Variable(self):
+        return self.variable
+
+    def Altitude(self):
+        return self.altitude
+
+    def Aggregation(self):
+        return self.aggregation
+
+    def ValuesAsNumpy(self):
+        return self.values.astype(np.float32, copy=False)
+
+    def ValuesInt64AsNumpy(self):
+        return self.values.astype(np.int64, copy=False)
+
+class SyntheticBlock:
+    def __init__(self, start, n_rows, interval, variables):
+        self.start, self.n_rows, self.interval, self.variables = start, n_rows, interval, variables
+
+    def Time(self):
+        return self.start
+
+    def TimeEnd(self):
+        return self.start + self.n_rows * self.interval
+
+    def Interval(self):
+        return self.interval
+
+    def Variables(self, idx):
+        return self.variables[idx]
+
+    def VariablesLength(self):
+        return len(self.variables)
+
+class SyntheticResponse:
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    def Hourly(self):
+        return self.blocks.get('hourly')
+
+    def Daily(self):
+        return self.blocks.get('daily')
+
+def sdk_metadata(name):
+    # the inverse of engine.variable_name: temperature_2m_max -> (temperature, 2, maximum)
+    from weather_etl.engine import AGGREGATION_SUFFIXES, VARIABLE_NAMES
+    aggregation = 0
+    for value, suffix in AGGREGATION_SUFFIXES.items():
+        if name.endswith(suffix):
+            name, aggregation = name[:-len(suffix)], value
+            break
+    altitude = 0
+    match = re.match(r'(.+)_(\d+)m$', name)
+    if match:
+        name, altitude = match.group(1), int(match.group(2))
+    variables = {variable_name: value for value, variable_name in VARIABLE_NAMES.items()}
+    return variables[name.replace('pm2_5', 'pm2p5')], altitude, aggregation
+
+def synthetic_values(name, dtype, start, n_rows, interval, rng):
+    if name == 'weather_code':
+        return rng.choice([0, 1, 2, 3, 51, 61, 63, 80, 95], n_rows).astype(np.float32)
+    if name == 'is_day':
+        return rng.choice([0, 1], n_rows).astype(np.float32)
+    if name in ('sunrise', 'sunset'):
+        hour = 6 if name == 'sunrise' else 18
+        return start + np.arange(n_rows, dtype=np.int64) * interval + hour * 3600 + rng.integers(-1800, 1800, n_rows)
+    if name == 'precipitation':
+        return np.where(rng.random(n_rows) > 0.9, rng.gamma(2, 2, n_rows), 0).astype(np.float32)
+    return (rng.random(n_rows) * 40).astype(dtype)
+
+def synthetic_block(frame, start, n_days, rng):
+    from weather_etl.spec import FRAMES
+    interval = 86400 if FRAMES[frame]['block'] == 'daily' else 3600
+    n_rows = n_days * 86400 // interval
+    variables = [
+        SyntheticVariable(sdk_metadata(name), synthetic_values(name, dtype, start, n_rows, interval, rng))
+        for name, dtype in FRAMES[frame]['variables'].items()
+    ]
+    # the SDK does not promise any variable order
+    rng.shuffle(variables)
+    return SyntheticBlock(start, n_rows, interval, variables)
+
+def synthetic_results(frames, n_locations, date_range):
+    import pandas as pd
+    start = int(pd.Timestamp(date_range['start_date'], tz='UTC').timestamp())
+    n_days = (pd.Timestamp(date_range['end_date']) - pd.Timestamp(date_range['start_date'])).days + 1
+    results = []
+    for location in range(n_locations):
+        rng = np.random.default_rng([location, start])
+        blocks = {frame: synthetic_block(frame, start, n_days, rng) for frame in frames}
+        results.append(({'location_id': f'loc{location:04d}'}, SyntheticResponse(blocks)))
+    return results
+
+def timed(timings, name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+    return result
+
+def hourly_window(results, sink, date_range, load_mode, timings):
+    from weather_etl import hourly
+    df = timed(timings, 'extract', hourly.extract_multi_location_data, results)
+    df = timed(timings, 'transform', hourly.transform_data, df)
+    timed(timings, 'load', sink.load, df, os.getenv('HOURLY_WEATHER_TABLE'), load_mode, hourly.merge_keys(df.columns))
+    return df.shape[0]
+
+def hourly_arrow_window(results, sink, date_range, load_mode, timings):
+    from weather_etl import hourly
+    from weather_etl.arrow import write_staging
+    table_name = os.getenv('HOURLY_WEATHER_TABLE')
+    table = timed(timings, 'extract', hourly.extract_multi_location_table, results)
+    table = timed(timings, 'transform', hourly.transform_table, table)
+    path = timed(timings, 'staging', write_staging, table, table_name, date_range)
+    timed(timings, 'load', sink.load_parquet, path, table_name, load_mode, hourly.merge_keys(table.column_names))
+    return table.num_rows
+
+def daily_window(results, sink, date_range, load_mode, timings):
+    from weather_etl import daily
+    df = timed(timings, 'extract', daily.extract_multi_location_data, results)
+    df = timed(timings, 'transform', daily.transform_data, df)
+    timed(timings, 'load', sink.load, df, os.getenv('DAILY_WEATHER_TABLE'), load_mode, daily.merge_keys(df.columns))
+    return df.shape[0]
+
+def dashboard_window(results, sink, date_range, load_mode, timings):
+    # the dashboard's default query joins the daily rows, so both fact tables are loaded
+    daily_window(results, sink, date_range, load_mode, timings)
+    return hourly_window(results, sink, date_range, load_mode, timings)
+
+WINDOWS = {
+    'hourly': (['hourly'], hourly_window),
+    'hourly_arrow': (['hourly'], hourly_arrow_window),
+    'daily': (['daily'], daily_window),
+    'dashboard': (['hourly', 'daily'], dashboard_window),
+}
+
+def load_dimensions(sink, end_date):
+    from weather_etl import dims
+    frames = {
+        'DATE_TABLE': dims.transform_dates(dims.get_date(START_DATE, end_date)),
+        'TIME_TABLE': dims.transform_times(dims.get_time('00:00:00', '23:59:59')),
+        'TIMESHIFT_TABLE': dims.transform_codes(dims.extract_mapping(MAPPING_FILE, 'timeshift')),
+        'WEATHER_CODE_TABLE': dims.transform_codes(dims.extract_mapping(MAPPING_FILE, 'weather_code')),
+    }
+    for env_name, df in frames.items():
+        sink.load(df, os.getenv(env_name))
+
+def dashboard_reads(sink, end_date, timings):
+    sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'dashboard'))
+    import data
+    import replica
+    from query_builder import build_query
+
+    load_dimensions(sink, end_date)
+    # synced like `python replica.py` does, the app's queries then reach it through data.py unchanged
+    replica_dir = replica.configured_dir()
+    state = {}
+    for env_name, key in replica.configured_tables().items():
+        state[replica.local_name(env_name)] = replica.sync_table(
+            env_name, key, state, lambda query, params: sink.query(query), 'duckdb', replica_dir,
+        )
+    replica.write_state(state, replica_dir)
+
+    query, params = build_query(columns=DASHBOARD_MEASURES, dialect='duckdb')
+    for name, timings_key in [('cold', 'query_cold'), ('cached', 'query_cached')]:
+        df = timed(timings, timings_key, data.fetch_data, query, params)
+        if df.empty:
+            raise RuntimeError(f'The {name} dashboard query returned no rows.')
+    return df.shape[0]
+
+def configure(work_dir, table_envs=TABLE_ENVS):
+    # module level settings are read on import, so this runs before any weather_etl module is loaded
+    os.environ['ETL_STATE_DIR'] = os.path.join(work_dir, 'state')
+    os.environ['STAGING_DIR'] = os.path.join(work_dir, 'staging')
+    os.environ['REPLICA_DIR'] = os.path.join(work_dir, 'replica')
+    os.environ['DEFER_DERIVED_TABLES'] = '0'
+    for name in ['TABLE_VERSIONS_PATH', 'METRICS_TEXTFILE', 'CACHE_DIR', 'DASHBOARD_METRICS_DB']:
+        os.environ.pop(name, None)
+    for name in TABLE_ENVS:
+        os.environ.pop(name, None)
+    for name in table_envs:
+        os.environ[name] = f"bench.weather.{name[:-len('_TABLE')].lower()}"
+
+def measure(pipeline, size, backend, load_mode, queue):
+    logging.getLogger().setLevel(logging.WARNING)
+    n_locations, n_days = SIZES[size]
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            configure(work_dir, DASHBOARD_TABLE_ENVS if pipeline == 'dashboard' else TABLE_ENVS)
+            from weather_etl.backfill import split_date_range
+            from weather_etl.sink import create_sink
+
+            sink = create_sink(backend, path=os.path.join(work_dir, f'warehouse.{backend}'))
+            frames, window = WINDOWS[pipeline]
+            # one untimed location-day first, so lazy imports and first-call setup do not land in the smallest cases
+            warmup_range = {'start_date': START_DATE, 'end_date': START_DATE}
+            window(synthetic_results(frames, 1, warmup_range), create_sink(backend, path=os.path.join(work_dir, f'warmup.{backend}')),
+                   warmup_range, load_mode, {})
+            end_date = (date.fromisoformat(START_DATE) + timedelta(days=n_days - 1)).isoformat()
+            timings = {}
+            n_rows = 0
+            # monthly windows like a backfill, so the largest size never has to fit in memory at once
+            for date_range in split_date_range(START_DATE, end_date):
+                results = synthetic_results(frames, n_locations, date_range)
+                n_rows += window(results, sink, date_range, load_mode, timings)
+            if pipeline == 'dashboard':
+                timings = {}
+                n_rows = dashboard_reads(sink, end_date, timings)
+    except Exception as e:
+        # the parent is blocked on the queue, hand it the failure instead of leaving it waiting
+        queue.put(RuntimeError(f'{pipeline}/{size} failed: {e!r}'))
+        raise
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((n_rows, timings, (peak if sys.platform == 'darwin' else peak * 1024) / 1024 ** 2))
+
+def run_case(pipeline, size, backend, load_mode):
+    # each repeat runs in a fresh process, so peak memory and warm caches do not leak between cases
+    context = multiprocessing.get_context('spawn')
+    n_locations, n_days = SIZES[size]
+    repeats = REPEATS if n_locations * n_days * 24 <= REPEAT_MAX_ROWS else 1
+    best = None
+    for _ in range(repeats):
+        queue = context.Queue()
+        process = context.Process(target=measure, args=(pipeline, size, backend, load_mode, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        if isinstance(result, Exception):
+            raise result
+        n_rows, timings, peak_mb = result
+        timings['total'] = sum(timings.values())
+        if best is None:
+            best = {'rows': n_rows, 'seconds': timings, 'peak_rss_mb': peak_mb}
+        else:
+            # best of n per stage, the least disturbed run is the closest to the code's own cost
+            best['seconds'] = {stage: min(seconds, best['seconds'][stage]) for stage, seconds in timings.items()}
+            best['peak_rss_mb'] = min(peak_mb, best['peak_rss_mb'])
+    total = best['seconds']['total']
+    return {
+        'pipeline': pipeline, 'size': size, 'locations': n_locations, 'days': n_days, 'repeats': repeats,
+        **best, 'rows_per_sec': best['rows'] / total if total else 0.0,
+    }
+
+def run_suite(pipelines, sizes, backend, load_mode):
+    cases = {}
+    for size in sizes:
+        for pipeline in pipelines:
+            result = run_case(pipeline, size, backend, load_mode)
+            cases[f'{pipeline}/{size}'] = result
+            stages = ', '.join(f'{stage} {seconds:.3f}s' for stage, seconds in result['seconds'].items())
+            logging.info(
+                f"{pipeline}/{size}: {result['rows']:,} rows, {stages}, {result['rows_per_sec']:,.0f} rows/s, "
+                f"peak {result['peak_rss_mb']:.0f} MB"
+            )
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'sink': backend,
+        'load_mode': load_mode,
+        'compact_keys': os.getenv('COMPACT_KEYS', '0') == '1',
+        'pipelines': pipelines,
+        'sizes': sizes,
+        'cases': cases,
+    }
+
+def save(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    logging.info(f'Wrote benchmark results to {path}.')
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def find_regressions(baseline, current, threshold=REGRESSION_THRESHOLD, noise_floor=NOISE_FLOOR_SECONDS):
+    regressions = []
+    for case, before in baseline['cases'].items():
+        after = current['cases'].get(case)
+        if after is None:
+            logging.warning(f'{case} is in the baseline but was not run.')
+            continue
+        if after['rows'] != before['rows']:
+            logging.warning(f"{case} produced {after['rows']:,} rows, the baseline {before['rows']:,}.")
+        measurements = [(f'{stage} seconds', seconds, after['seconds'].get(stage), noise_floor)
+                        for stage, seconds in before['seconds'].items()]
+        measurements.append(('peak RSS MB', before['peak_rss_mb'], after['peak_rss_mb'], 0))
+        for name, old, new, floor in measurements:
+            if new is None:
+                continue
+            change = new / old - 1 if old else 0.0
+            line = f'{case} {name}: {old:.3f} -> {new:.3f} ({change:+.0%})'
+            if change > threshold and new - old > floor:
+                regressions.append(line)
+                logging.warning(f'REGRESSION {line}')
+            else:
+                logging.info(line)
+    for key in ['sink', 'load_mode', 'compact_keys', 'cpu_count', 'python']:
+        if baseline.get(key) != current.get(key):
+            logging.warning(f'{key} differs from the baseline: {baseline.get(key)} vs {current.get(key)}.')
+    return regressions
+
+def compare(args):
+    baseline = load(args.baseline)
+    if args.current:
+        current = load(args.current)
+    else:
+        current = run_suite(baseline['pipelines'], baseline['sizes'], baseline['sink'], baseline['load_mode'])
+        if args.output:
+            save(current, args.output)
+    regressions = find_regressions(baseline, current, args.threshold)
+    if regressions:
+        logging.error(f'{len(regressions)} measurements regressed by more than {args.threshold:.0%} against {args.baseline}.')
+        return 1
+    logging.info(f'No regressions above {args.threshold:.0%} against {args.baseline}.')
+    return 0
+
+def run(args):
+    save(run_suite(args.pipelines, args.sizes, args.sink, args.load_mode), args.output)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Offline ETL and dashboard benchmarks on synthetic Open-Meteo responses.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the suite and store the results as a JSON baseline.')
+    run_parser.add_argument('--pipelines', nargs='+', choices=PIPELINES, default=PIPELINES)
+    run_parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=DEFAULT_SIZES)
+    run_parser.add_argument('--sink', choices=['duckdb', 'sqlite', 'parquet'], default='duckdb')
+    run_parser.add_argument('--load-mode', choices=['append', 'upsert'], default='append')
+    run_parser.add_argument('--output', default=BASELINE_PATH)
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser('compare', help='Flag stages that got slower than a baseline.')
+    compare_parser.add_argument('--baseline', default=BASELINE_PATH)
+    compare_parser.add_argument('--current', help='Results to compare, the suite is rerun with the baseline settings when omitted.')
+    compare_parser.add_argument('--output', help='Where to store the rerun results.')
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    compare_parser.set_defaults(func=compare)
+    return parser
+
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    sys.exit(args.func(args))
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import logging
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'etl'))
+
+from weather_etl.transform import transform_hourly_frame, transform_daily_frame
+
+HOURLY_VARIABLES = [
+    'temperature_2m',
+    'relative_humidity_2m',
+    'dew_point_2m',
+    'apparent_temperature',
+    'precipitation',
+    'weather_code',
+    'cloud_cover',
+    'wind_speed_10m',
+    'wind_direction_10m',
+    'wind_gusts_10m',
+    'is_day',
+    'sunshine_duration',
+]
+
+def make_hourly_frame(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        variable: (rng.random(n_rows) * 40).astype(np.float32) for variable in HOURLY_VARIABLES
+    })
+    df['weather_code'] = rng.choice([0, 1, 2, 3, 51, 61, 63, 80, 95], n_rows).astype(np.float32)
+    df['is_day'] = rng.choice([0, 1], n_rows).astype(np.float32)
+    df.loc[rng.random(n_rows) < 0.01, 'precipitation'] = np.nan
+    df['date'] = pd.date_range('2000-01-01', periods=n_rows, freq='h', tz='UTC')
+    return df
+
+def make_daily_frame(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('1900-01-01', periods=n_rows, freq='D', tz='UTC')
+    start = dates.asi8 // 10**9
+    return pd.DataFrame({
+        'weather_code': rng.choice([0, 3, 61, 95], n_rows).astype(np.float32),
+        'sunrise': start + 23 * 3600 + rng.integers(0, 3600, n_rows),
+        'sunset': start + 11 * 3600 + rng.integers(0, 3600, n_rows),
+        'daylight_duration': (rng.random(n_rows) * 43200).astype(np.float32),
+        'date': dates,
+    })
+
+def legacy_hourly_transform(df):
+    df['date_id'] = df['date'].dt.strftime('%Y%m%d')
+    df['time_id'] = df['date'].dt.strftime('%H%M')
+    df['weather_code'] = df['weather_code'].astype(int).astype(str).str.zfill(2)
+    df['is_day'] = df['is_day'].astype(int).astype(str).str.zfill(2)
+    df.drop(columns=['date'], inplace=True)
+    df['id'] = df['date_id'] + df['time_id']
+    for col in ['id', 'date_id', 'time_id', 'weather_code', 'is_day']:
+        df[col] = df[col].apply(lambda x: x.decode('utf-8') if isinstance(x, bytes) else str(x))
+    for col in df.select_dtypes(include='number').columns:
+        df[col] = df[col].apply(lambda x: float(x) if not pd.isnull(x) else None)
+    return df
+
+def legacy_daily_transform(df, target_timezone):
+    df['date_id'] = df['date'].dt.strftime('%Y%m%d').astype(str)
+    df['weather_code'] = df['weather_code'].astype(int).astype(str).str.zfill(2)
+    df.drop(columns=['date'], inplace=True)
+    df['sunrise'] = pd.to_datetime(df['sunrise'], unit='s', utc=True).dt.tz_convert(target_timezone).dt.strftime('%H:%M')
+    df['sunset'] = pd.to_datetime(df['sunset'], unit='s', utc=True).dt.tz_convert(target_timezone).dt.strftime('%H:%M')
+    return df
+
+def assert_same_output(legacy, vectorized):
+    pd.testing.assert_index_equal(legacy.columns, vectorized.columns)
+    for col in legacy.columns:
+        if pd.api.types.is_float_dtype(vectorized[col]):
+            expected = pd.to_numeric(legacy[col]).astype('Float64')
+            pd.testing.assert_series_equal(expected, vectorized[col], check_names=False)
+        else:
+            pd.testing.assert_series_equal(legacy[col].astype(str), vectorized[col].astype(str), check_names=False)
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def run(n_rows):
+    hourly = make_hourly_frame(n_rows)
+    legacy, legacy_seconds = timed(legacy_hourly_transform, hourly.copy())
+    vectorized, vectorized_seconds = timed(transform_hourly_frame, hourly.copy())
+    assert_same_output(legacy, vectorized)
+    logging.info(
+        f'hourly transform, {n_rows} rows: legacy {legacy_seconds:.2f}s ({n_rows / legacy_seconds:,.0f} rows/s), '
+        f'vectorized {vectorized_seconds:.2f}s ({n_rows / vectorized_seconds:,.0f} rows/s), '
+        f'{legacy_seconds / vectorized_seconds:.1f}x faster'
+    )
+
+    daily = make_daily_frame(n_rows // 24)
+    legacy, legacy_seconds = timed(legacy_daily_transform, daily.copy(), 'Asia/Ho_Chi_Minh')
+    vectorized, vectorized_seconds = timed(transform_daily_frame, daily.copy(), 'Asia/Ho_Chi_Minh')
+    assert_same_output(legacy, vectorized)
+    logging.info(
+        f'daily transform, {n_rows // 24} rows: legacy {legacy_seconds:.2f}s, '
+        f'vectorized {vectorized_seconds:.2f}s, {legacy_seconds / vectorized_seconds:.1f}x faster'
+    )
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
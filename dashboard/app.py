@@ -1,23 +1,71 @@
-from dash import Dash
+import os
+import importlib
+from dotenv import load_dotenv
+
+# table names and backends are read at import time by the tab modules
+load_dotenv()
+
+import diskcache
+from dash import Dash, DiskcacheManager, Input, Output, dcc
 import dash_bootstrap_components as dbc
 from dash import html
 from components.navbar import create_navbar
 from components.sidebar import create_sidebar
+from metrics import register_metrics_route
+from static_assets import built_stylesheets, register_static_routes
+
+BACKGROUND_CACHE_DIR = os.getenv('BACKGROUND_CACHE_DIR', '.background_cache')
+DASH_COMPRESS = os.getenv('DASH_COMPRESS', '1') == '1'
+DASH_DEBUG = os.getenv('DASH_DEBUG', '1') == '1'
+
+TABS = {
+    '/daily-weather': 'tabs.daily weather',
+    '/daily-aqi': 'tabs.air quality',
+}
+DEFAULT_PATH = '/daily-weather'
 
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+background_callback_manager = DiskcacheManager(diskcache.Cache(BACKGROUND_CACHE_DIR))
 
-navbar_div = create_navbar()
-sidebar_div = create_sidebar()
+# once build_assets.py has run, the fingerprinted, precompressed stylesheet replaces assets/style.css
+stylesheets = built_stylesheets()
+
+app = Dash(
+    __name__,
+    external_stylesheets=[dbc.themes.BOOTSTRAP, *stylesheets],
+    assets_ignore=r'style\.css' if stylesheets else '',
+    background_callback_manager=background_callback_manager,
+    suppress_callback_exceptions=True,
+    compress=DASH_COMPRESS,
+)
+server = app.server
+register_static_routes(server)
+register_metrics_route(server)
+
+tabs = {path: importlib.import_module(module) for path, module in TABS.items()}
+for tab in tabs.values():
+    tab.register_callbacks(app)
 
 app.layout = html.Div([
+    dcc.Location(id="url"),
     html.Div(create_sidebar()),
     html.Div([
         create_navbar(),
         html.Div(id="main-content", className="dashboard-container")
-    ], 
+    ],
     className="main-area")
-], 
+],
 className="app-container")
 
+@app.callback(Output("main-content", "children"), Input("url", "pathname"))
+def render_tab(pathname):
+    if pathname in (None, '/'):
+        pathname = DEFAULT_PATH
+    if pathname not in tabs:
+        return html.Div([
+            html.H4("Page not found"),
+            html.P(f"No dashboard tab at {pathname}."),
+        ])
+    return tabs[pathname].layout()
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=DASH_DEBUG)
@@ -0,0 +1,167 @@
+import os
+import io
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import subprocess
+import tempfile
+
+from PIL import Image, ImageSequence
+
+logging.basicConfig(level=logging.INFO)
+
+DASHBOARD_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(DASHBOARD_DIR, 'assets')
+STATIC_BUILD_DIR = os.getenv('STATIC_BUILD_DIR', os.path.join(DASHBOARD_DIR, 'static_build'))
+ASSET_WIDTHS = [int(width) for width in os.getenv('ASSET_WIDTHS', '64,128,256').split(',')]
+WEBP_QUALITY = int(os.getenv('WEBP_QUALITY', 75))
+# icons render at 48-65px, so the 2x variant is what a retina screen downloads
+REPORT_WIDTH = int(os.getenv('ASSET_REPORT_WIDTH', 128))
+
+def slug(name):
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+
+def write_fingerprinted(data, directory, stem, suffix):
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    relative = os.path.join(directory, f'{stem}.{digest}{suffix}')
+    path = os.path.join(STATIC_BUILD_DIR, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return relative.replace(os.sep, '/')
+
+def resized_frames(image, width):
+    height = round(image.height * width / image.width)
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(image):
+        frames.append(frame.convert('RGBA').resize((width, height), Image.LANCZOS))
+        durations.append(frame.info.get('duration', image.info.get('duration', 100)))
+    return frames, durations
+
+def encode_webp(image, width, animated):
+    buffer = io.BytesIO()
+    frames, durations = resized_frames(image, width)
+    if animated:
+        frames[0].save(buffer, 'WEBP', save_all=True, append_images=frames[1:], duration=durations,
+                       loop=0, quality=WEBP_QUALITY, method=4)
+    else:
+        frames[0].save(buffer, 'WEBP', quality=WEBP_QUALITY, method=6)
+    return buffer.getvalue()
+
+def encode_png(image, width):
+    buffer = io.BytesIO()
+    frames, _ = resized_frames(image, width)
+    frames[0].save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+def encode_videos(source, stem):
+    # muted looping video is the smallest option for long animations, but needs ffmpeg
+    if shutil.which('ffmpeg') is None:
+        return {}
+    videos = {}
+    codecs = {
+        'webm': ['-c:v', 'libvpx-vp9', '-b:v', '0', '-crf', '40'],
+        'mp4': ['-c:v', 'libx264', '-crf', '28', '-movflags', 'faststart'],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for container, args in codecs.items():
+            output = os.path.join(tmp, f'{stem}.{container}')
+            command = ['ffmpeg', '-y', '-loglevel', 'error', '-i', source, '-an', '-pix_fmt', 'yuv420p',
+                       '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2', *args, output]
+            try:
+                subprocess.run(command, check=True)
+            except subprocess.CalledProcessError as e:
+                logging.warning(f'Could not encode {source} as {container}: {e}')
+                continue
+            with open(output, 'rb') as f:
+                videos[container] = write_fingerprinted(f.read(), 'icons', stem, f'.{container}')
+    return videos
+
+def build_image(path):
+    name = os.path.basename(path)
+    stem, suffix = os.path.splitext(name)
+    stem = slug(stem)
+    with open(path, 'rb') as f:
+        data = f.read()
+    image = Image.open(io.BytesIO(data))
+    animated = getattr(image, 'is_animated', False)
+    # icons never render wider than the largest configured width, so no full-size variant is built
+    widths = [width for width in ASSET_WIDTHS if width <= image.width] or [image.width]
+    entry = {
+        'original': write_fingerprinted(data, 'icons', stem, suffix.lower()),
+        'animated': animated,
+        'width': image.width,
+        'height': image.height,
+        'bytes': len(data),
+        'variants': {'webp': {}},
+    }
+    for width in widths:
+        entry['variants']['webp'][str(width)] = write_fingerprinted(encode_webp(image, width, animated), 'icons', f'{stem}-{width}', '.webp')
+        if not animated:
+            entry['variants'].setdefault('png', {})[str(width)] = write_fingerprinted(encode_png(image, width), 'icons', f'{stem}-{width}', '.png')
+    if animated:
+        entry['video'] = encode_videos(path, stem)
+    return entry
+
+def build_stylesheet(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    relative = write_fingerprinted(data, '', 'style', '.css')
+    target = os.path.join(STATIC_BUILD_DIR, relative)
+    # served as-is with Content-Encoding, so the server never compresses it per request
+    with open(target + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9))
+    encodings = {'gzip': os.path.getsize(target + '.gz')}
+    try:
+        import brotli
+        with open(target + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+        encodings['br'] = os.path.getsize(target + '.br')
+    except ImportError:
+        logging.warning('brotli is not installed, only a gzip copy of the stylesheet was written.')
+    return {'original': relative, 'bytes': len(data), 'encodings': encodings}
+
+def report_size(entry):
+    if 'encodings' in entry:
+        return min(entry['encodings'].values())
+    webp = entry['variants']['webp']
+    width = min((int(width) for width in webp if int(width) >= REPORT_WIDTH), default=max(int(width) for width in webp))
+    sizes = [os.path.getsize(os.path.join(STATIC_BUILD_DIR, webp[str(width)]))]
+    sizes += [os.path.getsize(os.path.join(STATIC_BUILD_DIR, video)) for video in entry.get('video', {}).values()]
+    return min(sizes)
+
+def page_weight(manifest):
+    rows = [(name, entry['bytes'], report_size(entry)) for name, entry in sorted(manifest.items())]
+    before = sum(row[1] for row in rows)
+    after = sum(row[2] for row in rows)
+    for name, original, optimized in rows:
+        logging.info(f'{name:40s} {original / 1024:9.1f} KB -> {optimized / 1024:8.1f} KB')
+    logging.info(f'page weight: {before / 1024 ** 2:.2f} MB -> {after / 1024 ** 2:.2f} MB ({before / max(after, 1):.0f}x smaller)')
+    return {'before_bytes': before, 'after_bytes': after, 'assets': {name: {'before': b, 'after': a} for name, b, a in rows}}
+
+def build():
+    try:
+        shutil.rmtree(STATIC_BUILD_DIR, ignore_errors=True)
+        os.makedirs(STATIC_BUILD_DIR)
+        manifest = {}
+        icons_dir = os.path.join(ASSETS_DIR, 'icons')
+        for name in sorted(os.listdir(icons_dir)):
+            if os.path.splitext(name)[1].lower() in ('.gif', '.png', '.jpg', '.jpeg'):
+                manifest[f'icons/{name}'] = build_image(os.path.join(icons_dir, name))
+                logging.info(f'Built icons/{name}.')
+        manifest['style.css'] = build_stylesheet(os.path.join(ASSETS_DIR, 'style.css'))
+        report = page_weight(manifest)
+        with open(os.path.join(STATIC_BUILD_DIR, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        with open(os.path.join(STATIC_BUILD_DIR, 'report.json'), 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        return manifest
+    except Exception as e:
+        logging.error(f'Asset build failed: {e}')
+        raise
+
+if __name__ == '__main__':
+    build()
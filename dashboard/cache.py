@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+from dotenv import load_dotenv
+
+# imported by the tabs before data.py, so it loads .env itself before reading its settings
+load_dotenv()
+
+import replica
+
+CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', 900))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 64))
+CACHE_DIR = os.getenv('CACHE_DIR')
+CACHE_DISK_MAX_BYTES = int(os.getenv('CACHE_DISK_MAX_BYTES', 512 * 1024 * 1024))
+TABLE_VERSIONS_PATH = os.getenv('TABLE_VERSIONS_PATH')
+
+TABLE_PATTERN = re.compile(r'[`"]([^`"]+)[`"]')
+
+def normalize_query(query):
+    return ' '.join(query.split())
+
+def cache_key(query, params=None):
+    payload = json.dumps([normalize_query(query), params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def query_tables(query):
+    return sorted({table.split('.')[-1] for table in TABLE_PATTERN.findall(query)})
+
+class TableVersions:
+    def __init__(self, path=TABLE_VERSIONS_PATH):
+        self.path = path
+        self.mtime = None
+        self.versions = {}
+
+    def current(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        mtime = os.path.getmtime(self.path)
+        if mtime != self.mtime:
+            with open(self.path) as f:
+                self.versions = json.load(f)
+            self.mtime = mtime
+        return self.versions
+
+    def snapshot(self, tables):
+        versions = self.current()
+        if replica.replica_ready():
+            # the replica answers, so a load only shows once a sync has copied it there, not when the ETL bumps the table
+            synced = replica.read_state()
+            return {table: synced.get(table, {}).get('version', versions.get(table)) for table in tables}
+        return {table: versions.get(table) for table in tables}
+
+class QueryCache:
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES,
+                 cache_dir=CACHE_DIR, disk_max_bytes=CACHE_DISK_MAX_BYTES, versions=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.versions = versions or TableVersions()
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _is_fresh(self, meta):
+        if time.time() - meta['created'] > self.ttl:
+            return False
+        return self.versions.snapshot(meta['tables']) == meta['versions']
+
+    def get(self, query, params=None):
+        key = cache_key(query, params)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                meta, df = entry
+                if self._is_fresh(meta):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return df.copy()
+                del self.entries[key]
+
+        df = self._disk_get(key)
+        with self.lock:
+            if df is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return df.copy()
+
+    def set(self, query, params, df):
+        key = cache_key(query, params)
+        tables = query_tables(query)
+        meta = {'created': time.time(), 'tables': tables, 'versions': self.versions.snapshot(tables)}
+        with self.lock:
+            self.entries[key] = (meta, df)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self._disk_set(key, meta, df)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _paths(self, key):
+        return os.path.join(self.cache_dir, f'{key}.parquet'), os.path.join(self.cache_dir, f'{key}.json')
+
+    def _disk_get(self, key):
+        if not self.cache_dir:
+            return None
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if not self._is_fresh(meta):
+                self._disk_remove(key)
+                return None
+            df = pd.read_parquet(data_path)
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            self.entries[key] = (meta, df)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return df
+
+    def _disk_set(self, key, meta, df):
+        if not self.cache_dir:
+            return
+        data_path, meta_path = self._paths(key)
+        try:
+            # write data before metadata so readers never see metadata without data
+            df.to_parquet(data_path + '.tmp', index=False)
+            os.replace(data_path + '.tmp', data_path)
+            with open(meta_path + '.tmp', 'w') as f:
+                json.dump(meta, f)
+            os.replace(meta_path + '.tmp', meta_path)
+            self._disk_evict()
+        except Exception as e:
+            logging.warning(f'Could not write cache entry to disk: {e}')
+
+    def _disk_remove(self, key):
+        for path in self._paths(key):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _disk_evict(self):
+        metas = [f for f in os.listdir(self.cache_dir) if f.endswith('.json')]
+        entries = []
+        total = 0
+        for name in metas:
+            key = name[:-len('.json')]
+            data_path, meta_path = self._paths(key)
+            try:
+                size = os.path.getsize(data_path) + os.path.getsize(meta_path)
+                entries.append((os.path.getmtime(meta_path), key, size))
+                total += size
+            except OSError:
+                continue
+        for _, key, size in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            self._disk_remove(key)
+            total -= size
+
+query_cache = QueryCache()
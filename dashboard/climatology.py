@@ -0,0 +1,62 @@
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+# the directory the ETL folds hourly observations into, shared like TABLE_VERSIONS_PATH
+CLIMATOLOGY_DIR = os.getenv('CLIMATOLOGY_DIR')
+DEFAULT_LOCATION = 'default'
+
+_bands = {}
+_lock = threading.Lock()
+
+def location_file(location_id=None, climatology_dir=CLIMATOLOGY_DIR):
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', str(location_id or DEFAULT_LOCATION))
+    return os.path.join(climatology_dir, f'{name}.npz')
+
+def load_bands(location_id=None, climatology_dir=CLIMATOLOGY_DIR):
+    # only the precomputed bands are read, the histograms stay on disk; reloaded when the ETL rewrites the file
+    if not climatology_dir:
+        return None
+    path = location_file(location_id, climatology_dir)
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _bands.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with np.load(path) as f:
+        bands = {name[len('bands_'):]: f[name] for name in f.files if name.startswith('bands_')}
+        bands['percentiles'] = f['percentiles'].tolist()
+    with _lock:
+        _bands[path] = (mtime, bands)
+    return bands
+
+def climatology_version(climatology_dir=CLIMATOLOGY_DIR):
+    if not climatology_dir or not os.path.isdir(climatology_dir):
+        return None
+    return max((entry.stat().st_mtime for entry in os.scandir(climatology_dir) if entry.name.endswith('.npz')), default=None)
+
+def calendar_slots(periods):
+    # the same day-of-year slots the ETL folds into, Feb 29 has a slot of its own
+    periods = pd.DatetimeIndex(periods)
+    days = periods.dayofyear - 1 + ((~periods.is_leap_year) & (periods.month > 2))
+    return days.to_numpy(), periods.hour.to_numpy()
+
+def baseline_bands(periods, measure, location_id=None):
+    # one array lookup per point, whatever the length of the history behind it
+    bands = load_bands(location_id)
+    if bands is None or measure not in bands:
+        return None
+    days, hours = calendar_slots(periods)
+    return pd.DataFrame(bands[measure][days, hours], columns=[f'p{p}' for p in bands['percentiles']])
+
+def anomalies(df, measure, location_id=None, period_column='period'):
+    # departure from the median of the same day-of-year and hour, None without a climatology
+    bands = baseline_bands(df[period_column], measure, location_id)
+    if bands is None:
+        return None
+    return pd.Series(df[measure].to_numpy() - bands['p50'].to_numpy(), index=df.index, name=f'{measure}_anomaly')
@@ -1,5 +1,6 @@
 from dash import html
 import dash_bootstrap_components as dbc
+from static_assets import icon
 
 # def create_sidebar():
 #     return dbc.Nav([
@@ -25,10 +26,7 @@ import dash_bootstrap_components as dbc
 def create_sidebar():
     return html.Div([
         html.Div(
-            html.Img(
-                src="/assets/icons/Weather Talks Logo.png",
-                className="sidebar-logo"
-            ),
+            icon("icons/Weather Talks Logo.png", 65, className="sidebar-logo"),
             className="sidebar-logo-container"
         ),
         dbc.Nav([
@@ -1,67 +1,200 @@
 from google.cloud import bigquery as bq
 import pandas as pd
+from pandas.api.types import union_categoricals
 import os
 import logging
+import time
 from dotenv import load_dotenv
 
+# the modules below read their settings at import time
+load_dotenv()
+
+from cache import query_cache
+import replica
+from metrics import frame_stats, record_query, timed_query
+from query_builder import build_query, is_replica_query, MEASURES, AIR_QUALITY_MEASURES, COMPACT_KEYS
+
 logging.basicConfig(level=logging.INFO)
 
-load_dotenv()
-os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = os.getenv('GG_CREDENTIALS')
-
-query = f"""
-    select
-        d.date,
-        d.quarter,
-        d.month,
-        d.year,
-        t.time,
-        ts.name as is_day,
-        wc.name as weather_code,
-        hw.temperature_2m,
-        hw.relative_humidity_2m,
-        hw.dew_point_2m,
-        hw.apparent_temperature,
-        hw.precipitation,
-        hw.cloud_cover,
-        hw.wind_speed_10m,
-        hw.wind_gusts_10m,
-        hw.wind_direction_10m,
-        hw.sunshine_duration,
-        dw.sunrise,
-        dw.sunset,
-        dw.daylight_duration
-    from
-        `{os.getenv('HOURLY_WEATHER_TABLE')}` as hw
-    join
-        `{os.getenv('TIMESHIFT_TABLE')}` as ts
-        on hw.is_day = ts.id
-    join
-        `{os.getenv('DATE_TABLE')}` as d
-        on hw.date_id = d.id
-    join
-        `{os.getenv('TIME_TABLE')}` as t
-        on hw.time_id = t.id
-    join
-        `{os.getenv('WEATHER_CODE_TABLE')}` as wc
-        on hw.weather_code = wc.id
-    join
-        `{os.getenv('DAILY_WEATHER_TABLE')}` as dw
-        on hw.date_id = dw.date_id
-""" 
-
-def fetch_data(query):
+if os.getenv('GG_CREDENTIALS'):
+    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = os.getenv('GG_CREDENTIALS')
+
+BACKEND = os.getenv('DASHBOARD_BACKEND', 'bigquery')
+POSTGRES_DSN = os.getenv('POSTGRES_DSN')
+POSTGRES_POOL_SIZE = int(os.getenv('POSTGRES_POOL_SIZE', 4))
+STREAM_READS = os.getenv('STREAM_READS', '0') == '1'
+STREAM_BATCH_ROWS = int(os.getenv('STREAM_BATCH_ROWS', 50000))
+
+CATEGORICAL_COLUMNS = ['weather_code', 'is_day']
+SMALL_INT_COLUMNS = {'year': 'int16', 'quarter': 'int8', 'month': 'int8', 'hour': 'int8'}
+
+_client = None
+_bqstorage_client = None
+_pool = None
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = bq.Client()
+    return _client
+
+def get_bqstorage_client():
+    global _bqstorage_client
+    if _bqstorage_client is None:
+        try:
+            from google.cloud import bigquery_storage
+            _bqstorage_client = bigquery_storage.BigQueryReadClient()
+        except ImportError:
+            logging.warning('google-cloud-bigquery-storage is not installed, streaming through the REST API.')
+            _bqstorage_client = False
+    return _bqstorage_client or None
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        from psycopg_pool import ConnectionPool
+        _pool = ConnectionPool(POSTGRES_DSN, min_size=1, max_size=POSTGRES_POOL_SIZE, open=True)
+    return _pool
+
+def to_query_parameters(params):
+    query_parameters = []
+    for name, value in (params or {}).items():
+        if isinstance(value, (list, tuple)):
+            query_parameters.append(bq.ArrayQueryParameter(name, 'STRING', [str(v) for v in value]))
+        elif isinstance(value, int):
+            query_parameters.append(bq.ScalarQueryParameter(name, 'INT64', value))
+        elif isinstance(value, float):
+            query_parameters.append(bq.ScalarQueryParameter(name, 'FLOAT64', value))
+        else:
+            query_parameters.append(bq.ScalarQueryParameter(name, 'STRING', str(value)))
+    return query_parameters
+
+def apply_dtypes(df, compact=COMPACT_KEYS):
+    if not compact:
+        return df
+    dtypes = {col: 'category' for col in CATEGORICAL_COLUMNS if col in df.columns}
+    dtypes.update({col: 'float32' for col in [*MEASURES, *AIR_QUALITY_MEASURES] if col in df.columns})
+    dtypes.update({col: dtype for col, dtype in SMALL_INT_COLUMNS.items() if col in df.columns})
+    return df.astype(dtypes)
+
+def query_source(query):
+    return 'replica' if is_replica_query(query) else BACKEND
+
+def run_query(query, params=None):
+    if is_replica_query(query):
+        return replica.run_query(query, params)
+    if BACKEND == 'postgres':
+        with get_pool().connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query, params or {})
+            return pd.DataFrame(cursor.fetchall(), columns=[col.name for col in cursor.description])
+    job_config = bq.QueryJobConfig(query_parameters=to_query_parameters(params))
+    return get_client().query(query, job_config=job_config).to_dataframe()
+
+def iter_query_batches(query, params=None, batch_rows=STREAM_BATCH_ROWS):
+    if is_replica_query(query):
+        yield from replica.iter_query_batches(query, params, batch_rows)
+        return
+    if BACKEND == 'postgres':
+        with get_pool().connection() as conn:
+            # a named cursor keeps the result on the server and pages it out
+            with conn.cursor(name='dashboard_stream') as cursor:
+                cursor.execute(query, params or {})
+                columns = [col.name for col in cursor.description]
+                rows = cursor.fetchmany(batch_rows)
+                # the first frame is sent even when empty, so the caller keeps the columns
+                yield pd.DataFrame(rows, columns=columns)
+                while rows:
+                    rows = cursor.fetchmany(batch_rows)
+                    if rows:
+                        yield pd.DataFrame(rows, columns=columns)
+        return
+    job_config = bq.QueryJobConfig(query_parameters=to_query_parameters(params))
+    rows = get_client().query(query, job_config=job_config).result(page_size=batch_rows)
+    if not rows.total_rows:
+        yield rows.to_dataframe()
+        return
+    for batch in rows.to_arrow_iterable(bqstorage_client=get_bqstorage_client()):
+        yield batch.to_pandas()
+
+def concat_frames(frames):
+    if not frames:
+        return pd.DataFrame()
+    columns = frames[0].columns
+    # each batch has its own categories, so union them instead of letting concat fall back to object
+    categorical = [col for col in columns if isinstance(frames[0][col].dtype, pd.CategoricalDtype)]
+    df = pd.concat([frame.drop(columns=categorical) for frame in frames], ignore_index=True)
+    for col in categorical:
+        df[col] = union_categoricals([frame[col] for frame in frames])
+    return df[columns]
+
+def iter_data(query, params=None, use_cache=True):
+    if use_cache:
+        started = time.perf_counter()
+        cached = query_cache.get(query, params)
+        if cached is not None:
+            record_query('cache', time.perf_counter() - started, len(cached), int(cached.memory_usage(index=True).sum()))
+            logging.info(f"Served {cached.shape[0]} rows from cache.")
+            yield cached
+            return
+    source = query_source(query)
+    frames = []
+    n_rows = 0
+    n_bytes = 0
+    seconds = 0.0
+    started = time.perf_counter()
     try:
-        client = bq.Client()
-        df = client.query(query).to_dataframe()
-        logging.info(f"Fetched {df.shape[0]} rows from BigQuery.")
+        for frame in iter_query_batches(query, params):
+            frame = apply_dtypes(frame)
+            n_rows += len(frame)
+            n_bytes += int(frame.memory_usage(index=True).sum())
+            if use_cache:
+                frames.append(frame)
+            # only the time spent waiting on the backend, not the time the caller spends on each batch
+            seconds += time.perf_counter() - started
+            yield frame
+            started = time.perf_counter()
+    except Exception as e:
+        record_query(source, seconds + time.perf_counter() - started, n_rows, n_bytes, error=True)
+        logging.error(f"Error streaming data: {e}")
+        raise
+    seconds += time.perf_counter() - started
+    record_query(source, seconds, n_rows, n_bytes)
+    logging.info(f"Streamed {n_rows} rows from {source}.")
+    if use_cache:
+        query_cache.set(query, params, concat_frames(frames))
+
+def fetch_data(query, params=None, use_cache=True, stream=STREAM_READS):
+    if stream and COMPACT_KEYS:
+        # each batch is shrunk to the compact dtypes as it arrives, so the batches and their concatenation
+        # together stay under one full-width result. Without compact dtypes streaming would only add a copy.
+        try:
+            return concat_frames(list(iter_data(query, params, use_cache)))
+        except Exception:
+            return pd.DataFrame()
+    source = query_source(query)
+    try:
+        with timed_query(source) as timing:
+            if use_cache:
+                cached = query_cache.get(query, params)
+                if cached is not None:
+                    timing['source'] = 'cache'
+                    logging.info(f"Served {cached.shape[0]} rows from cache.")
+                    return frame_stats(timing, cached)
+
+            df = apply_dtypes(run_query(query, params))
+            frame_stats(timing, df)
+        logging.info(f"Fetched {df.shape[0]} rows from {source}.")
+        if use_cache:
+            query_cache.set(query, params, df)
+            return df.copy()
         return df
     except Exception as e:
         logging.error(f"Error fetching data: {e}")
         return pd.DataFrame()
     
 if __name__ == "__main__":
-    data = fetch_data(query)
+    query, query_params = build_query()
+    data = fetch_data(query, query_params)
     if not data.empty:
         logging.info(f"Data fetched successfully with {len(data)} rows.")
     else:
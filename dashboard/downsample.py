@@ -0,0 +1,131 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+CHART_WIDTH_PX = int(os.getenv('CHART_WIDTH_PX', 1200))
+POINTS_PER_PIXEL = float(os.getenv('POINTS_PER_PIXEL', 2))
+
+# spiky measures keep each bucket's extremes, LTTB would smooth the peaks away
+MINMAX_MEASURES = ['precipitation']
+
+def point_budget(width_px=CHART_WIDTH_PX, points_per_pixel=POINTS_PER_PIXEL):
+    return max(int(width_px * points_per_pixel), 3)
+
+def zoom_range(relayout_data):
+    if not relayout_data or relayout_data.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    return None
+
+def is_zoom_event(relayout_data):
+    return bool(relayout_data) and any(key.startswith('xaxis.') for key in relayout_data)
+
+def _as_numbers(x):
+    x = np.asarray(x)
+    if x.dtype == object:
+        # tz-aware timestamps come out of pandas as objects, their UTC instants keep the same order
+        index = pd.DatetimeIndex(x)
+        x = (index.tz_convert(None) if index.tz is not None else index).to_numpy()
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+def lttb_indices(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = _as_numbers(x)
+    y = np.asarray(y, dtype=np.float64)
+    # first and last points are kept, the rest is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    # average of each bucket, used as the third vertex for the bucket before it
+    sums_x = np.add.reduceat(x[:n - 1], starts)
+    sums_y = np.add.reduceat(y[:n - 1], starts)
+    counts = ends - starts
+    avg_x = np.append(sums_x / counts, x[-1])[1:]
+    avg_y = np.append(sums_y / counts, y[-1])[1:]
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        bx, by = x[start:end], y[start:end]
+        # twice the triangle area, expanded so only the bucket's points are vectors
+        area = np.abs((x[a] - avg_x[i]) * (by - y[a]) - (x[a] - bx) * (avg_y[i] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def minmax_indices(y, n_out):
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    # first and last points are kept like in LTTB, so the trace spans the whole range
+    n_buckets = (n_out - 2) // 2
+    if n_buckets < 1:
+        return np.array([0, n - 1])
+    y = np.asarray(y, dtype=np.float64)
+    size = int(np.ceil(n / n_buckets))
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(n_buckets, size)
+    valid = ~np.all(np.isnan(buckets), axis=1)
+    offsets = np.arange(n_buckets)[valid] * size
+    lows = offsets + np.nanargmin(buckets[valid], axis=1)
+    highs = offsets + np.nanargmax(buckets[valid], axis=1)
+    return np.unique(np.concatenate([[0, n - 1], lows, highs]))
+
+def downsample_series(x, y, n_out, method='lttb'):
+    y = np.asarray(y, dtype=np.float64)
+    keep = ~np.isnan(y)
+    x, y = np.asarray(x)[keep], y[keep]
+    indices = minmax_indices(y, n_out) if method == 'minmax' else lttb_indices(x, y, n_out)
+    return x[indices], y[indices]
+
+def downsample_frame(df, x_column, measures, n_out=None, x_range=None, by=None):
+    n_out = n_out or point_budget()
+    if x_range is not None:
+        start, end = pd.Timestamp(x_range[0]), pd.Timestamp(x_range[1])
+        tz = getattr(df[x_column].dtype, 'tz', None)
+        if tz is not None:
+            start, end = start.tz_localize(tz), end.tz_localize(tz)
+        df = df[(df[x_column] >= start) & (df[x_column] <= end)]
+    df = df.sort_values(x_column)
+    groups = df.groupby(by, observed=True, sort=False) if by else [((), df)]
+    parts = []
+    for key, group in groups:
+        x = group[x_column].to_numpy()
+        for measure in measures:
+            method = 'minmax' if measure in MINMAX_MEASURES else 'lttb'
+            sampled_x, sampled_y = downsample_series(x, group[measure].to_numpy(dtype=np.float64, na_value=np.nan), n_out, method)
+            part = pd.DataFrame({x_column: sampled_x, 'measure': measure, 'value': sampled_y})
+            if by:
+                for column, value in zip([by] if isinstance(by, str) else by, key if isinstance(key, tuple) else (key,)):
+                    part.insert(0, column, value)
+            parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=([by] if isinstance(by, str) else list(by or [])) + [x_column, 'measure', 'value'])
+    return pd.concat(parts, ignore_index=True)
+
+def register_zoom_resampling(app, graph_id, build_figure, states=()):
+    from dash import Input, Output
+    from dash.exceptions import PreventUpdate
+
+    @app.callback(
+        Output(graph_id, 'figure', allow_duplicate=True),
+        Input(graph_id, 'relayoutData'),
+        *states,
+        prevent_initial_call=True,
+    )
+    def resample_on_zoom(relayout_data, *state_values):
+        # resizes and legend clicks also fire relayoutData, only axis changes need new points
+        if not is_zoom_event(relayout_data):
+            raise PreventUpdate
+        return build_figure(zoom_range(relayout_data), *state_values)
+
+    return resample_on_zoom
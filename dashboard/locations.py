@@ -0,0 +1,17 @@
+import os
+import sys
+
+try:
+    from weather_etl.locations import load_locations
+except ImportError:
+    # running from a checkout where the ETL package is not installed
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'etl'))
+    from weather_etl.locations import load_locations
+
+LOCATIONS_FILE = os.getenv('LOCATIONS_FILE')
+
+def location_options(path=LOCATIONS_FILE):
+    # the same file the ETL loaded from, csv or json, with ids falling back to the name or row number
+    if not path:
+        return []
+    return [{'label': location['location_id'], 'value': location['location_id']} for location in load_locations(path)]
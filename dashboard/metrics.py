@@ -0,0 +1,128 @@
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# gunicorn workers and background callbacks are separate processes, point them all at one file
+# to get totals for the whole dashboard, the default only counts the process serving /metrics
+DASHBOARD_METRICS_DB = os.getenv('DASHBOARD_METRICS_DB', ':memory:')
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+COUNTERS = [
+    ('dashboard_query_rows_total', 'rows', 'Rows returned to callbacks.'),
+    ('dashboard_query_bytes_total', 'bytes', 'In-memory size of the frames returned to callbacks.'),
+    ('dashboard_query_errors_total', 'errors', 'Queries that raised.'),
+]
+
+SCHEMA = """
+create table if not exists query_metrics (
+    source text not null,
+    name text not null,
+    value real not null,
+    primary key (source, name)
+);
+"""
+
+_conn = None
+_lock = threading.Lock()
+
+def get_conn():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DASHBOARD_METRICS_DB, timeout=1, check_same_thread=False, isolation_level=None)
+        _conn.execute('pragma journal_mode=wal')
+        _conn.execute('pragma synchronous=off')
+        _conn.executescript(SCHEMA)
+    return _conn
+
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def record_query(source, seconds, rows=0, size=0, error=False):
+    values = {'queries': 1, 'seconds': seconds, 'rows': rows, 'bytes': size, 'errors': int(error)}
+    values.update({f'le_{bound:g}': 1 for bound in LATENCY_BUCKETS if seconds <= bound})
+    try:
+        with _lock:
+            conn = get_conn()
+            conn.executemany(
+                'insert into query_metrics values (?, ?, ?) '
+                'on conflict (source, name) do update set value = value + excluded.value',
+                [(source, name, value) for name, value in values.items()],
+            )
+            rss = peak_rss()
+            if rss is not None:
+                conn.execute(
+                    "insert into query_metrics values ('process', 'peak_rss_bytes', ?) "
+                    'on conflict (source, name) do update set value = max(value, excluded.value)',
+                    (rss,),
+                )
+    except sqlite3.Error as e:
+        # metrics must never take a chart down
+        logging.warning(f'Could not record query metrics: {e}')
+
+@contextmanager
+def timed_query(source):
+    # yields a dict for the caller to fill with rows, bytes and the source that actually answered
+    result = {'source': source, 'rows': 0, 'bytes': 0}
+    started = time.perf_counter()
+    error = False
+    try:
+        yield result
+    except Exception:
+        error = True
+        raise
+    finally:
+        record_query(result['source'], time.perf_counter() - started, result['rows'], result['bytes'], error)
+
+def frame_stats(result, df):
+    result['rows'] = len(df)
+    result['bytes'] = int(df.memory_usage(index=True).sum())
+    return df
+
+def snapshot():
+    with _lock:
+        rows = get_conn().execute('select source, name, value from query_metrics').fetchall()
+    values = {}
+    for source, name, value in rows:
+        values.setdefault(source, {})[name] = value
+    return values
+
+def _value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+def render():
+    values = snapshot()
+    process = values.pop('process', {})
+    lines = ['# HELP dashboard_query_seconds Latency of dashboard data queries by the source that answered them.',
+             '# TYPE dashboard_query_seconds histogram']
+    for source, stats in sorted(values.items()):
+        for bound in LATENCY_BUCKETS:
+            lines.append(f'dashboard_query_seconds_bucket{{source="{source}",le="{bound:g}"}} {_value(stats.get(f"le_{bound:g}", 0))}')
+        lines += [f'dashboard_query_seconds_bucket{{source="{source}",le="+Inf"}} {_value(stats.get("queries", 0))}',
+                  f'dashboard_query_seconds_sum{{source="{source}"}} {_value(stats.get("seconds", 0))}',
+                  f'dashboard_query_seconds_count{{source="{source}"}} {_value(stats.get("queries", 0))}']
+    for metric, name, help_text in COUNTERS:
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        lines += [f'{metric}{{source="{source}"}} {_value(stats.get(name, 0))}' for source, stats in sorted(values.items())]
+    rss = process.get('peak_rss_bytes', peak_rss())
+    if rss is not None:
+        lines += ['# HELP dashboard_peak_rss_bytes Largest peak resident set size of any dashboard process.',
+                  '# TYPE dashboard_peak_rss_bytes gauge', f'dashboard_peak_rss_bytes {_value(rss)}']
+    return '\n'.join(lines) + '\n'
+
+def register_metrics_route(server):
+    @server.route('/metrics')
+    def metrics():
+        return render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    return metrics
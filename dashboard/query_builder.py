@@ -0,0 +1,363 @@
+import os
+
+import pandas as pd
+
+from replica import replica_ready
+
+MEASURES = [
+    'temperature_2m',
+    'relative_humidity_2m',
+    'dew_point_2m',
+    'apparent_temperature',
+    'precipitation',
+    'cloud_cover',
+    'wind_speed_10m',
+    'wind_gusts_10m',
+    'wind_direction_10m',
+    'sunshine_duration',
+]
+
+# column -> (dimension it needs, select expression)
+DIMENSION_COLUMNS = {
+    'date': ('dim_date', 'd.date'),
+    'quarter': ('dim_date', 'd.quarter'),
+    'month': ('dim_date', 'd.month'),
+    'year': ('dim_date', 'd.year'),
+    'time': ('dim_time', 't.time'),
+    'is_day': ('timeshift', 'ts.name'),
+    'weather_code': ('weather_code', 'wc.name'),
+    'sunrise': ('daily_weather', 'dw.sunrise'),
+    'sunset': ('daily_weather', 'dw.sunset'),
+    'daylight_duration': ('daily_weather', 'dw.daylight_duration'),
+}
+
+AIR_QUALITY_MEASURES = [
+    'pm10',
+    'pm2_5',
+    'carbon_monoxide',
+    'nitrogen_dioxide',
+    'sulphur_dioxide',
+    'ozone',
+    'us_aqi',
+    'european_aqi',
+]
+
+# an index is reported by its worst hour, concentrations by their mean
+AIR_QUALITY_AGGREGATIONS = {
+    'us_aqi': 'max',
+    'european_aqi': 'max',
+}
+
+DEFAULT_AGGREGATIONS = {
+    'precipitation': 'sum',
+    'sunshine_duration': 'sum',
+    'sunrise': 'min',
+    'sunset': 'max',
+    'daylight_duration': 'avg',
+}
+
+# columns that are aggregated rather than grouped on at day/month granularity
+AGGREGATED_DIMENSION_COLUMNS = ['sunrise', 'sunset', 'daylight_duration']
+
+DIALECT = os.getenv('DASHBOARD_BACKEND', 'bigquery')
+COMPACT_KEYS = os.getenv('COMPACT_KEYS', '0') == '1'
+WIDE_WEATHER_TABLE = os.getenv('WIDE_WEATHER_TABLE')
+
+DIALECTS = {
+    'bigquery': {
+        'table': '`{name}`',
+        'param': '@{name}',
+        'in_list': '{column} in unnest(@{name})',
+        'hour': "parse_datetime('%Y%m%d%H%M', concat({date_id}, {time_id}))",
+        'day': "parse_date('%Y%m%d', {date_id})",
+        'month': "date_trunc(parse_date('%Y%m%d', {date_id}), month)",
+        'month_id': "parse_date('%Y%m%d', concat({month_id}, '01'))",
+        'mode': 'approx_top_count({expression}, 1)[offset(0)].value',
+        'text': 'cast({column} as string)',
+        'pad4': "format('%04d', {column})",
+    },
+    'postgres': {
+        'table': '"{local_name}"',
+        'param': '%({name})s',
+        'in_list': '{column} = any(%({name})s)',
+        # to_timestamp gives a timestamptz, cast back so hours match the other dialects' naive datetimes
+        'hour': "to_timestamp({date_id} || {time_id}, 'YYYYMMDDHH24MI')::timestamp",
+        'day': "to_date({date_id}, 'YYYYMMDD')",
+        'month': "date_trunc('month', to_date({date_id}, 'YYYYMMDD'))::date",
+        'month_id': "to_date({month_id} || '01', 'YYYYMMDD')",
+        'mode': 'mode() within group (order by {expression})',
+        'text': '{column}::text',
+        'pad4': "lpad({column}::text, 4, '0')",
+    },
+    # the local replica, its queries carry a header so data.py knows where to send them
+    'duckdb': {
+        'header': '-- local replica',
+        'table': '"{local_name}"',
+        'param': '${name}',
+        'in_list': 'list_contains(${name}, {column})',
+        'hour': "strptime({date_id} || {time_id}, '%Y%m%d%H%M')",
+        'day': "strptime({date_id}, '%Y%m%d')::date",
+        'month': "date_trunc('month', strptime({date_id}, '%Y%m%d'))::date",
+        'month_id': "strptime({month_id} || '01', '%Y%m%d')::date",
+        'mode': 'mode({expression})',
+        'text': 'cast({column} as varchar)',
+        'pad4': "lpad(cast({column} as varchar), 4, '0')",
+    },
+}
+
+# rollup tables maintained by the ETL, keyed by the granularity they answer
+ROLLUP_TABLES = {
+    'day': ('DAILY_ROLLUP_TABLE', 'date_id', 'day'),
+    'month': ('MONTHLY_ROLLUP_TABLE', 'month_id', 'month_id'),
+}
+
+ROLLUP_COLUMNS = {
+    ('temperature_2m', 'avg'): 'temperature_2m_mean',
+    ('temperature_2m', 'min'): 'temperature_2m_min',
+    ('temperature_2m', 'max'): 'temperature_2m_max',
+    ('apparent_temperature', 'avg'): 'apparent_temperature_mean',
+    ('relative_humidity_2m', 'avg'): 'relative_humidity_2m_mean',
+    ('dew_point_2m', 'avg'): 'dew_point_2m_mean',
+    ('cloud_cover', 'avg'): 'cloud_cover_mean',
+    ('wind_speed_10m', 'avg'): 'wind_speed_10m_mean',
+    ('wind_speed_10m', 'max'): 'wind_speed_10m_max',
+    ('wind_gusts_10m', 'max'): 'wind_gusts_10m_max',
+    ('precipitation', 'sum'): 'precipitation_sum',
+    ('sunshine_duration', 'sum'): 'sunshine_duration_sum',
+}
+
+# how rollup rows of several locations combine into one per period, means are weighted by their hours
+ROLLUP_COMBINE = {
+    'avg': 'sum({column} * r.hours) / sum(r.hours)',
+    'min': 'min({column})',
+    'max': 'max({column})',
+    'sum': 'sum({column})',
+}
+
+DEFAULT_COLUMNS = [
+    'date', 'quarter', 'month', 'year', 'time', 'is_day', 'weather_code',
+    *MEASURES,
+    'sunrise', 'sunset', 'daylight_duration',
+]
+
+# dimension -> (table env var, alias, join condition on the fact row)
+JOINS = {
+    'timeshift': ('TIMESHIFT_TABLE', 'ts', 'hw.is_day = ts.id'),
+    'dim_date': ('DATE_TABLE', 'd', 'hw.date_id = d.id'),
+    'dim_time': ('TIME_TABLE', 't', 'hw.time_id = t.id'),
+    'weather_code': ('WEATHER_CODE_TABLE', 'wc', 'hw.weather_code = wc.id'),
+    'daily_weather': ('DAILY_WEATHER_TABLE', 'dw', 'hw.date_id = dw.date_id'),
+}
+
+def table(env_name, dialect=DIALECT):
+    name = os.getenv(env_name)
+    if not name:
+        raise ValueError(f'{env_name} is not set, the query needs the table it names.')
+    return DIALECTS[dialect]['table'].format(name=name, local_name=name.split('.')[-1])
+
+def _join(dimension, locations, dialect):
+    # formatted only for the dimensions a query selects, the others' tables need not be configured
+    env_name, alias, condition = JOINS[dimension]
+    if dimension == 'daily_weather' and locations:
+        condition += ' and hw.location_id = dw.location_id'
+    return f'join {table(env_name, dialect)} as {alias} on {condition}'
+
+def active_dialect():
+    # the replica answers once it holds every configured table, the warehouse until then
+    return 'duckdb' if replica_ready() else DIALECT
+
+def is_replica_query(query):
+    return query.startswith(DIALECTS['duckdb']['header'])
+
+def _header(dialect):
+    return [DIALECTS[dialect]['header']] if 'header' in DIALECTS[dialect] else []
+
+def to_key(value, key, compact=COMPACT_KEYS):
+    date_id = pd.Timestamp(value).strftime('%Y%m%d')
+    key_id = date_id[:6] if key == 'month_id' else date_id
+    return int(key_id) if compact else key_id
+
+def period_expression(granularity, prefix, dialect=DIALECT, compact=COMPACT_KEYS):
+    sql = DIALECTS[dialect]
+    keys = {}
+    for column in ['date_id', 'time_id', 'month_id']:
+        expression = f'{prefix}.{column}'
+        if compact:
+            expression = sql['pad4' if column == 'time_id' else 'text'].format(column=expression)
+        keys[column] = expression
+    return sql[granularity].format(**keys)
+
+def _aggregate(aggregation, expression, dialect):
+    if aggregation == 'mode':
+        return DIALECTS[dialect]['mode'].format(expression=expression)
+    return f'{aggregation}({expression})'
+
+def covers_whole_months(start_date, end_date):
+    if start_date is not None and pd.Timestamp(start_date).day != 1:
+        return False
+    return end_date is None or pd.Timestamp(end_date).is_month_end
+
+def build_rollup_query(start_date, end_date, locations, columns, granularity, aggregations, dialect=None):
+    table_env, key, period = ROLLUP_TABLES[granularity]
+    if not os.getenv(table_env):
+        return None
+    # a monthly row also counts the days outside a partial month, the hourly path clips to the window
+    if key == 'month_id' and not covers_whole_months(start_date, end_date):
+        return None
+    dialect = dialect or active_dialect()
+    sql = DIALECTS[dialect]
+    # rollup rows are per location, without a location filter they are combined into one row per period
+    combine = not locations
+
+    period_sql = period_expression(period, 'r', dialect)
+    select = [f'{period_sql} as period']
+    if locations:
+        select.append('r.location_id')
+    joins = []
+    for col in columns:
+        aggregation = aggregations.get(col, 'avg')
+        if col == 'weather_code' and aggregation == 'mode':
+            # the dominant code across locations cannot be derived from each location's dominant code
+            if combine:
+                return None
+            select.append('wc.name as weather_code')
+            joins.append(f"join {table('WEATHER_CODE_TABLE', dialect)} as wc on r.weather_code = wc.id")
+            continue
+        rollup_column = ROLLUP_COLUMNS.get((col, aggregation))
+        if rollup_column is None:
+            return None
+        expression = f'r.{rollup_column}'
+        if combine:
+            expression = ROLLUP_COMBINE[aggregation].format(column=expression)
+        select.append(f'{expression} as {col}')
+
+    where = []
+    params = {}
+    if start_date is not None:
+        where.append(f"r.{key} >= {sql['param'].format(name=f'start_{key}')}")
+        params[f'start_{key}'] = to_key(start_date, key)
+    if end_date is not None:
+        where.append(f"r.{key} <= {sql['param'].format(name=f'end_{key}')}")
+        params[f'end_{key}'] = to_key(end_date, key)
+    if locations:
+        where.append(sql['in_list'].format(column='r.location_id', name='locations'))
+        params['locations'] = list(locations)
+
+    query = '\n'.join([
+        *_header(dialect),
+        'select',
+        '    ' + ',\n    '.join(select),
+        'from',
+        f'    {table(table_env, dialect)} as r',
+        *joins,
+        *(['where ' + '\n    and '.join(where)] if where else []),
+        *([f'group by {period_sql}'] if combine else []),
+        'order by period',
+    ])
+    return query, params
+
+def _filters(prefix, start_date, end_date, locations, dialect):
+    sql = DIALECTS[dialect]
+    where = []
+    params = {}
+    if start_date is not None:
+        where.append(f"{prefix}.date_id >= {sql['param'].format(name='start_date_id')}")
+        params['start_date_id'] = to_key(start_date, 'date_id')
+    if end_date is not None:
+        where.append(f"{prefix}.date_id <= {sql['param'].format(name='end_date_id')}")
+        params['end_date_id'] = to_key(end_date, 'date_id')
+    if locations:
+        where.append(sql['in_list'].format(column=f'{prefix}.location_id', name='locations'))
+        params['locations'] = list(locations)
+    return where, params
+
+def build_query(start_date=None, end_date=None, locations=None, columns=None,
+                granularity='hour', aggregations=None, use_rollups=True, dialect=None,
+                use_wide=bool(WIDE_WEATHER_TABLE)):
+    dialect = dialect or active_dialect()
+    if granularity not in ROLLUP_TABLES and granularity != 'hour':
+        raise ValueError(f'Unknown granularity: {granularity}')
+    columns = columns or DEFAULT_COLUMNS
+    unknown = [col for col in columns if col not in MEASURES and col not in DIMENSION_COLUMNS]
+    if unknown:
+        raise ValueError(f'Unknown columns: {unknown}')
+    aggregations = {**DEFAULT_AGGREGATIONS, **(aggregations or {})}
+    aggregate = granularity != 'hour'
+    if aggregate and use_rollups:
+        rollup = build_rollup_query(start_date, end_date, locations, columns, granularity, aggregations, dialect)
+        if rollup is not None:
+            return rollup
+
+    period = period_expression(granularity, 'hw', dialect)
+    select = [f'{period} as period']
+    group_by = [period]
+    if locations:
+        select.append('hw.location_id')
+        group_by.append('hw.location_id')
+
+    needed = []
+    for col in columns:
+        if col in MEASURES or use_wide:
+            # the wide table already carries resolved dimension attributes
+            expression = f'hw.{col}'
+        else:
+            dimension, expression = DIMENSION_COLUMNS[col]
+            if dimension not in needed:
+                needed.append(dimension)
+        if aggregate and (col in MEASURES or col in AGGREGATED_DIMENSION_COLUMNS or col in aggregations):
+            expression = _aggregate(aggregations.get(col, 'avg'), expression, dialect)
+        elif aggregate:
+            group_by.append(expression)
+        select.append(f'{expression} as {col}')
+
+    where, params = _filters('hw', start_date, end_date, locations, dialect)
+
+    source = 'WIDE_WEATHER_TABLE' if use_wide else 'HOURLY_WEATHER_TABLE'
+    query = '\n'.join([
+        *_header(dialect),
+        'select',
+        '    ' + ',\n    '.join(select),
+        'from',
+        f"    {table(source, dialect)} as hw",
+        *[_join(dimension, locations, dialect) for dimension in needed],
+        *(['where ' + '\n    and '.join(where)] if where else []),
+        *(['group by ' + ', '.join(group_by)] if aggregate else []),
+        'order by period',
+    ])
+    return query, params
+
+def build_air_quality_query(start_date=None, end_date=None, locations=None, columns=None,
+                            granularity='hour', dialect=None):
+    dialect = dialect or active_dialect()
+    if granularity not in ROLLUP_TABLES and granularity != 'hour':
+        raise ValueError(f'Unknown granularity: {granularity}')
+    columns = columns or AIR_QUALITY_MEASURES
+    unknown = [col for col in columns if col not in AIR_QUALITY_MEASURES]
+    if unknown:
+        raise ValueError(f'Unknown columns: {unknown}')
+    aggregate = granularity != 'hour'
+
+    period = period_expression(granularity, 'aq', dialect)
+    select = [f'{period} as period']
+    group_by = [period]
+    if locations:
+        select.append('aq.location_id')
+        group_by.append('aq.location_id')
+    for col in columns:
+        expression = f'aq.{col}'
+        if aggregate:
+            expression = _aggregate(AIR_QUALITY_AGGREGATIONS.get(col, 'avg'), expression, dialect)
+        select.append(f'{expression} as {col}')
+
+    where, params = _filters('aq', start_date, end_date, locations, dialect)
+    query = '\n'.join([
+        *_header(dialect),
+        'select',
+        '    ' + ',\n    '.join(select),
+        'from',
+        f"    {table('AIR_QUALITY_TABLE', dialect)} as aq",
+        *(['where ' + '\n    and '.join(where)] if where else []),
+        *(['group by ' + ', '.join(group_by)] if aggregate else []),
+        'order by period',
+    ])
+    return query, params
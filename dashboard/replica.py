@@ -0,0 +1,252 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# also run on its own as `python replica.py`, so it loads .env before reading any settings
+load_dotenv()
+
+# a per-host copy of the warehouse tables as monthly Parquet partitions, kept current by `python replica.py --every`
+# next to the workers; every worker reads the same files through the OS page cache instead of holding its own copy
+REPLICA_MEMORY_LIMIT = os.getenv('REPLICA_MEMORY_LIMIT', '256MB')
+REPLICA_THREADS = int(os.getenv('REPLICA_THREADS', 2))
+REPLICA_SYNC_SECONDS = int(os.getenv('REPLICA_SYNC_SECONDS', 300))
+STATE_FILE = '_sync.json'
+LOCK_FILE = '_sync.lock'
+# where the ETL's table versions keep the version of every month each load touched
+PARTITIONS_KEY = '_partitions'
+
+# fact tables are partitioned by month on their key, dimensions are small enough to copy whole
+FACT_TABLES = {
+    'HOURLY_WEATHER_TABLE': 'date_id',
+    'WIDE_WEATHER_TABLE': 'date_id',
+    'DAILY_WEATHER_TABLE': 'date_id',
+    'AIR_QUALITY_TABLE': 'date_id',
+    'DAILY_ROLLUP_TABLE': 'date_id',
+    'MONTHLY_ROLLUP_TABLE': 'month_id',
+}
+DIMENSION_TABLES = ['DATE_TABLE', 'TIME_TABLE', 'TIMESHIFT_TABLE', 'WEATHER_CODE_TABLE']
+
+_conn = None
+_states = {}
+_lock = threading.Lock()
+
+def configured_tables():
+    tables = {env_name: key for env_name, key in FACT_TABLES.items() if os.getenv(env_name)}
+    tables.update({env_name: None for env_name in DIMENSION_TABLES if os.getenv(env_name)})
+    return tables
+
+def local_name(env_name):
+    return os.getenv(env_name).split('.')[-1]
+
+def configured_dir(replica_dir=None):
+    return replica_dir or os.getenv('REPLICA_DIR')
+
+def read_state(replica_dir=None):
+    replica_dir = configured_dir(replica_dir)
+    path = os.path.join(replica_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _states.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(path) as f:
+        state = json.load(f)
+    with _lock:
+        _states[path] = (mtime, state)
+    return state
+
+def write_state(state, replica_dir=None):
+    replica_dir = configured_dir(replica_dir)
+    path = os.path.join(replica_dir, STATE_FILE)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def replica_ready(replica_dir=None):
+    replica_dir = configured_dir(replica_dir)
+    if not replica_dir:
+        return False
+    tables = configured_tables()
+    state = read_state(replica_dir)
+    return bool(tables) and all(local_name(env_name) in state for env_name in tables)
+
+def get_conn(replica_dir=None):
+    global _conn
+    replica_dir = configured_dir(replica_dir)
+    with _lock:
+        if _conn is None:
+            import duckdb
+            conn = duckdb.connect(config={'memory_limit': REPLICA_MEMORY_LIMIT, 'threads': REPLICA_THREADS})
+            # views re-expand the glob on every query, so partitions written by a sync show up without a reconnect
+            for env_name in configured_tables():
+                name = local_name(env_name)
+                pattern = os.path.join(replica_dir, name, '*.parquet').replace("'", "''")
+                conn.execute(f"create view \"{name}\" as select * from read_parquet('{pattern}', union_by_name = true)")
+            _conn = conn
+    return _conn
+
+def run_query(query, params=None):
+    cursor = get_conn().cursor()
+    try:
+        return cursor.execute(query, params or {}).df()
+    finally:
+        cursor.close()
+
+def iter_query_batches(query, params=None, batch_rows=50000):
+    cursor = get_conn().cursor()
+    try:
+        result = cursor.execute(query, params or {})
+        # converted exactly like run_query's frames, in whole 2048-row vectors
+        vectors = max(1, batch_rows // 2048)
+        frame = result.fetch_df_chunk(vectors)
+        # the first frame is sent even when empty, so the caller keeps the columns
+        yield frame
+        while len(frame):
+            frame = result.fetch_df_chunk(vectors)
+            if len(frame):
+                yield frame
+    finally:
+        cursor.close()
+
+def write_partition(path, df):
+    # renamed into place, a worker mid-query keeps reading the file it opened
+    tmp_path = f'{path}.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def partition_start(partition, key, compact):
+    value = partition if key == 'month_id' else f'{partition}01'
+    return int(value) if compact else value
+
+def next_partition(partition):
+    year, month = int(partition[:4]), int(partition[4:6])
+    return f'{year + 1}01' if month == 12 else f'{year}{month + 1:02d}'
+
+def table_versions(path=None):
+    path = path or os.getenv('TABLE_VERSIONS_PATH')
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def sync_table(env_name, key, state, warehouse_query, dialect, replica_dir=None, full=False):
+    from query_builder import COMPACT_KEYS, DIALECTS, table
+    replica_dir = configured_dir(replica_dir)
+    name = local_name(env_name)
+    table_dir = os.path.join(replica_dir, name)
+    os.makedirs(table_dir, exist_ok=True)
+    existing = set(glob.glob(os.path.join(table_dir, '*.parquet')))
+    watermark = None if full or key is None else state.get(name, {}).get('watermark')
+    # read before the pull, a load landing mid-sync is picked up again by the next one
+    versions = table_versions()
+    loaded = versions.get(PARTITIONS_KEY, {}).get(name, {}) if key else {}
+    synced = state.get(name, {}).get('loaded', {})
+    # months loaded again behind the watermark, by a backfill or a filled gap, are pulled with the new ones
+    changed = sorted(month for month, version in loaded.items() if synced.get(month) != version and month < watermark) if watermark else []
+
+    # the watermark month is pulled again, it may have been partial at the last sync
+    sql = DIALECTS[dialect]
+    query = f'select * from {table(env_name, dialect)}'
+    params = {}
+    conditions = []
+    if watermark:
+        conditions.append(f"{key} >= {sql['param'].format(name='since')}")
+        params['since'] = partition_start(watermark, key, COMPACT_KEYS)
+    for i, month in enumerate(changed):
+        conditions.append(f"({key} >= {sql['param'].format(name=f'start_{i}')} and {key} < {sql['param'].format(name=f'end_{i}')})")
+        params[f'start_{i}'] = partition_start(month, key, COMPACT_KEYS)
+        params[f'end_{i}'] = partition_start(next_partition(month), key, COMPACT_KEYS)
+    if conditions:
+        query += ' where ' + ' or '.join(conditions)
+    df = warehouse_query(query, params)
+
+    written = set()
+    if key is None:
+        path = os.path.join(table_dir, 'all.parquet')
+        write_partition(path, df)
+        written.add(path)
+    elif not df.empty:
+        partitions = df[key].astype(str).str[:6]
+        for partition, frame in df.groupby(partitions, sort=True):
+            path = os.path.join(table_dir, f'{partition}.parquet')
+            write_partition(path, frame)
+            written.add(path)
+        watermark = max(watermark or '', partitions.max())
+    elif not existing:
+        # an empty table still needs a file for the view to read its columns from
+        path = os.path.join(table_dir, 'empty.parquet')
+        write_partition(path, df)
+        written.add(path)
+
+    stale = existing - written if full else set()
+    if written:
+        stale |= {path for path in existing if os.path.basename(path) == 'empty.parquet'} - written
+    # a re-pulled month that came back empty was deleted in the warehouse
+    stale |= {os.path.join(table_dir, f'{month}.parquet') for month in changed} & existing - written
+    for path in stale:
+        os.remove(path)
+    return {
+        'watermark': watermark,
+        'rows': len(df),
+        'partitions': len(written),
+        'loaded': dict(loaded),
+        # the ETL version the replica has caught up to, the dashboard cache keys replica reads on it
+        'version': versions.get(name),
+        'synced_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+
+def sync_replica(replica_dir=None, full=False):
+    replica_dir = configured_dir(replica_dir)
+    if not replica_dir:
+        raise ValueError('REPLICA_DIR is not set.')
+    from data import BACKEND, run_query as warehouse_query
+    os.makedirs(replica_dir, exist_ok=True)
+    with open(os.path.join(replica_dir, LOCK_FILE), 'w') as lock:
+        # one sync per host at a time, a second one waits instead of writing the same partitions
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            state = dict(read_state(replica_dir))
+            for env_name, key in configured_tables().items():
+                started = time.perf_counter()
+                state[local_name(env_name)] = sync_table(env_name, key, state, warehouse_query, BACKEND, replica_dir, full)
+                # saved per table, an interrupted sync resumes from the tables it already finished
+                write_state(state, replica_dir)
+                logging.info(f"Synced {state[local_name(env_name)]['rows']} rows of {local_name(env_name)} into the replica in {time.perf_counter() - started:.2f}s.")
+            return state
+        except Exception as e:
+            logging.error(f'Error syncing replica: {e}')
+            raise
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sync the local dashboard replica from the warehouse.')
+    parser.add_argument('--full', action='store_true', help='pull every partition again instead of those after the watermark')
+    parser.add_argument('--every', type=int, nargs='?', const=REPLICA_SYNC_SECONDS,
+                        help='keep running and sync every this many seconds')
+    args = parser.parse_args()
+    sync_replica(full=args.full)
+    while args.every:
+        time.sleep(args.every)
+        try:
+            sync_replica()
+        except Exception:
+            # the workers keep serving the last good partitions until the next attempt
+            logging.exception('Replica sync failed, retrying on the next interval.')
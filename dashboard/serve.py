@@ -0,0 +1,41 @@
+import os
+import logging
+import multiprocessing
+
+from gunicorn.app.base import BaseApplication
+
+logging.basicConfig(level=logging.INFO)
+
+DASHBOARD_BIND = os.getenv('DASHBOARD_BIND', '0.0.0.0:8050')
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+WEB_THREADS = int(os.getenv('WEB_THREADS', 2))
+WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 120))
+
+class DashboardServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # each worker imports the app itself, so caches and pools are never shared across a fork
+        from app import server
+        return server
+
+def serve():
+    os.environ['DASH_DEBUG'] = '0'
+    os.environ.setdefault('DASH_COMPRESS', '1')
+    logging.info(f'Serving dashboard on {DASHBOARD_BIND} with {WEB_CONCURRENCY} workers x {WEB_THREADS} threads.')
+    DashboardServer({
+        'bind': DASHBOARD_BIND,
+        'workers': WEB_CONCURRENCY,
+        'threads': WEB_THREADS,
+        'timeout': WEB_TIMEOUT,
+        'accesslog': '-',
+    }).run()
+
+if __name__ == '__main__':
+    serve()
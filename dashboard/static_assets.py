@@ -0,0 +1,77 @@
+import os
+import re
+import json
+import mimetypes
+
+from dash import html
+from flask import request, send_from_directory
+
+DASHBOARD_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_BUILD_DIR = os.getenv('STATIC_BUILD_DIR', os.path.join(DASHBOARD_DIR, 'static_build'))
+STATIC_BUILD_URL = '/static-build/'
+# every built file name carries a content hash, so a cached copy can never go stale
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+PRECOMPRESSED = [('br', '.br'), ('gzip', '.gz')]
+FINGERPRINT = re.compile(r'\.[0-9a-f]{10}\.[a-z0-9]+$')
+
+_manifest = None
+
+def manifest():
+    global _manifest
+    if _manifest is None:
+        path = os.path.join(STATIC_BUILD_DIR, 'manifest.json')
+        _manifest = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                _manifest = json.load(f)
+    return _manifest
+
+def built_stylesheets():
+    entry = manifest().get('style.css')
+    return [STATIC_BUILD_URL + entry['original']] if entry else []
+
+def srcset(variants):
+    return ', '.join(f'{STATIC_BUILD_URL}{path} {width}w' for width, path in sorted(variants.items(), key=lambda item: int(item[0])))
+
+def icon(name, height, className=None, alt=''):
+    entry = manifest().get(name)
+    if entry is None:
+        # no build yet (local development), serve the source file from assets/
+        return html.Img(src=f'/assets/{name}', height=height, className=className, alt=alt)
+    fallback = html.Img(src=STATIC_BUILD_URL + entry['original'], height=height, className=className, alt=alt)
+    if entry.get('video'):
+        return html.Video(
+            [html.Source(src=STATIC_BUILD_URL + path, type=f'video/{container}') for container, path in entry['video'].items()]
+            + [fallback],
+            autoPlay=True, loop=True, muted=True, playsInline=True, height=height, className=className,
+        )
+    sizes = f'{height}px'
+    if 'png' in entry['variants']:
+        fallback = html.Img(
+            src=STATIC_BUILD_URL + entry['original'], srcSet=srcset(entry['variants']['png']), sizes=sizes,
+            height=height, className=className, alt=alt,
+        )
+    return html.Picture([
+        html.Source(srcSet=srcset(entry['variants']['webp']), sizes=sizes, type='image/webp'),
+        fallback,
+    ])
+
+def register_static_routes(server):
+    @server.route(STATIC_BUILD_URL + '<path:filename>')
+    def built_asset(filename):
+        accepted = request.headers.get('Accept-Encoding', '')
+        response = None
+        for encoding, suffix in PRECOMPRESSED:
+            if encoding in accepted and os.path.exists(os.path.join(STATIC_BUILD_DIR, filename + suffix)):
+                response = send_from_directory(
+                    STATIC_BUILD_DIR, filename + suffix, mimetype=mimetypes.guess_type(filename)[0]
+                )
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_from_directory(STATIC_BUILD_DIR, filename)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if FINGERPRINT.search(filename) else 'no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    return built_asset
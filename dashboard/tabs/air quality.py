@@ -0,0 +1,145 @@
+import os
+import logging
+
+import pandas as pd
+import plotly.graph_objects as go
+import dash_bootstrap_components as dbc
+from dash import html, dcc, Input, Output
+
+from data import fetch_data
+from downsample import downsample_frame, point_budget
+from locations import location_options
+from query_builder import build_air_quality_query
+
+AIR_QUALITY_TABLE = os.getenv('AIR_QUALITY_TABLE')
+DEFAULT_DAYS = int(os.getenv('DASHBOARD_DEFAULT_DAYS', 30))
+
+MEASURE_LABELS = {
+    'pm2_5': 'PM2.5 (μg/m³)',
+    'pm10': 'PM10 (μg/m³)',
+    'ozone': 'Ozone (μg/m³)',
+    'nitrogen_dioxide': 'Nitrogen dioxide (μg/m³)',
+    'sulphur_dioxide': 'Sulphur dioxide (μg/m³)',
+    'carbon_monoxide': 'Carbon monoxide (μg/m³)',
+    'us_aqi': 'US AQI',
+    'european_aqi': 'European AQI',
+}
+DEFAULT_MEASURES = ['pm2_5', 'pm10']
+SUMMARY_MEASURES = ['pm2_5', 'pm10', 'us_aqi']
+
+# upper bound of each US EPA AQI category
+AQI_CATEGORIES = [
+    (50, 'Good', 'success'),
+    (100, 'Moderate', 'warning'),
+    (150, 'Unhealthy for sensitive groups', 'warning'),
+    (200, 'Unhealthy', 'danger'),
+    (300, 'Very unhealthy', 'danger'),
+    (float('inf'), 'Hazardous', 'dark'),
+]
+
+GRANULARITIES = [
+    {'label': 'Hourly', 'value': 'hour'},
+    {'label': 'Daily', 'value': 'day'},
+    {'label': 'Monthly', 'value': 'month'},
+]
+
+def aqi_category(value):
+    for upper, label, color in AQI_CATEGORIES:
+        if value <= upper:
+            return label, color
+    return 'Unknown', 'secondary'
+
+def layout():
+    if not AIR_QUALITY_TABLE:
+        return html.Div([
+            dbc.Alert('Air quality data is not loaded into the warehouse yet.', color='info'),
+        ])
+    today = pd.Timestamp.now().normalize()
+    locations = location_options()
+    return html.Div([
+        dbc.Row([
+            dbc.Col(dcc.DatePickerRange(
+                id='air-quality-dates',
+                start_date=(today - pd.DateOffset(days=DEFAULT_DAYS)).date(),
+                end_date=(today - pd.DateOffset(days=1)).date(),
+                display_format='YYYY-MM-DD',
+            ), width='auto'),
+            dbc.Col(dbc.RadioItems(
+                id='air-quality-granularity',
+                options=GRANULARITIES,
+                value='day',
+                inline=True,
+            ), width='auto'),
+            dbc.Col(dcc.Dropdown(
+                id='air-quality-measures',
+                options=[{'label': label, 'value': measure} for measure, label in MEASURE_LABELS.items()],
+                value=DEFAULT_MEASURES,
+                multi=True,
+            )),
+            dbc.Col(dcc.Dropdown(
+                id='air-quality-locations',
+                options=locations,
+                value=[locations[0]['value']] if locations else [],
+                multi=True,
+                placeholder='Locations',
+            ), style={} if locations else {'display': 'none'}),
+        ], className='g-3 align-items-center mb-3'),
+        html.Div(id='air-quality-status', className='text-muted mb-2'),
+        dbc.Row(id='air-quality-summary', className='g-3 mb-3'),
+        dcc.Graph(id='air-quality-trend', config={'displaylogo': False}),
+    ])
+
+def summary_cards(df):
+    if df.empty:
+        return [dbc.Col(dbc.Alert('No air quality data for the selected filters.', color='warning'))]
+    worst = df['us_aqi'].max()
+    category, color = aqi_category(worst)
+    cards = [
+        ('Average PM2.5', f"{df['pm2_5'].mean():.1f} μg/m³", None),
+        ('Average PM10', f"{df['pm10'].mean():.1f} μg/m³", None),
+        ('Worst US AQI', f'{worst:.0f}' if pd.notna(worst) else '–', None),
+        ('Air quality', category, color),
+    ]
+    return [
+        dbc.Col(dbc.Card(dbc.CardBody([
+            html.H6(title, className='text-muted'),
+            html.H4(value),
+        ]), color=color, outline=color is not None), md=3)
+        for title, value, color in cards
+    ]
+
+def trend_figure(df, measures):
+    figure = go.Figure()
+    if not df.empty:
+        by = 'location_id' if 'location_id' in df.columns else None
+        sampled = downsample_frame(df, 'period', list(measures), point_budget(), None, by)
+        for key, group in sampled.groupby([by, 'measure'] if by else ['measure'], sort=False):
+            name = ' · '.join([str(key[0]), MEASURE_LABELS.get(key[1], key[1])]) if by else MEASURE_LABELS.get(key[0], key[0])
+            figure.add_trace(go.Scattergl(x=group['period'], y=group['value'], mode='lines', name=name))
+    figure.update_layout(title='Air quality trends', margin={'t': 40, 'b': 20}, hovermode='x unified', uirevision='air-quality')
+    return figure
+
+def register_callbacks(app):
+    if not AIR_QUALITY_TABLE:
+        return
+
+    @app.callback(
+        Output('air-quality-trend', 'figure'),
+        Output('air-quality-summary', 'children'),
+        Input('air-quality-dates', 'start_date'),
+        Input('air-quality-dates', 'end_date'),
+        Input('air-quality-granularity', 'value'),
+        Input('air-quality-measures', 'value'),
+        Input('air-quality-locations', 'value'),
+        background=True,
+        running=[(Output('air-quality-status', 'children'), 'Loading air quality data…', '')],
+    )
+    def update_air_quality(start_date, end_date, granularity, measures, locations):
+        measures = measures or DEFAULT_MEASURES
+        columns = list(dict.fromkeys([*measures, *SUMMARY_MEASURES]))
+        query, params = build_air_quality_query(start_date, end_date, locations or None, columns, granularity)
+        df = fetch_data(query, params)
+        if not df.empty:
+            df['period'] = pd.to_datetime(df['period'])
+        logging.info(f'Built air quality figures from {df.shape[0]} rows.')
+        return trend_figure(df, measures), summary_cards(df)
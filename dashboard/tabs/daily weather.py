@@ -0,0 +1,464 @@
+import os
+import logging
+
+import diskcache
+import pandas as pd
+import plotly.graph_objects as go
+import dash_bootstrap_components as dbc
+from dash import html, dcc, ctx, no_update, Input, Output, Patch, State
+from dash.exceptions import PreventUpdate
+
+from cache import TABLE_VERSIONS_PATH, query_cache, query_tables
+from climatology import baseline_bands, climatology_version
+from data import fetch_data
+from downsample import downsample_frame, is_zoom_event, point_budget, register_zoom_resampling, zoom_range
+from locations import location_options
+from query_builder import build_query
+from static_assets import icon
+
+FIGURE_CACHE_DIR = os.getenv('FIGURE_CACHE_DIR', '.figure_cache')
+FIGURE_CACHE_TTL_SECONDS = int(os.getenv('FIGURE_CACHE_TTL_SECONDS', os.getenv('CACHE_TTL_SECONDS', 900)))
+DEFAULT_DAYS = int(os.getenv('DASHBOARD_DEFAULT_DAYS', 30))
+# how often an open session looks for newly loaded rows, 0 turns the live updates off
+REFRESH_SECONDS = int(os.getenv('DASHBOARD_REFRESH_SECONDS', 300))
+
+# shared by every worker process, so a figure is built once per filter set
+figure_cache = diskcache.Cache(FIGURE_CACHE_DIR)
+
+MEASURE_LABELS = {
+    'temperature_2m': 'Temperature (°C)',
+    'apparent_temperature': 'Feels like (°C)',
+    'dew_point_2m': 'Dew point (°C)',
+    'relative_humidity_2m': 'Humidity (%)',
+    'cloud_cover': 'Cloud cover (%)',
+    'wind_speed_10m': 'Wind speed (m/s)',
+    'wind_gusts_10m': 'Wind gusts (m/s)',
+    'wind_direction_10m': 'Wind direction (°)',
+    'sunshine_duration': 'Sunshine (s)',
+}
+DEFAULT_MEASURES = ['temperature_2m', 'apparent_temperature', 'relative_humidity_2m']
+SUMMARY_MEASURES = ['temperature_2m', 'precipitation', 'wind_gusts_10m']
+# only applied at day/month granularity, hourly rows are returned as they are
+SUMMARY_AGGREGATIONS = {'wind_gusts_10m': 'max', 'weather_code': 'mode'}
+
+# first matching keyword wins, so the more severe conditions come first
+WEATHER_ICONS = [
+    ('Thunderstorm', 'storm.gif'),
+    ('Drizzle', 'drizzle.gif'),
+    ('Rain', 'rain.gif'),
+    ('fog', 'foggy.gif'),
+    ('Overcast', 'clouds.gif'),
+    ('Partly cloudy', 'mainly cloud.gif'),
+    ('Mainly clear', 'mainly cloud.gif'),
+    ('Clear sky', 'sun.gif'),
+]
+
+GRANULARITIES = [
+    {'label': 'Hourly', 'value': 'hour'},
+    {'label': 'Daily', 'value': 'day'},
+    {'label': 'Monthly', 'value': 'month'},
+]
+
+def weather_icon(name):
+    for keyword, icon_name in WEATHER_ICONS:
+        if keyword.lower() in str(name).lower():
+            return f'icons/{icon_name}'
+    return 'icons/day-and-night.gif'
+
+def layout():
+    today = pd.Timestamp.now().normalize()
+    locations = location_options()
+    return html.Div([
+        dbc.Row([
+            dbc.Col(dcc.DatePickerRange(
+                id='daily-weather-dates',
+                start_date=(today - pd.DateOffset(days=DEFAULT_DAYS)).date(),
+                end_date=(today - pd.DateOffset(days=1)).date(),
+                display_format='YYYY-MM-DD',
+            ), width='auto'),
+            dbc.Col(dbc.RadioItems(
+                id='daily-weather-granularity',
+                options=GRANULARITIES,
+                value='hour',
+                inline=True,
+            ), width='auto'),
+            dbc.Col(dcc.Dropdown(
+                id='daily-weather-measures',
+                options=[{'label': label, 'value': measure} for measure, label in MEASURE_LABELS.items()],
+                value=DEFAULT_MEASURES,
+                multi=True,
+            )),
+            dbc.Col(dcc.Dropdown(
+                id='daily-weather-locations',
+                options=locations,
+                value=[locations[0]['value']] if locations else [],
+                multi=True,
+                placeholder='Locations',
+            ), style={} if locations else {'display': 'none'}),
+        ], className='g-3 align-items-center mb-3'),
+        html.Div(id='daily-weather-status', className='text-muted mb-2'),
+        dbc.Row(id='daily-weather-summary', className='g-3 mb-3'),
+        dcc.Graph(id='daily-weather-trend', config={'displaylogo': False}),
+        dcc.Graph(id='daily-weather-precipitation', config={'displaylogo': False}),
+        # what this browser session's figures hold, so updates only fetch and send the rows after it
+        dcc.Store(id='daily-weather-watermark'),
+        dcc.Interval(id='daily-weather-refresh', interval=max(REFRESH_SECONDS, 1) * 1000, disabled=not REFRESH_SECONDS),
+    ])
+
+def filter_set(start_date, end_date, granularity, measures, locations):
+    return (start_date, end_date, granularity, tuple(measures or DEFAULT_MEASURES), tuple(locations or ()))
+
+def filter_query(filters):
+    start_date, end_date, granularity, measures, locations = filters
+    columns = list(dict.fromkeys([*measures, *SUMMARY_MEASURES, 'weather_code']))
+    return build_query(start_date, end_date, list(locations) or None, columns, granularity, SUMMARY_AGGREGATIONS)
+
+def table_versions(query):
+    # part of the memo key, so a load into any queried table or the climatology rebuilds the figures
+    versions = sorted(query_cache.versions.snapshot(query_tables(query)).items())
+    return tuple(versions + [('climatology', climatology_version())])
+
+def _number(value):
+    return None if pd.isna(value) else float(value)
+
+def summary_parts(df):
+    # sums and counts rather than the figures themselves, so the rows of an update can be folded in
+    if df.empty:
+        return None
+    conditions = df['weather_code'].dropna().astype(str).value_counts()
+    return {
+        'temperature_sum': float(df['temperature_2m'].sum()),
+        'temperature_count': int(df['temperature_2m'].count()),
+        'precipitation': float(df['precipitation'].sum()),
+        'gust': _number(df['wind_gusts_10m'].max()),
+        'conditions': {name: int(count) for name, count in conditions.items() if count},
+    }
+
+def merge_summary(parts, other):
+    if parts is None or other is None:
+        return parts or other
+    conditions = dict(parts['conditions'])
+    for name, count in other['conditions'].items():
+        conditions[name] = conditions.get(name, 0) + count
+    gusts = [gust for gust in (parts['gust'], other['gust']) if gust is not None]
+    return {
+        'temperature_sum': parts['temperature_sum'] + other['temperature_sum'],
+        'temperature_count': parts['temperature_count'] + other['temperature_count'],
+        'precipitation': parts['precipitation'] + other['precipitation'],
+        'gust': max(gusts) if gusts else None,
+        'conditions': conditions,
+    }
+
+def summarize(parts):
+    if parts is None:
+        return None
+    conditions = parts['conditions']
+    most = max(conditions.values(), default=0)
+    return {
+        'temperature': parts['temperature_sum'] / parts['temperature_count'] if parts['temperature_count'] else float('nan'),
+        'precipitation': parts['precipitation'],
+        'gust': float('nan') if parts['gust'] is None else parts['gust'],
+        # ties go to the first name, as Series.mode would pick
+        'condition': min(name for name, count in conditions.items() if count == most) if conditions else 'Unknown',
+    }
+
+def summary_cards(summary):
+    if summary is None:
+        return [dbc.Col(dbc.Alert('No weather data for the selected filters.', color='warning'))]
+    cards = [
+        ('Average temperature', f"{summary['temperature']:.1f} °C", 'icons/global-warming.png'),
+        ('Total precipitation', f"{summary['precipitation']:.1f} mm", 'icons/rain.gif'),
+        ('Strongest gust', f"{summary['gust']:.1f} m/s", 'icons/gusts.gif'),
+        ('Most common weather', summary['condition'], weather_icon(summary['condition'])),
+    ]
+    return [
+        dbc.Col(dbc.Card(dbc.CardBody([
+            icon(icon_name, 48, className='mb-2'),
+            html.H6(title, className='text-muted'),
+            html.H4(value),
+        ])), md=3)
+        for title, value, icon_name in cards
+    ]
+
+def normal_band_traces(group, measure, location_id, name):
+    bands = baseline_bands(group['period'], measure, location_id)
+    if bands is None:
+        return []
+    # p90 first, then p10 filled up to it
+    return [
+        go.Scattergl(
+            x=group['period'], y=bands['p90'].tolist(), mode='lines', line={'width': 0}, hoverinfo='skip', showlegend=False,
+            legendgroup=f'{name} normal', meta=[location_id, measure, 'p90'],
+        ),
+        go.Scattergl(
+            x=group['period'], y=bands['p10'].tolist(), mode='lines', line={'width': 0}, fill='tonexty',
+            fillcolor='rgba(128, 128, 128, 0.2)', hoverinfo='skip', name=f'{name} normal (p10–p90)',
+            legendgroup=f'{name} normal', meta=[location_id, measure, 'p10'],
+        ),
+    ]
+
+# y values go out as plain lists rather than typed arrays so Patch can extend them, meta names each trace for it
+def trend_traces(df, measures, x_range=None, normal_bands=False):
+    by = 'location_id' if 'location_id' in df.columns else None
+    sampled = downsample_frame(df, 'period', list(measures), point_budget(), x_range, by)
+    traces = []
+    for key, group in sampled.groupby([by, 'measure'] if by else ['measure'], sort=False):
+        name = ' · '.join([str(key[0]), MEASURE_LABELS.get(key[1], key[1])]) if by else MEASURE_LABELS.get(key[0], key[0])
+        location_id = str(key[0]) if by else None
+        if normal_bands:
+            traces += normal_band_traces(group, key[-1], location_id, name)
+        traces.append(go.Scattergl(
+            x=group['period'], y=group['value'].tolist(), mode='lines', name=name, meta=[location_id, key[-1], 'value'],
+        ))
+    return traces
+
+def precipitation_traces(df, x_range=None):
+    by = 'location_id' if 'location_id' in df.columns else None
+    sampled = downsample_frame(df, 'period', ['precipitation'], point_budget(), x_range, by)
+    traces = []
+    for key, group in sampled.groupby(by, sort=False) if by else [('Precipitation', sampled)]:
+        name = str(key[0] if isinstance(key, tuple) else key)
+        location_id = name if by else None
+        traces.append(go.Bar(x=group['period'], y=group['value'].tolist(), name=name, meta=[location_id, 'precipitation', 'value']))
+    return traces
+
+def trend_figure(df, measures, x_range=None, normal_bands=False):
+    figure = go.Figure(trend_traces(df, measures, x_range, normal_bands))
+    figure.update_layout(title='Weather trends', margin={'t': 40, 'b': 20}, hovermode='x unified', uirevision='trend')
+    if x_range is not None:
+        figure.update_xaxes(range=list(x_range))
+    return figure.to_dict()
+
+def precipitation_figure(df, x_range=None):
+    figure = go.Figure(precipitation_traces(df, x_range))
+    figure.update_layout(title='Precipitation (mm)', margin={'t': 40, 'b': 20}, bargap=0, uirevision='precipitation')
+    return figure.to_dict()
+
+def to_periods(values):
+    # wall-clock hours, the watermark and the date pickers carry no time zone
+    periods = pd.to_datetime(values)
+    return periods.dt.tz_localize(None) if periods.dt.tz is not None else periods
+
+def shows_normal_bands(filters):
+    # the climatology is kept per hour of day, so the normal bands only line up with hourly rows
+    return filters[2] == 'hour'
+
+def period_bounds(df):
+    if df.empty:
+        return None, None
+    return df['period'].min().isoformat(), df['period'].max().isoformat()
+
+@figure_cache.memoize(expire=FIGURE_CACHE_TTL_SECONDS, tag='daily-weather')
+def build_figures(filters, versions, x_range=None):
+    query, params = filter_query(filters)
+    df = fetch_data(query, params)
+    if not df.empty:
+        df['period'] = to_periods(df['period'])
+    logging.info(f'Built daily weather figures for {filters} from {df.shape[0]} rows.')
+    trend = trend_figure(df, filters[3], x_range, shows_normal_bands(filters))
+    return trend, precipitation_figure(df, x_range), summary_parts(df), period_bounds(df)
+
+def figures_for(filters, x_range=None):
+    query, _ = filter_query(filters)
+    return build_figures(filters, table_versions(query), x_range)
+
+def zoomed_trend(x_range, start_date, end_date, granularity, measures, locations):
+    trend, *_ = figures_for(filter_set(start_date, end_date, granularity, measures, locations), x_range)
+    return trend
+
+def trace_keys(figure):
+    return [trace.get('meta') for trace in figure['data']]
+
+def trace_points(figure):
+    return [len(trace.get('x', ())) for trace in figure['data']]
+
+def full_update(filters):
+    query, _ = filter_query(filters)
+    versions = table_versions(query)
+    trend, precipitation, summary, (earliest, latest) = build_figures(filters, versions)
+    watermark = {
+        'filters': list(filters),
+        'versions': [list(version) for version in versions],
+        'earliest': earliest,
+        'latest': latest,
+        'summary': summary,
+        'trend': trace_keys(trend),
+        'precipitation': trace_keys(precipitation),
+        'trend_points': trace_points(trend),
+        'precipitation_points': trace_points(precipitation),
+    }
+    return trend, precipitation, summary_cards(summarize(summary)), watermark
+
+def plan_update(watermark, filters):
+    # the windows a session is missing, or None when only a full rebuild brings it up to date
+    if not watermark or watermark.get('stale') or watermark.get('latest') is None:
+        return None
+    start_date, end_date, granularity, measures, locations = filters
+    old_start, old_end, *rest = filter_set(*watermark['filters'])
+    # a partial day or month would change a point already drawn, only hourly rows can be appended
+    if granularity != 'hour' or tuple(rest) != (granularity, measures, locations):
+        return None
+    if None in (start_date, end_date) or start_date > old_start or end_date < old_end:
+        return None
+    windows = []
+    if start_date < old_start:
+        windows.append(('prepend', start_date, watermark['earliest']))
+    windows.append(('extend', watermark['latest'], end_date))
+    return windows
+
+def fetch_window(filters, side, start_date, end_date):
+    query, params = filter_query((start_date, end_date, *filters[2:]))
+    df = fetch_data(query, params, use_cache=False)
+    if df.empty:
+        return df
+    df['period'] = to_periods(df['period'])
+    if side == 'extend':
+        return df[df['period'] > pd.Timestamp(start_date)]
+    return df[df['period'] < pd.Timestamp(end_date)]
+
+def patch_traces(figure, keys, counts, traces, side):
+    # the traces' new point counts, or None when the figure has to be rebuilt instead
+    if counts is None:
+        return None
+    counts = list(counts)
+    for trace in traces:
+        key = list(trace.meta)
+        if key not in keys:
+            return None
+        index = keys.index(key)
+        counts[index] += len(trace.x)
+        # a rebuilt trace already sits near the budget, so it takes another budget's worth before it is downsampled again
+        if counts[index] > 2 * point_budget():
+            return None
+        for axis in ['x', 'y']:
+            values = list(trace[axis])
+            points = figure['data'][index][axis]
+            if side == 'extend':
+                points.extend(values)
+            else:
+                # Patch prepends one item at a time, reversing around an extend sends the rows in one operation
+                points.reverse()
+                points.extend(values[::-1])
+                points.reverse()
+    return counts
+
+def patch_update(filters, watermark, windows, versions):
+    trend, precipitation = Patch(), Patch()
+    summary, earliest, latest = watermark['summary'], watermark['earliest'], watermark['latest']
+    trend_points, precipitation_points = watermark.get('trend_points'), watermark.get('precipitation_points')
+    n_rows = 0
+    for side, start_date, end_date in windows:
+        df = fetch_window(filters, side, start_date, end_date)
+        if df.empty:
+            continue
+        # a location or measure without a trace yet, or a trace past its point budget, needs the figures rebuilt
+        traces = trend_traces(df, filters[3], normal_bands=shows_normal_bands(filters))
+        trend_points = patch_traces(trend, watermark['trend'], trend_points, traces, side)
+        if trend_points is not None:
+            precipitation_points = patch_traces(
+                precipitation, watermark['precipitation'], precipitation_points, precipitation_traces(df), side,
+            )
+        if trend_points is None or precipitation_points is None:
+            return full_update(filters)
+        summary = merge_summary(summary, summary_parts(df))
+        first, last = period_bounds(df)
+        earliest, latest = min(earliest, first), max(latest, last)
+        n_rows += len(df)
+    logging.info(f'Patched {n_rows} new rows into the daily weather figures for {filters}.')
+    watermark = {
+        **watermark,
+        'filters': list(filters),
+        'versions': [list(version) for version in versions],
+        'earliest': earliest,
+        'latest': latest,
+        'summary': summary,
+        'trend_points': trend_points,
+        'precipitation_points': precipitation_points,
+    }
+    if not n_rows:
+        return no_update, no_update, no_update, watermark
+    return trend, precipitation, summary_cards(summarize(summary)), watermark
+
+def refresh_update(filters, watermark, zoomed, ticked):
+    windows = plan_update(watermark, filters)
+    if not ticked:
+        # date changes that cannot be patched are left to the full rebuild
+        if windows is None:
+            raise PreventUpdate
+        return full_update(filters) if zoomed else patch_update(filters, watermark, windows, table_versions(filter_query(filters)[0]))
+    # a zoomed view is left alone, it catches up on the next tick after the zoom is reset
+    if not watermark or zoomed:
+        raise PreventUpdate
+    versions = table_versions(filter_query(filters)[0])
+    changed = [list(version) for version in versions] != watermark.get('versions')
+    if windows is None:
+        if not changed:
+            raise PreventUpdate
+        return full_update(filters)
+    # without the ETL's table versions there is no telling, so every tick looks for new rows
+    if not changed and TABLE_VERSIONS_PATH:
+        raise PreventUpdate
+    return patch_update(filters, watermark, windows, versions)
+
+def register_callbacks(app):
+    filter_inputs = [
+        ('daily-weather-dates', 'start_date'),
+        ('daily-weather-dates', 'end_date'),
+        ('daily-weather-granularity', 'value'),
+        ('daily-weather-measures', 'value'),
+        ('daily-weather-locations', 'value'),
+    ]
+
+    # runs in the background manager so slow warehouse queries don't tie up a web worker
+    @app.callback(
+        Output('daily-weather-trend', 'figure'),
+        Output('daily-weather-precipitation', 'figure'),
+        Output('daily-weather-summary', 'children'),
+        Output('daily-weather-watermark', 'data'),
+        *[Input(component_id, prop) for component_id, prop in filter_inputs],
+        State('daily-weather-watermark', 'data'),
+        background=True,
+        running=[(Output('daily-weather-status', 'children'), 'Loading weather data…', '')],
+    )
+    def update_daily_weather(start_date, end_date, granularity, measures, locations, watermark):
+        filters = filter_set(start_date, end_date, granularity, measures, locations)
+        # a wider date range over the same hourly series is patched in by refresh_daily_weather
+        if plan_update(watermark, filters) is not None:
+            raise PreventUpdate
+        return full_update(filters)
+
+    @app.callback(
+        Output('daily-weather-trend', 'figure', allow_duplicate=True),
+        Output('daily-weather-precipitation', 'figure', allow_duplicate=True),
+        Output('daily-weather-summary', 'children', allow_duplicate=True),
+        Output('daily-weather-watermark', 'data', allow_duplicate=True),
+        Input('daily-weather-refresh', 'n_intervals'),
+        Input('daily-weather-dates', 'start_date'),
+        Input('daily-weather-dates', 'end_date'),
+        *[State(component_id, prop) for component_id, prop in filter_inputs[2:]],
+        State('daily-weather-watermark', 'data'),
+        State('daily-weather-trend', 'relayoutData'),
+        prevent_initial_call=True,
+    )
+    def refresh_daily_weather(n_intervals, start_date, end_date, granularity, measures, locations, watermark, relayout_data):
+        filters = filter_set(start_date, end_date, granularity, measures, locations)
+        ticked = ctx.triggered_id == 'daily-weather-refresh'
+        return refresh_update(filters, watermark, zoom_range(relayout_data) is not None, ticked)
+
+    @app.callback(
+        Output('daily-weather-watermark', 'data', allow_duplicate=True),
+        Input('daily-weather-trend', 'relayoutData'),
+        prevent_initial_call=True,
+    )
+    def rebase_on_zoom(relayout_data):
+        # zoom resampling redraws the traces, so they no longer match the watermark's
+        if not is_zoom_event(relayout_data):
+            raise PreventUpdate
+        watermark = Patch()
+        watermark['stale'] = True
+        return watermark
+
+    register_zoom_resampling(
+        app, 'daily-weather-trend', zoomed_trend,
+        states=[State(component_id, prop) for component_id, prop in filter_inputs],
+    )
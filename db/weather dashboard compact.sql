@@ -0,0 +1,169 @@
+CREATE TABLE "hourly_weather_data" (
+  "id" bigint NOT NULL,
+  "location_id" varchar(50) NOT NULL DEFAULT '',
+  "date_id" int NOT NULL,
+  "time_id" smallint,
+  "temperature_2m" numeric,
+  "relative_humidity_2m" numeric,
+  "dew_point_2m" numeric,
+  "apparent_temperature" numeric,
+  "precipitation" numeric,
+  "weather_code" smallint,
+  "cloud_cover" numeric,
+  "wind_speed_10m" numeric,
+  "wind_direction_10m" numeric,
+  "wind_gusts_10m" numeric,
+  "is_day" smallint,
+  "sunshine_duration" numeric,
+  PRIMARY KEY ("location_id", "id", "date_id")
+) PARTITION BY RANGE ("date_id");
+
+CREATE TABLE "hourly_weather_data_2020" PARTITION OF "hourly_weather_data" FOR VALUES FROM (20200101) TO (20210101);
+CREATE TABLE "hourly_weather_data_2021" PARTITION OF "hourly_weather_data" FOR VALUES FROM (20210101) TO (20220101);
+CREATE TABLE "hourly_weather_data_2022" PARTITION OF "hourly_weather_data" FOR VALUES FROM (20220101) TO (20230101);
+CREATE TABLE "hourly_weather_data_2023" PARTITION OF "hourly_weather_data" FOR VALUES FROM (20230101) TO (20240101);
+CREATE TABLE "hourly_weather_data_2024" PARTITION OF "hourly_weather_data" FOR VALUES FROM (20240101) TO (20250101);
+CREATE TABLE "hourly_weather_data_2025" PARTITION OF "hourly_weather_data" FOR VALUES FROM (20250101) TO (20260101);
+CREATE TABLE "hourly_weather_data_2026" PARTITION OF "hourly_weather_data" FOR VALUES FROM (20260101) TO (20270101);
+CREATE TABLE "hourly_weather_data_default" PARTITION OF "hourly_weather_data" DEFAULT;
+
+CREATE TABLE "daily_weather_data" (
+  "location_id" varchar(50) NOT NULL DEFAULT '',
+  "date_id" int NOT NULL,
+  "weather_code" smallint,
+  "sunrise" varchar(5),
+  "sunset" varchar(5),
+  "daylight_duration" numeric,
+  PRIMARY KEY ("location_id", "date_id")
+);
+
+CREATE TABLE "air_quality_data" (
+  "id" bigint NOT NULL,
+  "location_id" varchar(50) NOT NULL DEFAULT '',
+  "date_id" int NOT NULL,
+  "time_id" smallint,
+  "pm10" numeric,
+  "pm2_5" numeric,
+  "carbon_monoxide" numeric,
+  "nitrogen_dioxide" numeric,
+  "sulphur_dioxide" numeric,
+  "ozone" numeric,
+  "us_aqi" numeric,
+  "european_aqi" numeric,
+  PRIMARY KEY ("location_id", "id")
+);
+
+CREATE TABLE "weather_code" (
+  "id" smallint PRIMARY KEY,
+  "name" varchar(50)
+);
+
+CREATE TABLE "times_of_day" (
+  "id" smallint PRIMARY KEY,
+  "name" varchar(20)
+);
+
+CREATE TABLE "dim_date" (
+  "id" int PRIMARY KEY,
+  "date" date,
+  "year" smallint,
+  "quarter" smallint,
+  "month" smallint,
+  "day" smallint
+);
+
+CREATE TABLE "dim_time" (
+  "id" smallint PRIMARY KEY,
+  "time" time,
+  "hour" smallint
+);
+
+ALTER TABLE "hourly_weather_data" ADD FOREIGN KEY ("weather_code") REFERENCES "weather_code" ("id");
+
+ALTER TABLE "hourly_weather_data" ADD FOREIGN KEY ("is_day") REFERENCES "times_of_day" ("id");
+
+ALTER TABLE "hourly_weather_data" ADD FOREIGN KEY ("date_id") REFERENCES "dim_date" ("id");
+
+ALTER TABLE "hourly_weather_data" ADD FOREIGN KEY ("time_id") REFERENCES "dim_time" ("id");
+
+ALTER TABLE "daily_weather_data" ADD FOREIGN KEY ("date_id") REFERENCES "dim_date" ("id");
+
+ALTER TABLE "air_quality_data" ADD FOREIGN KEY ("date_id") REFERENCES "dim_date" ("id");
+
+ALTER TABLE "air_quality_data" ADD FOREIGN KEY ("time_id") REFERENCES "dim_time" ("id");
+
+CREATE INDEX ON "hourly_weather_data" ("date_id", "location_id");
+
+CREATE INDEX ON "hourly_weather_data" ("time_id");
+
+CREATE INDEX ON "hourly_weather_data" ("weather_code");
+
+CREATE INDEX ON "hourly_weather_data" ("is_day");
+
+CREATE INDEX ON "air_quality_data" ("date_id", "location_id");
+
+CREATE TABLE "daily_weather_summary" (
+  "location_id" varchar(50),
+  "date_id" int NOT NULL,
+  "temperature_2m_mean" numeric,
+  "temperature_2m_min" numeric,
+  "temperature_2m_max" numeric,
+  "apparent_temperature_mean" numeric,
+  "relative_humidity_2m_mean" numeric,
+  "dew_point_2m_mean" numeric,
+  "cloud_cover_mean" numeric,
+  "wind_speed_10m_mean" numeric,
+  "wind_speed_10m_max" numeric,
+  "wind_gusts_10m_max" numeric,
+  "precipitation_sum" numeric,
+  "sunshine_duration_sum" numeric,
+  "hours" int,
+  "sunshine_hours" numeric,
+  "weather_code" smallint
+);
+
+CREATE TABLE "monthly_weather_summary" (LIKE "daily_weather_summary");
+
+ALTER TABLE "monthly_weather_summary" RENAME COLUMN "date_id" TO "month_id";
+
+CREATE UNIQUE INDEX ON "daily_weather_summary" ("date_id", "location_id");
+
+CREATE UNIQUE INDEX ON "monthly_weather_summary" ("month_id", "location_id");
+
+CREATE TABLE "wide_weather_data" (
+  "id" bigint NOT NULL,
+  "location_id" varchar(50),
+  "date_id" int NOT NULL,
+  "time_id" smallint,
+  "date" date,
+  "quarter" int,
+  "month" int,
+  "year" int,
+  "time" time,
+  "is_day" varchar(20),
+  "weather_code" varchar(50),
+  "temperature_2m" numeric,
+  "relative_humidity_2m" numeric,
+  "dew_point_2m" numeric,
+  "apparent_temperature" numeric,
+  "precipitation" numeric,
+  "cloud_cover" numeric,
+  "wind_speed_10m" numeric,
+  "wind_gusts_10m" numeric,
+  "wind_direction_10m" numeric,
+  "sunshine_duration" numeric,
+  "sunrise" varchar(5),
+  "sunset" varchar(5),
+  "daylight_duration" numeric
+) PARTITION BY RANGE ("date_id");
+
+CREATE TABLE "wide_weather_data_2020" PARTITION OF "wide_weather_data" FOR VALUES FROM (20200101) TO (20210101);
+CREATE TABLE "wide_weather_data_2021" PARTITION OF "wide_weather_data" FOR VALUES FROM (20210101) TO (20220101);
+CREATE TABLE "wide_weather_data_2022" PARTITION OF "wide_weather_data" FOR VALUES FROM (20220101) TO (20230101);
+CREATE TABLE "wide_weather_data_2023" PARTITION OF "wide_weather_data" FOR VALUES FROM (20230101) TO (20240101);
+CREATE TABLE "wide_weather_data_2024" PARTITION OF "wide_weather_data" FOR VALUES FROM (20240101) TO (20250101);
+CREATE TABLE "wide_weather_data_2025" PARTITION OF "wide_weather_data" FOR VALUES FROM (20250101) TO (20260101);
+CREATE TABLE "wide_weather_data_2026" PARTITION OF "wide_weather_data" FOR VALUES FROM (20260101) TO (20270101);
+CREATE TABLE "wide_weather_data_default" PARTITION OF "wide_weather_data" DEFAULT;
+
+CREATE INDEX ON "wide_weather_data" ("date_id", "location_id");
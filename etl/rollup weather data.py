@@ -0,0 +1,6 @@
+import sys
+
+from weather_etl.cli import main
+
+if __name__ == '__main__':
+    raise SystemExit(main(['rollups'] + sys.argv[1:]))
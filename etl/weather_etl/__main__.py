@@ -0,0 +1,3 @@
+from weather_etl.cli import main
+
+raise SystemExit(main())
@@ -0,0 +1,140 @@
+import glob
+import logging
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from weather_etl.sink import local_table_name
+from weather_etl.transform import COMPACT_KEYS
+
+ARROW_PIPELINE = os.getenv('ARROW_PIPELINE', '0') == '1'
+STAGING_DIR = os.getenv('STAGING_DIR', '.etl_staging')
+STAGING_COMPRESSION = os.getenv('STAGING_COMPRESSION', 'zstd')
+# low-cardinality columns; dictionary-encoding the measures costs time and buys nothing
+DICTIONARY_COLUMNS = ['location_id', 'date_id', 'time_id', 'weather_code', 'is_day', 'sunrise', 'sunset']
+
+def timestamps(block):
+    seconds = np.arange(block.Time(), block.TimeEnd(), block.Interval(), dtype=np.int64)
+    return pa.array(seconds).cast(pa.timestamp('s', tz='UTC'))
+
+def block_table(block, values, location_id=None):
+    # pa.array wraps the SDK's numpy buffers without copying them; from_pandas only adds a null bitmap for NaN
+    dates = timestamps(block)
+    columns = {}
+    if location_id is not None:
+        columns['location_id'] = pa.repeat(location_id, len(dates))
+    for name, array in values.items():
+        columns[name] = pa.array(array, from_pandas=True)
+    columns['date'] = dates
+    return pa.table(columns)
+
+def concat_tables(tables):
+    return pa.concat_tables(tables)
+
+def broadcast_labels(values, label):
+    # label each distinct value once and broadcast through the dictionary indices
+    encoded = pc.dictionary_encode(values.combine_chunks() if isinstance(values, pa.ChunkedArray) else values)
+    return pc.take(label(encoded.dictionary), encoded.indices)
+
+def epoch_days(dates):
+    return pc.divide(pc.cast(dates, pa.int64()), 86400)
+
+def date_id_array(dates, compact=COMPACT_KEYS):
+    def label(days):
+        days = pc.cast(pc.cast(days, pa.int32()), pa.date32())
+        if compact:
+            return pc.cast(pc.add(pc.add(pc.multiply(pc.year(days), 10000), pc.multiply(pc.month(days), 100)), pc.day(days)), pa.int32())
+        return pc.strftime(pc.cast(days, pa.timestamp('s')), format='%Y%m%d')
+    return broadcast_labels(epoch_days(dates), label)
+
+def time_id_array(dates, compact=COMPACT_KEYS):
+    seconds = pc.subtract(pc.cast(dates, pa.int64()), pc.multiply(epoch_days(dates), 86400))
+    hhmm = pc.add(pc.multiply(pc.divide(seconds, 3600), 100), pc.divide(pc.subtract(seconds, pc.multiply(pc.divide(seconds, 3600), 3600)), 60))
+    if compact:
+        return pc.cast(hhmm, pa.int16())
+    return broadcast_labels(hhmm, lambda values: pc.utf8_lpad(pc.cast(values, pa.string()), width=4, padding='0'))
+
+def code_array(values, compact=COMPACT_KEYS, width=2):
+    if compact:
+        return pc.cast(values, pa.int16())
+    return broadcast_labels(
+        pc.cast(values, pa.int64()), lambda codes: pc.utf8_lpad(pc.cast(codes, pa.string()), width=width, padding='0')
+    )
+
+def nullable_floats(values):
+    # NaN was already turned into null at extraction, so this matches to_nullable_floats
+    return pc.cast(values, pa.float64())
+
+def clock_time_array(seconds, target_timezone):
+    dates = pc.cast(seconds, pa.timestamp('s', tz='UTC')).cast(pa.timestamp('s', tz=target_timezone))
+    return pc.strftime(dates, format='%H:%M')
+
+def _replace(table, name, values):
+    return table.set_column(table.schema.get_field_index(name), name, values)
+
+def transform_hourly_table(table, compact=COMPACT_KEYS):
+    dates = table['date']
+    date_ids = date_id_array(dates, compact)
+    time_ids = time_id_array(dates, compact)
+    if compact:
+        ids = pc.add(pc.multiply(pc.cast(date_ids, pa.int64()), 10000), pc.cast(time_ids, pa.int64()))
+    else:
+        ids = pc.binary_join_element_wise(date_ids, time_ids, '')
+    table = table.drop_columns(['date'])
+    for name in table.column_names:
+        if name in ['weather_code', 'is_day']:
+            table = _replace(table, name, code_array(table[name], compact))
+        elif name != 'location_id':
+            table = _replace(table, name, nullable_floats(table[name]))
+    return table.append_column('date_id', date_ids).append_column('time_id', time_ids).append_column('id', ids)
+
+def transform_daily_table(table, target_timezone, compact=COMPACT_KEYS):
+    date_ids = date_id_array(table['date'], compact)
+    table = table.drop_columns(['date'])
+    for name in table.column_names:
+        if name == 'weather_code':
+            table = _replace(table, name, code_array(table[name], compact))
+        elif name in ['sunrise', 'sunset']:
+            table = _replace(table, name, clock_time_array(table[name], target_timezone))
+        elif name != 'location_id':
+            table = _replace(table, name, nullable_floats(table[name]))
+    return table.append_column('date_id', date_ids)
+
+def staging_path(table_name, date_range, staging_dir=STAGING_DIR):
+    return os.path.join(
+        staging_dir, local_table_name(table_name), f"{date_range['start_date']}_{date_range['end_date']}.parquet"
+    )
+
+def write_staging(table, table_name, date_range, staging_dir=STAGING_DIR):
+    # one file per window, so reruns overwrite and the directory replays as an archive
+    path = staging_path(table_name, date_range, staging_dir)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(
+            table, path + '.tmp', compression=STAGING_COMPRESSION,
+            use_dictionary=[col for col in table.column_names if col in DICTIONARY_COLUMNS],
+        )
+        os.replace(path + '.tmp', path)
+        logging.info(f'Wrote {table.num_rows} rows to staging file {path}.')
+        return path
+    except Exception as e:
+        logging.error(f'Error writing staging file: {e}')
+        raise
+
+def staged_files(table_name, staging_dir=STAGING_DIR):
+    return sorted(glob.glob(os.path.join(staging_dir, local_table_name(table_name), '*.parquet')))
+
+def unique_date_ids(table):
+    return pc.unique(table['date_id']).to_pylist()
+
+def max_date_id(table):
+    return pc.max(table['date_id']).as_py()
+
+def staged_columns(path):
+    return pq.read_schema(path).names
+
+def read_staged(path, columns=None):
+    return pq.read_table(path, columns=columns)
@@ -0,0 +1,135 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from weather_etl.arrow import staged_files
+from weather_etl.state import read_state, update_state
+from weather_etl.upsert import get_watermark, incremental_date_range
+
+WINDOW_FREQ = os.getenv('BACKFILL_WINDOW', 'MS')
+MAX_WORKERS = int(os.getenv('BACKFILL_WORKERS', 4))
+
+def split_date_range(start_date, end_date, freq=WINDOW_FREQ):
+    start = pd.Timestamp(start_date).normalize()
+    end = pd.Timestamp(end_date).normalize()
+    if end < start:
+        raise ValueError(f'end_date {end_date} is before start_date {start_date}.')
+    boundaries = pd.date_range(start, end, freq=freq)
+    starts = [start] + [b for b in boundaries if b > start]
+    ends = [s - pd.Timedelta(days=1) for s in starts[1:]] + [end]
+    return [
+        {'start_date': s.strftime('%Y-%m-%d'), 'end_date': e.strftime('%Y-%m-%d')}
+        for s, e in zip(starts, ends)
+    ]
+
+def _window_key(window):
+    return f"{window['start_date']}_{window['end_date']}"
+
+def run_backfill(name, windows, process_window, max_workers=MAX_WORKERS, checkpoint=True):
+    state_name = f'{name}_backfill'
+    done = set(read_state(state_name).get('completed', [])) if checkpoint else set()
+    pending = [window for window in windows if _window_key(window) not in done]
+    logging.info(f'Backfill {name}: {len(windows) - len(pending)} windows done, {len(pending)} pending.')
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(process_window, window): window for window in pending}
+        for future in as_completed(futures):
+            window = futures[future]
+            try:
+                future.result()
+                done.add(_window_key(window))
+                if checkpoint:
+                    update_state(state_name, completed=sorted(done))
+                logging.info(f"Backfill {name}: window {window['start_date']} - {window['end_date']} done.")
+            except Exception as e:
+                failed.append(window)
+                logging.error(f"Backfill {name}: window {window['start_date']} - {window['end_date']} failed: {e}")
+
+    if failed:
+        raise RuntimeError(f'Backfill {name}: {len(failed)} windows failed, re-run to resume.')
+    logging.info(f'Backfill {name} completed: {len(windows)} windows.')
+
+def require_rows(process_date_range):
+    def process_window(date_range):
+        if process_date_range(date_range) is None:
+            raise RuntimeError(f"No data returned for {date_range['start_date']} - {date_range['end_date']}.")
+    return process_window
+
+def execute_incremental(table_names, process_date_range, date_range, load_mode):
+    try:
+        if load_mode == 'upsert':
+            # the laggiest table decides the window, the merge absorbs the overlap for the others
+            watermarks = [get_watermark(table_name) for table_name in table_names]
+            watermark = None if None in watermarks else min(watermarks, default=None)
+            date_range = incremental_date_range(date_range, watermark)
+            if date_range is None:
+                logging.info('Tables are up to date with their watermarks, nothing to load.')
+                return
+        process_date_range(date_range)
+    except Exception as e:
+        logging.error(f'An error occurred: {str(e)}')
+        raise
+
+def execute_date_range_backfill(name, start_date, end_date, process_date_range):
+    try:
+        windows = split_date_range(start_date, end_date)
+        run_backfill(name, windows, require_rows(process_date_range))
+    except Exception as e:
+        logging.error(f'Backfill failed: {str(e)}')
+        raise
+
+def execute_gap_backfill(name, sink, table_name, min_rows, process_date_range):
+    try:
+        loaded = fetch_loaded_date_ids(sink, table_name, min_rows=min_rows)
+        dim_dates = fetch_dim_date_ids(sink, os.getenv('DATE_TABLE'))
+        windows = find_missing_windows(loaded, dim_dates)
+        run_backfill(f'{name}_gaps', windows, require_rows(process_date_range), checkpoint=False)
+    except Exception as e:
+        logging.error(f'Gap fill failed: {str(e)}')
+        raise
+
+def execute_staged_replay(sink, table_name, load_staged_file):
+    try:
+        paths = staged_files(table_name)
+        # replayed windows may overlap what is already loaded, so always merge
+        n_rows = sum(load_staged_file(sink, path, mode='upsert') for path in paths)
+        logging.info(f'Replayed {n_rows} rows from {len(paths)} staging files of {table_name}.')
+    except Exception as e:
+        logging.error(f'Replay of {table_name} staging files failed: {str(e)}')
+        raise
+
+def fetch_loaded_date_ids(sink, table_name, min_rows=1):
+    query = f"""
+        select date_id
+        from {sink.quote(table_name)}
+        group by date_id
+        having count(*) >= {int(min_rows)}
+    """
+    return set(sink.query(query)['date_id'].astype(str))
+
+def fetch_dim_date_ids(sink, date_table):
+    query = f'select id from {sink.quote(date_table)}'
+    return set(sink.query(query)['id'].astype(str))
+
+def find_missing_windows(loaded_date_ids, dim_date_ids, end_date=None, freq=WINDOW_FREQ):
+    end_date = pd.Timestamp(end_date or pd.Timestamp.now().normalize() - pd.DateOffset(days=1))
+    missing = sorted(
+        pd.Timestamp(date_id) for date_id in set(dim_date_ids) - set(loaded_date_ids)
+        if pd.Timestamp(date_id) <= end_date
+    )
+    windows = []
+    run_start = run_end = None
+    for day in missing:
+        if run_end is not None and day - run_end == pd.Timedelta(days=1):
+            run_end = day
+            continue
+        if run_start is not None:
+            windows.extend(split_date_range(run_start, run_end, freq))
+        run_start = run_end = day
+    if run_start is not None:
+        windows.extend(split_date_range(run_start, run_end, freq))
+    logging.info(f'Found {len(missing)} missing days in {len(windows)} windows.')
+    return windows
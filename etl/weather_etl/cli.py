@@ -0,0 +1,344 @@
+import argparse
+import glob
+import importlib
+import logging
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+from weather_etl.env import load_environment
+from weather_etl.locations import load_locations
+from weather_etl.spec import (
+    DIMENSIONS, ENDPOINTS, active_frames, dimension_project, dimension_table, endpoint_frames, endpoint_url,
+    frame_table, frame_variables,
+)
+from weather_etl.state import read_state
+
+# only the standard library and the declarative spec are imported up front: the pipeline modules pull in
+# pandas, pyarrow and the API and warehouse clients, so they are imported once a subcommand really runs
+PIPELINES = ['hourly', 'daily', 'combined']
+PIPELINE_MODES = {
+    'hourly': ['latest', 'backfill', 'gaps', 'replay'],
+    'daily': ['latest', 'backfill', 'gaps', 'replay'],
+    'combined': ['latest', 'backfill'],
+}
+LOAD_MODES = ['append', 'upsert']
+BACKFILL_STATES = {'hourly': 'hourly_weather', 'daily': 'daily_weather', 'combined': 'combined_weather'}
+# options that only set what the pipeline modules already read from the environment at import time
+ENV_OVERRIDES = {
+    'load_mode': 'LOAD_MODE',
+    'locations': 'LOCATIONS_FILE',
+    'backend': 'WAREHOUSE_BACKEND',
+}
+
+def iso_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{value!r} is not a YYYY-MM-DD date')
+
+def dimension(value):
+    if value not in DIMENSIONS:
+        raise argparse.ArgumentTypeError(f'{value!r} is not one of {", ".join(DIMENSIONS)}')
+    return value
+
+def yesterday():
+    return (date.today() - timedelta(days=1)).isoformat()
+
+def requested_range(args):
+    end_date = args.end or yesterday()
+    return {'start_date': args.start or end_date, 'end_date': end_date}
+
+def backfill_range(args):
+    start_date = args.start or os.getenv('BACKFILL_START_DATE')
+    end_date = args.end or os.getenv('BACKFILL_END_DATE')
+    if not start_date or not end_date:
+        raise SystemExit('A backfill needs --start and --end, or BACKFILL_START_DATE and BACKFILL_END_DATE.')
+    return start_date, end_date
+
+def pipeline_frames(pipeline):
+    return active_frames() if pipeline == 'combined' else [pipeline]
+
+def apply_overrides(args):
+    for option, env_name in ENV_OVERRIDES.items():
+        value = getattr(args, option, None)
+        if value is not None:
+            os.environ[env_name] = value
+
+def watermark_date(watermark):
+    return datetime.strptime(str(watermark).replace('-', '')[:8], '%Y%m%d').date()
+
+def pending_range(date_range, tables):
+    # same rule as upsert.incremental_date_range, the laggiest table decides the window
+    watermarks = [read_state('watermarks').get(table) for table in tables]
+    if not watermarks or None in watermarks:
+        return date_range, None
+    watermark = min(watermarks)
+    start = max(date.fromisoformat(date_range['start_date']), watermark_date(watermark) + timedelta(days=1))
+    if start > date.fromisoformat(date_range['end_date']):
+        return None, watermark
+    return {**date_range, 'start_date': start.isoformat()}, watermark
+
+def cache_plan():
+    from weather_etl import http_cache
+
+    backend = http_cache.HTTP_CACHE_BACKEND
+    if backend == 'none':
+        return 'http cache: off'
+    path = http_cache.HTTP_CACHE_PATH or http_cache.DEFAULT_PATHS.get(backend, '<unknown backend>')
+    return (f'http cache: {backend} at {path}, capped at {http_cache.HTTP_CACHE_MAX_MB:.0f} MB, '
+            f'windows ending before {http_cache.settled_before()} kept until evicted')
+
+def plan_pipeline(args):
+    from weather_etl.fetch import BATCH_SIZE
+
+    mode = args.mode
+    frames = pipeline_frames(args.pipeline)
+    lines = [f'pipeline: {args.pipeline} ({mode})']
+    for endpoint, endpoint_group in endpoint_frames(frames).items():
+        lines.append(f'endpoint: {endpoint} {endpoint_url(endpoint) or "<unset>"} '
+                     f'(params: {", ".join(ENDPOINTS[endpoint]["params"])})')
+        for frame in endpoint_group:
+            lines.append(f'  {frame}: {len(frame_variables(frame))} variables -> {frame_table(frame) or "<unset>"}')
+    locations_file = os.getenv('LOCATIONS_FILE')
+    n_locations = len(load_locations(locations_file or None))
+    n_batches = -(-n_locations // BATCH_SIZE)
+    lines.append(f'locations: {n_locations} from {locations_file or "the default location"}, '
+                 f'{n_batches} request batches of up to {BATCH_SIZE}')
+    load_mode = os.getenv('LOAD_MODE', 'append')
+    lines.append(cache_plan())
+    if mode == 'backfill':
+        start_date, end_date = backfill_range(args)
+        done = read_state(f'{BACKFILL_STATES[args.pipeline]}_backfill').get('completed', [])
+        lines.append(f'dates: {start_date} .. {end_date} in {os.getenv("BACKFILL_WINDOW", "MS")} windows, '
+                     f'{len(done)} windows already checkpointed')
+    elif mode == 'gaps':
+        lines.append(f'dates: every day of {os.getenv("DATE_TABLE") or "<unset>"} missing from the fact table')
+    elif mode == 'replay':
+        staging_dir = os.getenv('STAGING_DIR', '.etl_staging')
+        paths = [path for frame in frames for path in
+                 glob.glob(os.path.join(staging_dir, (frame_table(frame) or '').split('.')[-1], '*.parquet'))]
+        lines.append(f'dates: {len(paths)} staged files under {staging_dir}, merged with upsert')
+    else:
+        date_range = requested_range(args)
+        if load_mode == 'upsert':
+            date_range, watermark = pending_range(date_range, [frame_table(frame) for frame in frames])
+            lines.append(f'watermark: {watermark or "none"}')
+        if date_range is None:
+            lines.append('dates: up to date, nothing to load')
+        else:
+            from weather_etl.http_cache import expire_after
+
+            ttl = expire_after(date_range)
+            lines.append(f"dates: {date_range['start_date']} .. {date_range['end_date']}, responses cached "
+                         f"{'until evicted' if ttl is None else f'for {ttl:.0f}s'}")
+    lines.append(f'warehouse: {os.getenv("WAREHOUSE_BACKEND", "bigquery")}, load mode {load_mode}, '
+                 f'arrow pipeline {"on" if os.getenv("ARROW_PIPELINE", "0") == "1" else "off"}')
+    return lines
+
+def run_pipeline(args):
+    module = importlib.import_module(f'weather_etl.{args.pipeline}')
+    if args.mode == 'backfill':
+        module.execute_backfill(*backfill_range(args))
+    elif args.mode == 'gaps':
+        module.execute_gap_fill()
+    elif args.mode == 'replay':
+        module.execute_replay()
+    else:
+        module.execute_pipeline(requested_range(args))
+    logging.info(f'{args.pipeline} pipeline completed.')
+
+def dim_end_date():
+    return date(date.today().year, 12, 31).isoformat()
+
+def dimension_names(args):
+    return args.names or list(DIMENSIONS)
+
+def plan_dims(args):
+    names = dimension_names(args)
+    lines = [f'dimensions: {", ".join(names)} (load mode {args.dim_load_mode})']
+    for name in names:
+        table_name = dimension_table(name) or '<unset>'
+        project = args.project or dimension_project(name) or '<default>'
+        if name == 'date':
+            source = f'{args.start or os.getenv("DIM_START_DATE", "2020-01-01")} .. {args.end or dim_end_date()}'
+        elif name == 'time':
+            source = '24 hours'
+        else:
+            source = f"sheet {DIMENSIONS[name]['sheet']} of {args.mapping_file}"
+        lines.append(f'  {name}: {source} -> {table_name} (project {project})')
+    lines.append(f'warehouse: {os.getenv("WAREHOUSE_BACKEND", "bigquery")}')
+    return lines
+
+def run_dims(args):
+    from weather_etl import dims
+
+    dims.execute_pipeline(
+        dimension_names(args), args.start or dims.DIM_START_DATE, args.end, args.mapping_file, args.dim_load_mode, args.project,
+    )
+
+def rollup_range(args):
+    return args.start or os.getenv('ROLLUP_START_DATE', '2020-01-01'), args.end or os.getenv('ROLLUP_END_DATE', '2025-06-30')
+
+def plan_rollups(args):
+    start_date, end_date = rollup_range(args)
+    return [
+        f'rollups: {os.getenv("HOURLY_WEATHER_TABLE") or "<unset>"} -> '
+        f'{os.getenv("DAILY_ROLLUP_TABLE") or "<unset>"}, {os.getenv("MONTHLY_ROLLUP_TABLE") or "<unset>"}',
+        f'dates: {start_date} .. {end_date}',
+        f'warehouse: {os.getenv("WAREHOUSE_BACKEND", "bigquery")}',
+    ]
+
+def run_rollups(args):
+    from weather_etl.metrics import stage
+    from weather_etl.rollup import rebuild_rollups
+    from weather_etl.sink import get_sink
+
+    start_date, end_date = rollup_range(args)
+    try:
+        with stage('rollups', 'rebuild'):
+            rebuild_rollups(get_sink(os.getenv('GOOGLE_CLOUD_PROJECT')), os.getenv('HOURLY_WEATHER_TABLE'),
+                            start_date, end_date, bool(os.getenv('LOCATIONS_FILE')))
+    except Exception as e:
+        logging.error(f'An error occurred: {str(e)}')
+        raise
+
+def climatology_range(args):
+    return args.start or os.getenv('CLIMATOLOGY_START_DATE', '2020-01-01'), args.end or yesterday()
+
+def plan_climatology(args):
+    start_date, end_date = climatology_range(args)
+    return [
+        f'climatology: {os.getenv("HOURLY_WEATHER_TABLE") or "<unset>"} -> {os.getenv("CLIMATOLOGY_DIR") or "<unset>"}'
+        + (' (reset)' if args.reset else ''),
+        f'dates: {start_date} .. {end_date}',
+        f'warehouse: {os.getenv("WAREHOUSE_BACKEND", "bigquery")}',
+    ]
+
+def run_climatology(args):
+    from weather_etl.climatology import rebuild_climatology
+    from weather_etl.metrics import stage
+    from weather_etl.sink import get_sink
+
+    start_date, end_date = climatology_range(args)
+    try:
+        with stage('climatology', 'rebuild') as current:
+            current.output(rebuild_climatology(
+                get_sink(os.getenv('GOOGLE_CLOUD_PROJECT')), os.getenv('HOURLY_WEATHER_TABLE'), start_date, end_date,
+                bool(os.getenv('LOCATIONS_FILE')), os.getenv('CLIMATOLOGY_DIR'), args.reset,
+            ))
+    except Exception as e:
+        logging.error(f'An error occurred: {str(e)}')
+        raise
+
+def plan_schedule(args):
+    from weather_etl.scheduler import SCHEDULER_DB, next_fire, parse_cron
+
+    cron = os.getenv('SCHEDULE_CRON', '30 1 * * *')
+    run_once = args.once or os.getenv('SCHEDULER_RUN_ONCE', '0') == '1'
+    return [
+        f'schedule: weather dag on {cron!r}, next run at {next_fire(parse_cron(cron), datetime.now())}',
+        f'mode: {"one run now" if run_once else "serve until stopped"}, run history in {SCHEDULER_DB}',
+        f'derived tables: {"deferred to the derived_tables task" if os.getenv("DEFER_DERIVED_TABLES") == "1" else "refreshed by each fact task"}',
+    ]
+
+def run_schedule(args):
+    from weather_etl import jobs
+    from weather_etl.metrics import METRICS_PORT, serve_metrics
+
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
+    if not jobs.execute_schedule(args.once or jobs.SCHEDULER_RUN_ONCE):
+        return 1
+
+def run_name(args):
+    if args.command == 'backfill':
+        return f'backfill-{args.pipeline}'
+    if getattr(args, 'mode', 'latest') != 'latest':
+        return f'{args.command}-{args.mode}'
+    return args.command
+
+def add_common(parser):
+    parser.add_argument('--dry-run', action='store_true', help='print the plan without importing or calling anything heavy')
+    parser.add_argument('--backend', help='warehouse backend, overrides WAREHOUSE_BACKEND')
+
+def add_pipeline(subparsers, pipeline, help_text):
+    parser = subparsers.add_parser(pipeline, help=help_text)
+    parser.add_argument('--mode', choices=PIPELINE_MODES[pipeline], default=os.getenv('ETL_MODE', 'latest'),
+                        help='defaults to ETL_MODE or latest')
+    parser.add_argument('--start', type=iso_date, help='first date to load (latest mode defaults to yesterday)')
+    parser.add_argument('--end', type=iso_date, help='last date to load')
+    parser.add_argument('--load-mode', choices=LOAD_MODES, help='overrides LOAD_MODE')
+    parser.add_argument('--locations', help='CSV or JSON location list, overrides LOCATIONS_FILE')
+    add_common(parser)
+    parser.set_defaults(pipeline=pipeline, plan=plan_pipeline, run=run_pipeline)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='weather-etl', description='Open-Meteo weather ETL pipelines.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_pipeline(subparsers, 'hourly', 'load hourly weather')
+    add_pipeline(subparsers, 'daily', 'load daily weather')
+    add_pipeline(subparsers, 'combined', 'load hourly, daily and air quality with one request per location batch')
+
+    backfill = subparsers.add_parser('backfill', help='load a historical date range in checkpointed windows')
+    backfill.add_argument('pipeline', choices=PIPELINES)
+    backfill.add_argument('--start', type=iso_date, help='defaults to BACKFILL_START_DATE')
+    backfill.add_argument('--end', type=iso_date, help='defaults to BACKFILL_END_DATE')
+    backfill.add_argument('--load-mode', choices=LOAD_MODES, help='overrides LOAD_MODE')
+    backfill.add_argument('--locations', help='CSV or JSON location list, overrides LOCATIONS_FILE')
+    add_common(backfill)
+    backfill.set_defaults(mode='backfill', plan=plan_pipeline, run=run_pipeline)
+
+    dims = subparsers.add_parser('dims', help='load the date, time, timeshift and weather code dimensions')
+    dims.add_argument('names', nargs='*', type=dimension, metavar='dimension',
+                      help=f'any of {", ".join(DIMENSIONS)} (default: all)')
+    dims.add_argument('--start', type=iso_date, help='first date of the date dimension, defaults to DIM_START_DATE')
+    dims.add_argument('--end', type=iso_date, help='last date of the date dimension, defaults to the end of this year')
+    dims.add_argument('--mapping-file', default=os.getenv('MAPPING_FILE', 'weather mapping.xlsx'))
+    dims.add_argument('--load-mode', dest='dim_load_mode', choices=LOAD_MODES, default='upsert')
+    dims.add_argument('--project', help='warehouse project for every dimension instead of its own variable')
+    add_common(dims)
+    dims.set_defaults(plan=plan_dims, run=run_dims)
+
+    rollups = subparsers.add_parser('rollups', help='rebuild the daily and monthly rollups for a date range')
+    rollups.add_argument('--start', type=iso_date, help='defaults to ROLLUP_START_DATE')
+    rollups.add_argument('--end', type=iso_date, help='defaults to ROLLUP_END_DATE')
+    add_common(rollups)
+    rollups.set_defaults(plan=plan_rollups, run=run_rollups)
+
+    climatology = subparsers.add_parser('climatology', help='fold hourly history into the climatology index')
+    climatology.add_argument('--start', type=iso_date, help='defaults to CLIMATOLOGY_START_DATE')
+    climatology.add_argument('--end', type=iso_date, help='defaults to yesterday')
+    climatology.add_argument('--reset', action='store_true', help='drop the existing index first instead of folding into it')
+    add_common(climatology)
+    climatology.set_defaults(plan=plan_climatology, run=run_climatology)
+
+    schedule = subparsers.add_parser('schedule', help='run the weather DAG on its cron schedule')
+    schedule.add_argument('--once', action='store_true', help='run the DAG once now and exit, like SCHEDULER_RUN_ONCE')
+    add_common(schedule)
+    schedule.set_defaults(plan=plan_schedule, run=run_schedule)
+    return parser
+
+def main(argv=None):
+    load_environment()
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    apply_overrides(args)
+    if args.command == 'schedule':
+        # read at import time by the fact modules, which leave the rollups and wide table to the derived task
+        os.environ.setdefault('DEFER_DERIVED_TABLES', '1')
+    if args.dry_run:
+        print('\n'.join(args.plan(args)))
+        return 0
+    status = 'failed'
+    try:
+        result = args.run(args) or 0
+        status = 'success' if result == 0 else 'failed'
+        return result
+    finally:
+        # only a subcommand that actually fetched has built the client and its cache
+        if 'weather_etl.client' in sys.modules:
+            sys.modules['weather_etl.client'].log_cache_stats()
+        if 'weather_etl.metrics' in sys.modules:
+            sys.modules['weather_etl.metrics'].flush(run_name(args), status)
@@ -0,0 +1,41 @@
+import logging
+import threading
+
+from weather_etl.http_cache import CachePolicySession, open_cache
+
+_shared = None
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+def get_client(cache=None, retries=5, backoff_factor=0.2):
+    # imported here so that the CLI can parse arguments and dry-run without the HTTP stack
+    import openmeteo_requests
+    from retry_requests import retry
+
+    session = retry(retries=retries, backoff_factor=backoff_factor)
+    if cache is not None:
+        session = CachePolicySession(session, cache)
+    return openmeteo_requests.Client(session=session)
+
+def shared_client():
+    # built on first fetch and reused by every pipeline in the process
+    global _shared, _shared_cache
+    with _shared_lock:
+        if _shared is None:
+            _shared_cache = open_cache()
+            _shared = get_client(_shared_cache)
+        return _shared
+
+def cache_counters():
+    return _shared_cache.summary() if _shared_cache is not None else {}
+
+def log_cache_stats():
+    if _shared_cache is None:
+        return None
+    stats = _shared_cache.summary()
+    logging.info(
+        f"HTTP cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+        f"{stats['expired']} expired, {stats['evicted']} evicted, "
+        f"{stats['bytes_served'] / 1024 / 1024:.1f} MB served from cache, {stats['bytes_fetched'] / 1024 / 1024:.1f} MB fetched."
+    )
+    return stats
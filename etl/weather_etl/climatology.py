@@ -0,0 +1,228 @@
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from weather_etl.backfill import split_date_range
+from weather_etl.transform import COMPACT_KEYS
+
+CLIMATOLOGY_DIR = os.getenv('CLIMATOLOGY_DIR')
+PERCENTILES = [10, 25, 50, 75, 90]
+# one day-of-year x hour cell only gets one value a year, so the bands pool this many days either side
+CLIMATOLOGY_WINDOW_DAYS = int(os.getenv('CLIMATOLOGY_WINDOW_DAYS', 7))
+# fixed edges make the histograms mergeable by plain addition, values outside land in the end bins
+BINS = {
+    'temperature_2m': np.arange(-50, 60.5, 0.5),
+    'relative_humidity_2m': np.arange(0, 102, 1.0),
+    'precipitation': np.array([0, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 7.5, 10, 15, 20, 30, 50, 100, 200]),
+}
+# first day of the Open-Meteo archive, the folded-hours bitmap counts from here
+EPOCH = pd.Timestamp('1940-01-01')
+DEFAULT_LOCATION = 'default'
+DAYS = 366
+HOURS = 24
+
+_lock = threading.Lock()
+
+def location_file(climatology_dir, location_id=None):
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', str(location_id or DEFAULT_LOCATION))
+    return os.path.join(climatology_dir, f'{name}.npz')
+
+def calendar_days(dates):
+    # Feb 29 keeps a slot of its own, so Mar 1 is the same slot in leap and common years
+    dates = pd.DatetimeIndex(dates)
+    return (dates.dayofyear - 1 + ((~dates.is_leap_year) & (dates.month > 2))).to_numpy()
+
+def pool_days(counts, window_days=CLIMATOLOGY_WINDOW_DAYS):
+    # sum over a circular +-window along the day axis, so Jan 1 pools with late December
+    if window_days <= 0:
+        return counts.astype(np.uint32)
+    padded = np.concatenate([counts[-window_days:], counts, counts[:window_days]]).astype(np.uint32)
+    cumulative = np.concatenate([np.zeros((1,) + counts.shape[1:], dtype=np.uint32), np.cumsum(padded, axis=0, dtype=np.uint32)])
+    return cumulative[2 * window_days + 1:] - cumulative[:-2 * window_days - 1]
+
+def histogram_percentiles(counts, edges, percentiles=PERCENTILES):
+    cumulative = np.cumsum(counts, axis=-1)
+    total = cumulative[..., -1]
+    result = np.full(counts.shape[:-1] + (len(percentiles),), np.nan, dtype=np.float32)
+    for idx, percentile in enumerate(percentiles):
+        target = total * percentile / 100
+        # first bin reaching the target, then linear interpolation inside it
+        bins = np.minimum((cumulative < target[..., None]).sum(axis=-1), counts.shape[-1] - 1)
+        in_bin = np.take_along_axis(counts, bins[..., None], axis=-1)[..., 0]
+        below = np.take_along_axis(cumulative, bins[..., None], axis=-1)[..., 0] - in_bin
+        fraction = np.clip((target - below) / np.maximum(in_bin, 1), 0, 1)
+        values = edges[bins] + fraction * (edges[bins + 1] - edges[bins])
+        result[..., idx] = np.where(total > 0, values, np.nan)
+    return result
+
+def window_slots(days, window_days=CLIMATOLOGY_WINDOW_DAYS):
+    # every slot whose pooled window contains one of the given days
+    return np.unique((np.asarray(days)[:, None] + np.arange(-window_days, window_days + 1)) % DAYS)
+
+class LocationClimatology:
+    def __init__(self, hist=None, folded=None, saved_bands=None):
+        self.hist = hist or {
+            measure: np.zeros((DAYS, HOURS, len(edges) - 1), dtype=np.uint16) for measure, edges in BINS.items()
+        }
+        self.folded = folded if folded is not None else np.zeros(0, dtype=bool)
+        self.saved_bands = saved_bands
+        self.touched = set()
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as f:
+            for measure, edges in BINS.items():
+                if f'edges_{measure}' in f.files and not np.array_equal(f[f'edges_{measure}'], edges):
+                    raise ValueError(f'{path} was built with other {measure} bins, rebuild it with --reset.')
+            empty = cls()
+            hist = {measure: f[f'hist_{measure}'] if f'hist_{measure}' in f.files else empty.hist[measure] for measure in BINS}
+            folded = np.unpackbits(f['folded'], count=int(f['folded_hours'])).astype(bool)
+            saved_bands = None
+            # bands from another window or percentile set cannot be patched, they are recomputed in full
+            if int(f['window_days']) == CLIMATOLOGY_WINDOW_DAYS and f['percentiles'].tolist() == PERCENTILES:
+                saved_bands = {measure: f[f'bands_{measure}'] for measure in BINS if f'bands_{measure}' in f.files} or None
+        return cls(hist, folded, saved_bands)
+
+    def fold(self, df):
+        dates = pd.to_datetime(df['date_id'].astype(str), format='%Y%m%d')
+        hours = (pd.to_numeric(df['time_id']) // 100).to_numpy().astype(np.int64)
+        slots = (dates - EPOCH).dt.days.to_numpy() * HOURS + hours
+        if slots.min() < 0:
+            raise ValueError(f'Observations before {EPOCH.date()} cannot be folded into the climatology.')
+        if slots.max() >= len(self.folded):
+            self.folded = np.concatenate([self.folded, np.zeros(slots.max() + 1 - len(self.folded), dtype=bool)])
+        # an hour is counted once, however often its window is reloaded or replayed
+        _, first = np.unique(slots, return_index=True)
+        keep = first[~self.folded[slots[first]]]
+        if not len(keep):
+            return 0
+        days = calendar_days(dates.iloc[keep])
+        for measure, edges in BINS.items():
+            if measure not in df.columns:
+                continue
+            values = pd.to_numeric(df[measure]).to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+            valid = ~np.isnan(values)
+            bins = np.clip(np.searchsorted(edges, values[valid], side='right') - 1, 0, len(edges) - 2)
+            np.add.at(self.hist[measure], (days[valid], hours[keep][valid], bins), 1)
+        self.folded[slots[keep]] = True
+        self.touched.update(days.tolist())
+        return len(keep)
+
+    def bands(self, days=None):
+        # all slots, or only the given ones pooled straight from the histograms
+        result = {}
+        for measure, hist in self.hist.items():
+            if days is None:
+                pooled = pool_days(hist)
+            else:
+                window = np.arange(-CLIMATOLOGY_WINDOW_DAYS, CLIMATOLOGY_WINDOW_DAYS + 1)
+                pooled = hist[(days[:, None] + window) % DAYS].sum(axis=1, dtype=np.uint32)
+            result[measure] = histogram_percentiles(pooled, BINS[measure])
+        return result
+
+    def updated_bands(self):
+        if self.saved_bands is None or set(self.saved_bands) != set(BINS) or not self.touched:
+            return self.bands()
+        # a daily load touches one slot, which moves the bands of only 2 x window + 1 slots
+        days = window_slots(sorted(self.touched))
+        fresh = self.bands(days)
+        result = {}
+        for measure, bands in self.saved_bands.items():
+            result[measure] = bands.copy()
+            result[measure][days] = fresh[measure]
+        return result
+
+    def save(self, path, bands='touched'):
+        arrays = {
+            'folded': np.packbits(self.folded),
+            'folded_hours': np.int64(len(self.folded)),
+            'percentiles': np.array(PERCENTILES),
+            'window_days': np.int64(CLIMATOLOGY_WINDOW_DAYS),
+        }
+        for measure, hist in self.hist.items():
+            arrays[f'hist_{measure}'] = hist
+            arrays[f'edges_{measure}'] = BINS[measure]
+        if bands == 'all':
+            arrays.update({f'bands_{measure}': values for measure, values in self.bands().items()})
+        elif bands == 'touched':
+            arrays.update({f'bands_{measure}': values for measure, values in self.updated_bands().items()})
+        elif self.saved_bands:
+            # left as they were until a later full refresh, the dashboard reads only these
+            arrays.update({f'bands_{measure}': values for measure, values in self.saved_bands.items()})
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f'{path}.tmp.npz'
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+def fold_observations(df, climatology_dir=CLIMATOLOGY_DIR, bands='touched'):
+    folded = 0
+    groups = df.groupby('location_id', observed=True) if 'location_id' in df.columns else [(None, df)]
+    for location_id, group in groups:
+        path = location_file(climatology_dir, location_id)
+        with _lock:
+            climatology = LocationClimatology.load(path)
+            n_folded = climatology.fold(group)
+            if n_folded:
+                climatology.save(path, bands)
+        folded += n_folded
+    return folded
+
+def fetch_observations(sink, hourly_table, date_ids, with_locations=False):
+    columns = ['date_id', 'time_id', *BINS] + (['location_id'] if with_locations else [])
+    first, last = date_ids[0], date_ids[-1]
+    if not COMPACT_KEYS:
+        first, last = f"'{first}'", f"'{last}'"
+    query = f"""
+        select {', '.join(columns)}
+        from {sink.quote(hourly_table)}
+        where date_id >= {first} and date_id <= {last}
+    """
+    df = sink.query(query)
+    return df[df['date_id'].astype(str).isin(date_ids)]
+
+def refresh_climatology(sink, hourly_table, date_ids, with_locations=False, climatology_dir=CLIMATOLOGY_DIR, bands='touched'):
+    if not climatology_dir:
+        return 0
+    try:
+        date_ids = sorted({str(date_id) for date_id in date_ids})
+        if not date_ids:
+            return 0
+        df = fetch_observations(sink, hourly_table, date_ids, with_locations)
+        if df.empty:
+            return 0
+        folded = fold_observations(df, climatology_dir, bands)
+        logging.info(f'Folded {folded} new hourly observations from {len(date_ids)} days into the climatology.')
+        return folded
+    except Exception as e:
+        logging.error(f'Error refreshing climatology: {e}')
+        raise
+
+def refresh_bands(climatology_dir=CLIMATOLOGY_DIR):
+    paths = [os.path.join(climatology_dir, name) for name in sorted(os.listdir(climatology_dir)) if name.endswith('.npz')]
+    for path in paths:
+        with _lock:
+            LocationClimatology.load(path).save(path, bands='all')
+    return len(paths)
+
+def rebuild_climatology(sink, hourly_table, start_date, end_date, with_locations=False,
+                        climatology_dir=CLIMATOLOGY_DIR, reset=False):
+    if not climatology_dir:
+        raise ValueError('CLIMATOLOGY_DIR is not set.')
+    if reset and os.path.isdir(climatology_dir):
+        for name in os.listdir(climatology_dir):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(climatology_dir, name))
+    folded = 0
+    for window in split_date_range(start_date, end_date):
+        date_ids = pd.date_range(window['start_date'], window['end_date'], freq='D').strftime('%Y%m%d')
+        # the bands come from the full histograms, so they are computed once after the last window
+        folded += refresh_climatology(sink, hourly_table, date_ids, with_locations, climatology_dir, bands='keep')
+    n_locations = refresh_bands(climatology_dir) if os.path.isdir(climatology_dir) else 0
+    logging.info(f'Folded {folded} hourly observations from {start_date} to {end_date} into the climatology of {n_locations} locations.')
+    return folded
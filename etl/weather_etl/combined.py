@@ -0,0 +1,89 @@
+import pandas as pd
+import os
+import logging
+from weather_etl.client import shared_client, cache_counters
+from weather_etl.metrics import instrument, stage
+from weather_etl.locations import load_locations
+from weather_etl.spec import active_frames, frame_keys, frame_table
+from weather_etl.engine import fetch_frames
+from weather_etl.transform import transform_hourly_frame, transform_daily_frame
+from weather_etl.sink import get_sink
+from weather_etl.derived import refresh_derived
+from weather_etl.arrow import (
+    ARROW_PIPELINE, transform_hourly_table, transform_daily_table, write_staging, unique_date_ids, max_date_id,
+)
+from weather_etl.backfill import execute_date_range_backfill, execute_incremental
+
+start_date = (pd.Timestamp.now().normalize() - pd.DateOffset(days=1)).strftime('%Y-%m-%d')
+end_date = (pd.Timestamp.now().normalize() - pd.DateOffset(days=1)).strftime('%Y-%m-%d')
+
+LOCATIONS_FILE = os.getenv('LOCATIONS_FILE')
+LOAD_MODE = os.getenv('LOAD_MODE', 'append')
+TARGET_TIMEZONE = os.getenv('TARGET_TIMEZONE', 'Asia/Ho_Chi_Minh')
+DATE_RANGE = {
+    'start_date': f'{start_date}',
+    'end_date': f'{end_date}',
+}
+
+# fetch_frames extracts every frame as soon as its batch arrives, so this stage covers both
+@instrument('combined', 'fetch', cache_counters)
+def fetch_data(frames, date_range=DATE_RANGE):
+    try:
+        locations = load_locations(LOCATIONS_FILE)
+        return fetch_frames(shared_client(), frames, locations, date_range, bool(LOCATIONS_FILE), ARROW_PIPELINE)
+    except Exception as e:
+        logging.error(f'An error occurred while fetching combined weather data: {e}')
+        raise
+
+def transform_data(frame, data):
+    try:
+        if frame == 'daily':
+            if ARROW_PIPELINE:
+                return transform_daily_table(data, TARGET_TIMEZONE)
+            return transform_daily_frame(data, TARGET_TIMEZONE)
+        # air quality rows are keyed exactly like hourly weather rows
+        if ARROW_PIPELINE:
+            return transform_hourly_table(data)
+        return transform_hourly_frame(data)
+    except Exception as e:
+        logging.error(f'Error transforming {frame} data: {str(e)}')
+        raise
+
+def load_data(sink, frame, data, date_range):
+    table_name = frame_table(frame)
+    if ARROW_PIPELINE:
+        path = write_staging(data, table_name, date_range)
+        sink.load_parquet(path, table_name, LOAD_MODE, frame_keys(frame, data.column_names))
+        return unique_date_ids(data), max_date_id(data)
+    sink.load(data, table_name, LOAD_MODE, frame_keys(frame, data.columns))
+    return list(data['date_id'].unique()), data['date_id'].max()
+
+@instrument('combined', 'derived')
+def refresh_derived_tables(sink, loaded, with_locations):
+    loaded = {frame_table(frame): frame_loaded for frame, frame_loaded in loaded.items()}
+    refresh_derived(sink, loaded, frame_table('hourly'), with_locations)
+
+def process_date_range(date_range=DATE_RANGE):
+    frames = active_frames()
+    if not frames:
+        logging.error('None of the combined frames has a target table configured.')
+        return None
+    data = fetch_data(frames, date_range)
+    sink = get_sink(os.getenv('GOOGLE_CLOUD_PROJECT'))
+    loaded = {}
+    for frame in frames:
+        with stage('combined', f'transform_{frame}', data[frame]) as transform:
+            transformed = transform.output(transform_data(frame, data[frame]))
+        if len(transformed):
+            with stage('combined', f'load_{frame}', transformed) as load:
+                loaded[frame] = load_data(sink, frame, transformed, date_range)
+                load.output(len(transformed))
+        logging.info(f'Loaded {len(transformed)} {frame} rows into {frame_table(frame)}.')
+    refresh_derived_tables(sink, loaded, bool(LOCATIONS_FILE))
+    return sum(len(data[frame]) for frame in frames)
+
+def execute_pipeline(date_range=DATE_RANGE):
+    execute_incremental([frame_table(frame) for frame in active_frames()], process_date_range, date_range, LOAD_MODE)
+
+def execute_backfill(start_date, end_date):
+    execute_date_range_backfill('combined_weather', start_date, end_date, process_date_range)
@@ -0,0 +1,62 @@
+import logging
+import os
+
+from weather_etl.climatology import refresh_climatology
+from weather_etl.metrics import instrument
+from weather_etl.rollup import refresh_rollups
+from weather_etl.state import read_state, update_state, remove_state
+from weather_etl.upsert import record_watermark
+from weather_etl.wide import refresh_wide_table
+
+DEFER_DERIVED_TABLES = os.getenv('DEFER_DERIVED_TABLES', '0') == '1'
+PENDING_STATE = 'pending_derived'
+
+def _plain(value):
+    return value.item() if hasattr(value, 'item') else value
+
+def defer_refresh(table_name, date_ids, last_date_id, with_locations):
+    # kept on disk, so a failed refresh is picked up again by the next run
+    pending = read_state(PENDING_STATE).get(table_name, {})
+    merged = sorted(set(pending.get('date_ids', [])) | {_plain(date_id) for date_id in date_ids})
+    last_date_id = max(str(_plain(last_date_id)), pending.get('last_date_id', ''))
+    update_state(PENDING_STATE, **{table_name: {
+        'date_ids': merged,
+        'last_date_id': last_date_id,
+        'with_locations': with_locations,
+    }})
+    logging.info(f'Deferred derived table refresh for {len(merged)} dates of {table_name}.')
+
+def refresh_derived(sink, loaded, hourly_table, with_locations):
+    # loaded maps each fact table to the date_ids it received and its last date_id
+    if hourly_table in loaded:
+        refresh_rollups(sink, hourly_table, loaded[hourly_table][0], with_locations)
+        refresh_climatology(sink, hourly_table, loaded[hourly_table][0], with_locations)
+    weather_tables = {os.getenv('HOURLY_WEATHER_TABLE'), os.getenv('DAILY_WEATHER_TABLE')}
+    date_ids = sorted({_plain(date_id) for table_name, (table_date_ids, _) in loaded.items()
+                       if table_name in weather_tables for date_id in table_date_ids})
+    if date_ids:
+        # one wide refresh covers both weather tables instead of one per table
+        refresh_wide_table(sink, date_ids, with_locations)
+    # advance the watermarks only once every derived table has caught up
+    for table_name, (_, last_date_id) in loaded.items():
+        record_watermark(table_name, last_date_id)
+    return date_ids
+
+def refresh_or_defer(sink, table_name, date_ids, last_date_id, with_locations):
+    if DEFER_DERIVED_TABLES:
+        # the scheduler refreshes once both fact tables are loaded, and records the watermark then
+        defer_refresh(table_name, date_ids, last_date_id, with_locations)
+        return
+    refresh_derived(sink, {table_name: (date_ids, last_date_id)}, os.getenv('HOURLY_WEATHER_TABLE'), with_locations)
+
+@instrument('scheduler', 'derived')
+def refresh_pending(sink, hourly_table):
+    pending = read_state(PENDING_STATE)
+    if not pending:
+        logging.info('No deferred derived table refreshes.')
+        return 0
+    with_locations = any(entry['with_locations'] for entry in pending.values())
+    loaded = {table_name: (entry['date_ids'], entry['last_date_id']) for table_name, entry in pending.items()}
+    date_ids = refresh_derived(sink, loaded, hourly_table, with_locations)
+    remove_state(PENDING_STATE, *pending)
+    return len(date_ids)
@@ -0,0 +1,139 @@
+import logging
+import os
+
+import pandas as pd
+from pytz import timezone
+
+from weather_etl.metrics import instrument, stage
+from weather_etl.sink import get_sink
+from weather_etl.spec import DIMENSIONS, dimension_project, dimension_table
+from weather_etl.transform import COMPACT_KEYS, code_keys, date_keys, time_keys
+
+MAPPING_FILE = os.getenv('MAPPING_FILE', 'weather mapping.xlsx')
+DIM_START_DATE = os.getenv('DIM_START_DATE', '2020-01-01')
+
+def get_date(start_date, end_date):
+    try:
+        sd = pd.to_datetime(start_date)
+        ed = pd.to_datetime(end_date)
+        date_range = pd.date_range(start=sd, end=ed, freq='D')
+        df = pd.DataFrame({'date': date_range})
+        logging.info(f'Data extracted: {df.shape[0]} rows')
+        return df
+    except Exception as e:
+        logging.error(f'Error extracting date: {e}')
+        raise
+
+def transform_dates(df):
+    try:
+        if COMPACT_KEYS:
+            df['id'] = date_keys(df['date'])
+        else:
+            df['id'] = df['date'].dt.strftime('%Y%m%d').astype(str)
+        df['year'] = df['date'].dt.year
+        df['quarter'] = df['date'].dt.quarter
+        df['month'] = df['date'].dt.month
+        df['day'] = df['date'].dt.day
+        logging.info(f'Data transformed: {df.shape[0]} rows')
+        return df
+    except Exception as e:
+        logging.error(f'Error transforming data: {e}')
+        raise
+
+def get_time(start_time, end_time):
+    try:
+        st = pd.to_datetime(start_time)
+        et = pd.to_datetime(end_time)
+        time_range = pd.date_range(start=st, end=et, freq='h')
+        df = pd.DataFrame({'time': time_range})
+        logging.info(f'Data extracted: {df.shape[0]} rows')
+        return df
+    except Exception as e:
+        logging.error(f'Error extracting time: {e}')
+        raise
+
+def transform_times(df, target_timezone='UTC'):
+    try:
+        if not pd.api.types.is_datetime64_any_dtype(df['time']):
+            df['time'] = pd.to_datetime(df['time'])
+
+        tz = timezone(target_timezone)
+        df['time'] = df['time'].dt.tz_localize(tz)
+        df['id'] = df['time'].dt.strftime('%H%M').astype(str)
+        df['hour'] = df['time'].dt.hour
+
+        df['id'] = df['id'].str.zfill(4)
+        if COMPACT_KEYS:
+            df['id'] = time_keys(df['time'])
+        df = df.drop_duplicates()
+        logging.info(f'dropped duplicates: {df.shape[0]} rows')
+        return df
+    except Exception as e:
+        logging.error(f'error: {e}')
+        raise
+
+def extract_mapping(file_path, sheet_name):
+    try:
+        df = pd.read_excel(file_path, sheet_name, engine='openpyxl')
+        logging.info(f'{file_path} has been read successfully.')
+        return df
+    except Exception as e:
+        logging.error(f'An error occurred: {str(e)}')
+        return None
+
+def transform_codes(df):
+    try:
+        if COMPACT_KEYS:
+            df['id'] = code_keys(df['id'])
+            return df
+        df['id'] = df['id'].astype(str)
+        df['id'] = df['id'].apply(lambda x: '0' + x if len(x) == 1 else x)
+        return df
+    except Exception as e:
+        logging.error(f'An error occurred: {str(e)}')
+        raise
+
+@instrument('dims', 'date')
+def load_dates(start_date, end_date, table_name, project_id, mode='append', keys=None):
+    df = get_date(start_date, end_date)
+    trans_df = transform_dates(df)
+    get_sink(project_id).load(trans_df, table_name, mode, keys)
+    return trans_df.shape[0]
+
+@instrument('dims', 'time')
+def load_times(start_time, end_time, table_name, project_id, mode='append', keys=None):
+    df = get_time(start_time, end_time)
+    df = transform_times(df)
+    get_sink(project_id).load(df, table_name, mode, keys)
+    return df.shape[0]
+
+def load_codes(file_path, sheet_name, table_name, project_id, mode='append', keys=None):
+    try:
+        with stage('dims', sheet_name) as current:
+            df = extract_mapping(file_path, sheet_name)
+            if df is not None:
+                transformed_df = transform_codes(df)
+                get_sink(project_id).load(transformed_df, table_name, mode, keys)
+                return current.output(transformed_df.shape[0])
+            return 0
+    except Exception as e:
+        logging.error(f'An error occurred: {str(e)}')
+        raise
+
+def dim_end_date(moment=None):
+    # the date dimension always covers the rest of the current year
+    return (pd.Timestamp(moment or pd.Timestamp.now()) + pd.offsets.YearEnd(0)).strftime('%Y-%m-%d')
+
+def execute_pipeline(names=tuple(DIMENSIONS), start_date=DIM_START_DATE, end_date=None,
+                     mapping_file=MAPPING_FILE, mode='upsert', project_id=None):
+    keys = ['id'] if mode == 'upsert' else None
+    for name in names:
+        table_name = dimension_table(name)
+        project = project_id or dimension_project(name)
+        if name == 'date':
+            load_dates(start_date, end_date or dim_end_date(), table_name, project, mode, keys)
+        elif name == 'time':
+            load_times('00:00:00', '23:59:59', table_name, project, mode, keys)
+        else:
+            load_codes(mapping_file, DIMENSIONS[name]['sheet'], table_name, project, mode, keys)
+        logging.info(f'Loaded the {name} dimension into {table_name}.')
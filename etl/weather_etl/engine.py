@@ -0,0 +1,93 @@
+import logging
+
+import pandas as pd
+from openmeteo_sdk.Aggregation import Aggregation
+from openmeteo_sdk.Variable import Variable
+
+from weather_etl.arrow import block_table, concat_tables
+from weather_etl.fetch import fetch_locations
+from weather_etl.spec import ENDPOINTS, FRAMES, endpoint_frames, endpoint_url, frame_variables
+
+VARIABLE_NAMES = {value: name for name, value in vars(Variable).items() if not name.startswith('_')}
+AGGREGATION_SUFFIXES = {
+    Aggregation.minimum: '_min',
+    Aggregation.maximum: '_max',
+    Aggregation.mean: '_mean',
+    Aggregation.sum: '_sum',
+    Aggregation.dominant: '_dominant',
+}
+
+def variable_name(variable):
+    # rebuild the API parameter name from the SDK metadata, e.g. temperature + 2m altitude -> temperature_2m
+    name = VARIABLE_NAMES.get(variable.Variable(), str(variable.Variable())).replace('pm2p5', 'pm2_5')
+    if variable.Altitude():
+        name += f'_{variable.Altitude()}m'
+    return name + AGGREGATION_SUFFIXES.get(variable.Aggregation(), '')
+
+def response_block(response, frame):
+    return getattr(response, FRAMES[frame]['block'].capitalize())()
+
+def block_values(block, frame):
+    variables = FRAMES[frame]['variables']
+    found = {}
+    for idx in range(block.VariablesLength()):
+        variable = block.Variables(idx)
+        found.setdefault(variable_name(variable), variable)
+    missing = [name for name in variables if name not in found]
+    if missing:
+        raise KeyError(f'Response is missing {frame} variables: {missing}')
+    return {
+        name: found[name].ValuesInt64AsNumpy() if dtype == 'int64' else found[name].ValuesAsNumpy()
+        for name, dtype in variables.items()
+    }
+
+def block_dates(block):
+    return pd.date_range(
+        start=pd.to_datetime(block.Time(), unit='s', utc=True),
+        end=pd.to_datetime(block.TimeEnd(), unit='s', utc=True),
+        freq=pd.Timedelta(seconds=block.Interval()),
+        inclusive='left'
+    )
+
+def response_frame(response, frame, location_id=None):
+    block = response_block(response, frame)
+    df = pd.DataFrame({**block_values(block, frame), 'date': block_dates(block)})
+    if location_id is not None:
+        df.insert(0, 'location_id', location_id)
+    return df
+
+def response_table(response, frame, location_id=None):
+    block = response_block(response, frame)
+    return block_table(block, block_values(block, frame), location_id)
+
+def build_params(endpoint, frames, date_range):
+    params = {**ENDPOINTS[endpoint]['params'], **date_range}
+    for frame in frames:
+        params.setdefault(FRAMES[frame]['block'], []).extend(frame_variables(frame))
+    return params
+
+def fetch_endpoint(client, endpoint, frames, locations, date_range):
+    try:
+        results = fetch_locations(client, endpoint_url(endpoint), locations, build_params(endpoint, frames, date_range))
+        logging.info(f"Fetched {', '.join(frames)} for {len(results)} locations from the {endpoint} endpoint.")
+        return results
+    except Exception as e:
+        logging.error(f'Error fetching {endpoint} data: {e}')
+        raise
+
+def extract_frames(results, frames, with_locations=True, arrow=False):
+    extract = response_table if arrow else response_frame
+    data = {}
+    for frame in frames:
+        parts = [extract(response, frame, location['location_id'] if with_locations else None) for location, response in results]
+        data[frame] = concat_tables(parts) if arrow else pd.concat(parts, ignore_index=True)
+        logging.info(f'Extracted {len(data[frame])} {frame} rows.')
+    return data
+
+def fetch_frames(client, frames, locations, date_range, with_locations=True, arrow=False):
+    # frames sharing an endpoint ride on the same request, so hourly + daily is one round trip per batch
+    data = {}
+    for endpoint, grouped in endpoint_frames(frames).items():
+        results = fetch_endpoint(client, endpoint, grouped, locations, date_range)
+        data.update(extract_frames(results, grouped, with_locations, arrow))
+    return data
@@ -0,0 +1,9 @@
+import os
+
+from dotenv import load_dotenv
+
+def load_environment():
+    # must run before the pipeline modules are imported, they read their settings at import time
+    load_dotenv()
+    if os.getenv('GG_CREDENTIALS'):
+        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = os.getenv('GG_CREDENTIALS')
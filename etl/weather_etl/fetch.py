@@ -0,0 +1,35 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from weather_etl.locations import batch_locations
+
+BATCH_SIZE = int(os.getenv('LOCATION_BATCH_SIZE', 100))
+MAX_WORKERS = int(os.getenv('FETCH_WORKERS', 4))
+
+def _fetch_batch(client, url, batch, params):
+    batch_params = {
+        **params,
+        'latitude': [location['latitude'] for location in batch],
+        'longitude': [location['longitude'] for location in batch],
+    }
+    responses = client.weather_api(url, params=batch_params)
+    if len(responses) != len(batch):
+        raise ValueError(f'Expected {len(batch)} responses, got {len(responses)}.')
+    # LocationId is the position of the coordinate within the request
+    return [(batch[response.LocationId()], response) for response in responses]
+
+def fetch_locations(client, url, locations, params, batch_size=BATCH_SIZE, max_workers=MAX_WORKERS):
+    batches = list(batch_locations(locations, batch_size))
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_fetch_batch, client, url, batch, params): idx for idx, batch in enumerate(batches)}
+        for future in as_completed(futures):
+            idx = futures[future]
+            try:
+                results[idx] = future.result()
+                logging.info(f'Fetched batch {idx + 1}/{len(batches)} ({len(batches[idx])} locations).')
+            except Exception as e:
+                logging.error(f'Error fetching batch {idx + 1}/{len(batches)}: {e}')
+                raise
+    return [pair for idx in range(len(batches)) for pair in results[idx]]
@@ -0,0 +1,194 @@
+import pandas as pd
+import os
+import logging
+from weather_etl.client import shared_client, cache_counters
+from weather_etl.metrics import instrument, stage
+from weather_etl.locations import load_locations
+from weather_etl.fetch import fetch_locations
+from weather_etl.engine import build_params as endpoint_params, response_frame, response_table
+from weather_etl.transform import transform_hourly_frame
+from weather_etl.sink import get_sink
+from weather_etl.derived import refresh_or_defer
+from weather_etl.arrow import (
+    ARROW_PIPELINE, concat_tables, transform_hourly_table, write_staging,
+    staged_columns, read_staged, unique_date_ids, max_date_id,
+)
+from weather_etl.backfill import execute_date_range_backfill, execute_gap_backfill, execute_incremental, execute_staged_replay
+
+start_date = (pd.Timestamp.now().normalize() - pd.DateOffset(days=1)).strftime('%Y-%m-%d')
+end_date = (pd.Timestamp.now().normalize() - pd.DateOffset(days=1)).strftime('%Y-%m-%d')
+
+API_URL = os.getenv('URL_PATH')
+LOCATION = {'latitude': 10.762622, 'longitude': 106.660172}
+LOCATIONS_FILE = os.getenv('LOCATIONS_FILE')
+LOAD_MODE = os.getenv('LOAD_MODE', 'append')
+DATE_RANGE = {
+    'start_date': f'{start_date}',
+    'end_date': f'{end_date}',
+}
+
+def build_params(date_range=DATE_RANGE):
+    return endpoint_params('weather', ['hourly'], date_range)
+
+@instrument('hourly', 'fetch', cache_counters)
+def fetch_weather_data(date_range=DATE_RANGE):
+    try:
+        params = {**LOCATION, **build_params(date_range)}
+        responses = shared_client().weather_api(API_URL, params=params)
+        if not responses:
+            logging.error('No weather data returned.')
+            return None
+        logging.info('Weather data fetched successfully.')
+        return responses[0]
+    except Exception as e:
+        logging.error(f'An error occurred while fetching weather data: {e}')
+        return None
+
+@instrument('hourly', 'fetch', cache_counters)
+def fetch_multi_location_weather_data(locations, date_range=DATE_RANGE):
+    try:
+        results = fetch_locations(shared_client(), API_URL, locations, build_params(date_range))
+        logging.info(f'Weather data fetched for {len(results)} locations.')
+        return results
+    except Exception as e:
+        logging.error(f'An error occurred while fetching multi-location weather data: {e}')
+        raise
+
+@instrument('hourly', 'extract')
+def extract_data(response, location_id=None):
+    try:
+        df = response_frame(response, 'hourly', location_id)
+        logging.info(f'Extracted {df.shape[0]} hourly rows.')
+        return df
+    except Exception as e:
+        logging.error(f'Error extracting data: {str(e)}')
+        raise
+
+@instrument('hourly', 'extract')
+def extract_multi_location_data(results):
+    try:
+        df = pd.concat(
+            [extract_data(response, location['location_id']) for location, response in results],
+            ignore_index=True
+        )
+        logging.info(f'Extracted {df.shape[0]} hourly rows for {len(results)} locations.')
+        return df
+    except Exception as e:
+        logging.error(f'Error extracting multi-location data: {str(e)}')
+        raise
+
+@instrument('hourly', 'extract')
+def extract_table(response, location_id=None):
+    try:
+        table = response_table(response, 'hourly', location_id)
+        logging.info(f'Extracted {table.num_rows} hourly rows into Arrow.')
+        return table
+    except Exception as e:
+        logging.error(f'Error extracting Arrow data: {str(e)}')
+        raise
+
+@instrument('hourly', 'extract')
+def extract_multi_location_table(results):
+    try:
+        table = concat_tables([extract_table(response, location['location_id']) for location, response in results])
+        logging.info(f'Extracted {table.num_rows} hourly rows for {len(results)} locations into Arrow.')
+        return table
+    except Exception as e:
+        logging.error(f'Error extracting multi-location Arrow data: {str(e)}')
+        raise
+
+@instrument('hourly', 'transform')
+def transform_table(table):
+    try:
+        table = transform_hourly_table(table)
+        logging.info(f'Transformed Arrow table with {table.num_columns} columns.')
+        return table
+    except Exception as e:
+        logging.error(f'Error transforming Arrow data: {str(e)}')
+        raise
+
+@instrument('hourly', 'transform')
+def transform_data(df):
+    try:
+        df = transform_hourly_frame(df)
+        logging.info(f'Transformed data with {df.shape[1]} columns.')
+        return df
+    except Exception as e:
+        logging.error(f'Error transforming data: {str(e)}')
+        raise
+
+def merge_keys(columns):
+    return [col for col in ['location_id', 'id'] if col in columns]
+
+@instrument('hourly', 'derived')
+def refresh_derived_tables(sink, table_name, date_ids, last_date_id, with_locations):
+    refresh_or_defer(sink, table_name, date_ids, last_date_id, with_locations)
+
+def process_date_range(date_range=DATE_RANGE):
+    if ARROW_PIPELINE:
+        return process_date_range_arrow(date_range)
+    if LOCATIONS_FILE:
+        results = fetch_multi_location_weather_data(load_locations(LOCATIONS_FILE), date_range)
+        df = extract_multi_location_data(results)
+    else:
+        response = fetch_weather_data(date_range)
+        if response is None:
+            logging.error('No data to process.')
+            return None
+        df = extract_data(response)
+
+    transformed_df = transform_data(df)
+    table_name = os.getenv('HOURLY_WEATHER_TABLE')
+    project_id = os.getenv('GOOGLE_CLOUD_PROJECT')
+    sink = get_sink(project_id)
+    with stage('hourly', 'load', transformed_df) as load:
+        sink.load(transformed_df, table_name, LOAD_MODE, merge_keys(transformed_df.columns))
+        load.output(transformed_df.shape[0])
+    if not transformed_df.empty:
+        refresh_derived_tables(
+            sink, table_name, transformed_df['date_id'].unique(), transformed_df['date_id'].max(),
+            'location_id' in transformed_df.columns,
+        )
+    return transformed_df.shape[0]
+
+def process_date_range_arrow(date_range=DATE_RANGE):
+    if LOCATIONS_FILE:
+        results = fetch_multi_location_weather_data(load_locations(LOCATIONS_FILE), date_range)
+        table = extract_multi_location_table(results)
+    else:
+        response = fetch_weather_data(date_range)
+        if response is None:
+            logging.error('No data to process.')
+            return None
+        table = extract_table(response)
+
+    table = transform_table(table)
+    with stage('hourly', 'staging', table) as staging:
+        path = staging.output(write_staging(table, os.getenv('HOURLY_WEATHER_TABLE'), date_range))
+        staging.add(rows=table.num_rows)
+    return load_staged_file(get_sink(os.getenv('GOOGLE_CLOUD_PROJECT')), path)
+
+def load_staged_file(sink, path, mode=LOAD_MODE):
+    table_name = os.getenv('HOURLY_WEATHER_TABLE')
+    columns = staged_columns(path)
+    with stage('hourly', 'load', path) as load:
+        sink.load_parquet(path, table_name, mode, merge_keys(columns))
+        date_ids = read_staged(path, ['date_id'])
+        load.output(date_ids.num_rows)
+    if date_ids.num_rows:
+        refresh_derived_tables(sink, table_name, unique_date_ids(date_ids), max_date_id(date_ids), 'location_id' in columns)
+    return date_ids.num_rows
+
+def execute_pipeline(date_range=DATE_RANGE):
+    execute_incremental([os.getenv('HOURLY_WEATHER_TABLE')], process_date_range, date_range, LOAD_MODE)
+
+def execute_backfill(start_date, end_date):
+    execute_date_range_backfill('hourly_weather', start_date, end_date, process_date_range)
+
+def execute_gap_fill():
+    n_locations = len(load_locations(LOCATIONS_FILE)) if LOCATIONS_FILE else 1
+    sink = get_sink(os.getenv('GOOGLE_CLOUD_PROJECT'))
+    execute_gap_backfill('hourly_weather', sink, os.getenv('HOURLY_WEATHER_TABLE'), 24 * n_locations, process_date_range)
+
+def execute_replay():
+    execute_staged_replay(get_sink(os.getenv('GOOGLE_CLOUD_PROJECT')), os.getenv('HOURLY_WEATHER_TABLE'), load_staged_file)
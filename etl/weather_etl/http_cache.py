@@ -0,0 +1,246 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+HTTP_CACHE_BACKEND = os.getenv('HTTP_CACHE_BACKEND', 'sqlite')
+HTTP_CACHE_PATH = os.getenv('HTTP_CACHE_PATH')
+HTTP_CACHE_MAX_MB = float(os.getenv('HTTP_CACHE_MAX_MB', 1024))
+# windows that reach today or later are still changing as new model runs and observations come in
+HTTP_CACHE_RECENT_TTL = float(os.getenv('HTTP_CACHE_RECENT_TTL_SECONDS', 3600))
+# a window is immutable once its last day has ended in every timezone, which the extra day covers
+HTTP_CACHE_SETTLE_DAYS = int(os.getenv('HTTP_CACHE_SETTLE_DAYS', 1))
+DEFAULT_PATHS = {'sqlite': '.http_cache.sqlite', 'filesystem': '.http_cache'}
+
+SCHEMA = """
+create table if not exists responses (
+    key text primary key,
+    body blob not null,
+    size integer not null,
+    expires_at real,
+    accessed_at real not null
+);
+create index if not exists responses_accessed on responses (accessed_at);
+"""
+
+def _normalize(value):
+    if isinstance(value, (list, tuple)):
+        return ','.join(_normalize(item) for item in value)
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, float):
+        return repr(value)
+    return str(value).strip()
+
+def cache_key(method, url, params):
+    # parameter order, list vs comma-joined values and float spelling do not change what the API returns
+    normalized = sorted((str(name), _normalize(value)) for name, value in (params or {}).items() if value is not None)
+    payload = json.dumps([method.upper(), url.rstrip('/'), normalized], separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def settled_before(today=None):
+    return (today or datetime.now(timezone.utc).date()) - timedelta(days=HTTP_CACHE_SETTLE_DAYS)
+
+def expire_after(params, today=None):
+    # seconds a response may be reused, None for forever
+    end_date = (params or {}).get('end_date')
+    if not end_date or any((params or {}).get(name) for name in ['past_days', 'forecast_days', 'current']):
+        return HTTP_CACHE_RECENT_TTL
+    if date.fromisoformat(str(end_date)) < settled_before(today):
+        return None
+    return HTTP_CACHE_RECENT_TTL
+
+class BaseCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'stored': 0, 'evicted': 0, 'bytes_served': 0, 'bytes_fetched': 0}
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.stats[name] += value
+
+    def summary(self):
+        with self.lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+class SQLiteCache(BaseCache):
+    def __init__(self, path, max_bytes):
+        super().__init__(max_bytes)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+            self.conn.execute('delete from responses where expires_at is not null and expires_at < ?', (time.time(),))
+            self.total = self.conn.execute('select coalesce(sum(size), 0) from responses').fetchone()[0]
+
+    def get(self, key):
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute('select body, size, expires_at from responses where key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            body, size, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self.conn.execute('delete from responses where key = ?', (key,))
+                self.total -= size
+                self.stats['expired'] += 1
+                return None
+            self.conn.execute('update responses set accessed_at = ? where key = ?', (now, key))
+            return body
+
+    def set(self, key, body, ttl):
+        now = time.time()
+        with self.lock, self.conn:
+            previous = self.conn.execute('select size from responses where key = ?', (key,)).fetchone()
+            self.conn.execute(
+                'insert or replace into responses (key, body, size, expires_at, accessed_at) values (?, ?, ?, ?, ?)',
+                (key, body, len(body), None if ttl is None else now + ttl, now),
+            )
+            self.total += len(body) - (previous[0] if previous else 0)
+            self._evict()
+
+    def _evict(self):
+        # least recently used first, until the cache is back under its cap
+        if self.total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self.conn.execute('select key, size from responses order by accessed_at'):
+            if self.total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            self.total -= size
+        self.conn.executemany('delete from responses where key = ?', evicted)
+        self.stats['evicted'] += len(evicted)
+
+class FileSystemCache(BaseCache):
+    def __init__(self, path, max_bytes):
+        super().__init__(max_bytes)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.total = sum(size for _, _, size in self._entries())
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], f'{key}.bin')
+
+    def _entries(self):
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith('.bin'):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    yield path, stat.st_mtime, stat.st_size
+
+    def _expires_at(self, path):
+        with open(path[:-4] + '.json') as f:
+            return json.load(f)['expires_at']
+
+    def _remove(self, path):
+        size = os.path.getsize(path)
+        for file in [path, path[:-4] + '.json']:
+            if os.path.exists(file):
+                os.remove(file)
+        self.total -= size
+
+    def get(self, key):
+        path = self._file(key)
+        with self.lock:
+            if not os.path.exists(path):
+                return None
+            expires_at = self._expires_at(path)
+            if expires_at is not None and expires_at < time.time():
+                self._remove(path)
+                self.stats['expired'] += 1
+                return None
+            with open(path, 'rb') as f:
+                body = f.read()
+            # the modification time doubles as the last access time for eviction
+            os.utime(path)
+            return body
+
+    def set(self, key, body, ttl):
+        path = self._file(key)
+        with self.lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                self.total -= os.path.getsize(path)
+            with open(path[:-4] + '.json', 'w') as f:
+                json.dump({'expires_at': None if ttl is None else time.time() + ttl}, f)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+            self.total += len(body)
+            self._evict()
+
+    def _evict(self):
+        if self.total <= self.max_bytes:
+            return
+        for path, _, _ in sorted(self._entries(), key=lambda entry: entry[1]):
+            if self.total <= self.max_bytes:
+                break
+            self._remove(path)
+            self.stats['evicted'] += 1
+
+def open_cache(backend=HTTP_CACHE_BACKEND, path=HTTP_CACHE_PATH, max_mb=HTTP_CACHE_MAX_MB):
+    if backend == 'none':
+        return None
+    if backend not in DEFAULT_PATHS:
+        raise ValueError(f'Unknown HTTP cache backend: {backend}')
+    path = path or DEFAULT_PATHS[backend]
+    max_bytes = int(max_mb * 1024 * 1024)
+    cache = SQLiteCache(path, max_bytes) if backend == 'sqlite' else FileSystemCache(path, max_bytes)
+    logging.info(f'Opened {backend} HTTP cache at {path} ({cache.total / 1024 / 1024:.1f} of {max_mb:.0f} MB used).')
+    return cache
+
+class CachedResponse:
+    status_code = 200
+    from_cache = True
+
+    def __init__(self, content):
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        pass
+
+class CachePolicySession:
+    # sits in front of the retrying session, which only ever sees requests the cache cannot answer
+    def __init__(self, session, cache, policy=expire_after):
+        self.session = session
+        self.cache = cache
+        self.policy = policy
+
+    def get(self, url, params=None, **kwargs):
+        return self._request('GET', url, params, lambda: self.session.get(url, params=params, **kwargs))
+
+    def post(self, url, data=None, **kwargs):
+        return self._request('POST', url, data, lambda: self.session.post(url, data=data, **kwargs))
+
+    def _request(self, method, url, params, send):
+        key = cache_key(method, url, params)
+        body = self.cache.get(key)
+        if body is not None:
+            self.cache.count('hits')
+            self.cache.count('bytes_served', len(body))
+            return CachedResponse(body)
+        self.cache.count('misses')
+        response = send()
+        if response.status_code == 200:
+            self.cache.count('bytes_fetched', len(response.content))
+            self.cache.set(key, response.content, self.policy(params))
+            self.cache.count('stored')
+        return response
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,63 @@
+import os
+import logging
+
+import pandas as pd
+
+from weather_etl import daily, dims, hourly
+from weather_etl.sink import get_sink
+from weather_etl.derived import DEFER_DERIVED_TABLES, refresh_pending
+from weather_etl.scheduler import RunStore, task, run_dag, serve
+
+SCHEDULE_CRON = os.getenv('SCHEDULE_CRON', '30 1 * * *')
+SCHEDULER_RUN_ONCE = os.getenv('SCHEDULER_RUN_ONCE', '0') == '1'
+PROJECT_ID = os.getenv('GOOGLE_CLOUD_PROJECT')
+
+if not DEFER_DERIVED_TABLES:
+    logging.warning('DEFER_DERIVED_TABLES is off, each fact task will refresh the derived tables itself.')
+
+def run_context(scheduled_for):
+    day = (pd.Timestamp(scheduled_for).normalize() - pd.DateOffset(days=1)).strftime('%Y-%m-%d')
+    return {'date_range': {'start_date': day, 'end_date': day}}
+
+def load_dimension(name):
+    # the same per-dimension table and project resolution as `cli dims`
+    def run_task(run):
+        dims.execute_pipeline([name], end_date=dims.dim_end_date(run['scheduled_for']))
+    return run_task
+
+def load_hourly(run):
+    hourly.execute_pipeline(run['date_range'])
+
+def load_daily(run):
+    daily.execute_pipeline(run['date_range'])
+
+def refresh_derived(run):
+    refresh_pending(get_sink(PROJECT_ID), os.getenv('HOURLY_WEATHER_TABLE'))
+
+def weather_tasks():
+    dimensions = [
+        task('date_dim', load_dimension('date')),
+        task('time_dim', load_dimension('time')),
+        task('timeshift_dim', load_dimension('timeshift')),
+        task('weather_code_dim', load_dimension('weather_code')),
+    ]
+    dimension_names = [spec['name'] for spec in dimensions]
+    return [
+        *dimensions,
+        task('hourly_weather', load_hourly, dimension_names),
+        task('daily_weather', load_daily, dimension_names),
+        task('derived_tables', refresh_derived, ['hourly_weather', 'daily_weather']),
+    ]
+
+SCHEDULES = [
+    {'dag': 'weather', 'cron': SCHEDULE_CRON, 'tasks': weather_tasks, 'context': run_context},
+]
+
+def execute_schedule(run_once=SCHEDULER_RUN_ONCE):
+    store = RunStore()
+    if run_once:
+        now = pd.Timestamp.now().to_pydatetime()
+        _, status = run_dag(store, 'weather', weather_tasks(), now, run_context(now))
+        return all(value == 'success' for value in status.values())
+    serve(store, SCHEDULES)
+    return True
@@ -0,0 +1,40 @@
+import csv
+import json
+import logging
+import os
+
+DEFAULT_LOCATION = {'location_id': 'hcmc', 'latitude': 10.762622, 'longitude': 106.660172}
+
+def _normalize(location, idx):
+    return {
+        'location_id': str(location.get('location_id') or location.get('name') or idx),
+        'latitude': float(location['latitude']),
+        'longitude': float(location['longitude']),
+    }
+
+def load_locations(source=None):
+    try:
+        if source is None:
+            return [dict(DEFAULT_LOCATION)]
+        if isinstance(source, (str, os.PathLike)):
+            if str(source).endswith('.json'):
+                with open(source) as f:
+                    rows = json.load(f)
+            else:
+                with open(source, newline='') as f:
+                    rows = list(csv.DictReader(f))
+        else:
+            rows = list(source)
+        locations = [_normalize(row, idx) for idx, row in enumerate(rows)]
+        ids = [location['location_id'] for location in locations]
+        if len(set(ids)) != len(ids):
+            raise ValueError('Duplicate location_id values in location list.')
+        logging.info(f'Loaded {len(locations)} locations.')
+        return locations
+    except Exception as e:
+        logging.error(f'Error loading locations: {e}')
+        raise
+
+def batch_locations(locations, batch_size):
+    for start in range(0, len(locations), batch_size):
+        yield locations[start:start + batch_size]
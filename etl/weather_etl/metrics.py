@@ -0,0 +1,288 @@
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from weather_etl.state import STATE_DIR
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak RSS is reported as null there
+    resource = None
+
+METRICS_TEXTFILE = os.getenv('METRICS_TEXTFILE')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+RUN_REPORT_DIR = os.getenv('RUN_REPORT_DIR', os.path.join(STATE_DIR, 'reports'))
+# comma separated stage names, or all
+PROFILE_STAGES = {name.strip() for name in os.getenv('PROFILE_STAGES', '').split(',') if name.strip()}
+PROFILER = os.getenv('PROFILER', 'cprofile')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(STATE_DIR, 'profiles'))
+
+TOTAL_FIELDS = ['runs', 'failures', 'seconds', 'rows', 'bytes_in', 'bytes_out', 'cache_hits', 'cache_misses']
+PROMETHEUS_METRICS = [
+    ('weather_etl_stage_runs_total', 'counter', 'runs', 'Completed runs of each pipeline stage.'),
+    ('weather_etl_stage_failures_total', 'counter', 'failures', 'Runs of each pipeline stage that raised.'),
+    ('weather_etl_stage_seconds_total', 'counter', 'seconds', 'Wall time spent in each pipeline stage.'),
+    ('weather_etl_stage_rows_total', 'counter', 'rows', 'Rows produced by each pipeline stage.'),
+    ('weather_etl_stage_bytes_in_total', 'counter', 'bytes_in', 'Bytes handed to each pipeline stage.'),
+    ('weather_etl_stage_bytes_out_total', 'counter', 'bytes_out', 'Bytes produced by each pipeline stage.'),
+    ('weather_etl_stage_cache_hits_total', 'counter', 'cache_hits', 'HTTP cache hits during each pipeline stage.'),
+    ('weather_etl_stage_cache_misses_total', 'counter', 'cache_misses', 'HTTP cache misses during each pipeline stage.'),
+    ('weather_etl_stage_last_seconds', 'gauge', 'last_seconds', 'Wall time of the latest run of each pipeline stage.'),
+    ('weather_etl_stage_last_rows_per_second', 'gauge', 'last_rows_per_sec', 'Throughput of the latest run of each pipeline stage.'),
+]
+
+_lock = threading.Lock()
+_records = []
+_totals = {}
+_local = threading.local()
+_profiling = threading.Lock()
+
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def data_size(data):
+    if data is None:
+        return 0
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, str):
+        return os.path.getsize(data) if os.path.isfile(data) else 0
+    if isinstance(data, dict):
+        return sum(data_size(value) for value in data.values())
+    if hasattr(data, 'memory_usage'):
+        return int(data.memory_usage(index=True).sum())
+    if hasattr(data, 'nbytes'):
+        return int(data.nbytes)
+    return 0
+
+def row_count(data):
+    if data is None or isinstance(data, (str, bytes)):
+        return 0
+    if isinstance(data, bool):
+        return 0
+    if isinstance(data, int):
+        return data
+    if isinstance(data, dict):
+        return sum(row_count(value) for value in data.values())
+    if hasattr(data, 'num_rows'):
+        return data.num_rows
+    if hasattr(data, '__len__'):
+        return len(data)
+    return 0
+
+class Stage:
+    def __init__(self, pipeline, name, data_in=None):
+        self.record = {'pipeline': pipeline, 'stage': name, 'rows': 0, 'bytes_in': data_size(data_in), 'bytes_out': 0}
+
+    def output(self, data):
+        self.record['rows'] = row_count(data)
+        self.record['bytes_out'] = data_size(data)
+        return data
+
+    def add(self, **values):
+        self.record.update(values)
+
+def _start_profiler(name):
+    if name not in PROFILE_STAGES and 'all' not in PROFILE_STAGES:
+        return None
+    # one profiler at a time, concurrent backfill windows would otherwise fight over the hook
+    if not _profiling.acquire(blocking=False):
+        logging.info(f'Not profiling {name}, another stage is being profiled.')
+        return None
+    if PROFILER == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logging.warning('pyinstrument is not installed, profiling with cProfile.')
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def _stop_profiler(profiler, pipeline, name):
+    if profiler is None:
+        return
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{pipeline}_{name}_{datetime.now().strftime('%Y%m%dT%H%M%S%f')}")
+        if hasattr(profiler, 'dump_stats'):
+            profiler.disable()
+            path += '.prof'
+            profiler.dump_stats(path)
+        else:
+            profiler.stop()
+            path += '.html'
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+        logging.info(f'Wrote {pipeline} {name} profile to {path}.')
+    finally:
+        _profiling.release()
+
+def _counter_delta(before, after):
+    hits = after.get('hits', 0) - before.get('hits', 0)
+    misses = after.get('misses', 0) - before.get('misses', 0)
+    return {
+        'cache_hits': hits,
+        'cache_misses': misses,
+        'cache_hit_rate': hits / (hits + misses) if hits + misses else None,
+        'bytes_in': after.get('bytes_served', 0) - before.get('bytes_served', 0)
+                    + after.get('bytes_fetched', 0) - before.get('bytes_fetched', 0),
+    }
+
+def _record(record):
+    key = (record['pipeline'], record['stage'])
+    with _lock:
+        _records.append(record)
+        totals = _totals.setdefault(key, dict.fromkeys(TOTAL_FIELDS, 0))
+        totals['runs'] += 1
+        totals['failures'] += record['status'] == 'failed'
+        for field in ['seconds', 'rows', 'bytes_in', 'bytes_out', 'cache_hits', 'cache_misses']:
+            totals[field] += record.get(field) or 0
+        totals['last_seconds'] = record['seconds']
+        totals['last_rows_per_sec'] = record['rows_per_sec']
+
+@contextmanager
+def stage(pipeline, name, data_in=None, counters=None):
+    active = _local.__dict__.setdefault('active', set())
+    current = Stage(pipeline, name, data_in)
+    if (pipeline, name) in active:
+        # the multi-location helpers call the single-location ones, only the outer call is a stage
+        yield current
+        return
+    active.add((pipeline, name))
+    # counters are process wide, so concurrent backfill windows see each other's cache traffic
+    before = counters() if counters else None
+    profiler = _start_profiler(name)
+    started = time.perf_counter()
+    status = 'success'
+    try:
+        yield current
+    except Exception:
+        status = 'failed'
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        active.discard((pipeline, name))
+        _stop_profiler(profiler, pipeline, name)
+        record = current.record
+        if counters:
+            record.update(_counter_delta(before, counters()))
+        record.update(
+            status=status,
+            seconds=seconds,
+            rows_per_sec=record['rows'] / seconds if seconds else 0.0,
+            peak_rss_bytes=peak_rss(),
+            finished_at=time.time(),
+        )
+        _record(record)
+
+def instrument(pipeline, name, counters=None):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(pipeline, name, args[0] if args else None, counters) as current:
+                return current.output(func(*args, **kwargs))
+        return wrapper
+    return decorate
+
+def _labels(pipeline, name):
+    return f'pipeline="{pipeline}",stage="{name}"'
+
+def render():
+    with _lock:
+        totals = {key: dict(values) for key, values in _totals.items()}
+    lines = []
+    for metric, kind, field, help_text in PROMETHEUS_METRICS:
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+        lines += [f'{metric}{{{_labels(*key)}}} {values.get(field, 0):g}' for key, values in sorted(totals.items())]
+    rss = peak_rss()
+    if rss is not None:
+        lines += ['# HELP weather_etl_peak_rss_bytes Peak resident set size of the ETL process.',
+                  '# TYPE weather_etl_peak_rss_bytes gauge', f'weather_etl_peak_rss_bytes {rss}']
+    lines += ['# HELP weather_etl_last_flush_timestamp_seconds When the latest run report was written.',
+              '# TYPE weather_etl_last_flush_timestamp_seconds gauge', f'weather_etl_last_flush_timestamp_seconds {time.time():.3f}']
+    return '\n'.join(lines) + '\n'
+
+def _write_atomic(path, text):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def summarize(records):
+    summary = {}
+    for record in records:
+        key = f"{record['pipeline']}.{record['stage']}"
+        entry = summary.setdefault(key, {'runs': 0, 'seconds': 0.0, 'rows': 0, 'bytes_in': 0, 'bytes_out': 0})
+        entry['runs'] += 1
+        for field in ['seconds', 'rows', 'bytes_in', 'bytes_out']:
+            entry[field] += record[field]
+        entry['rows_per_sec'] = entry['rows'] / entry['seconds'] if entry['seconds'] else 0.0
+    return summary
+
+def flush(run_name, status='success'):
+    # one JSON report per run with every stage recorded since the previous flush
+    with _lock:
+        records = list(_records)
+        _records.clear()
+    if not records:
+        return None
+    report = {
+        'run': run_name,
+        'status': status,
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'peak_rss_bytes': peak_rss(),
+        'stages': summarize(records),
+        'records': records,
+    }
+    path = os.path.join(RUN_REPORT_DIR, f"{run_name}-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}.json")
+    _write_atomic(path, json.dumps(report, indent=2, default=str))
+    if METRICS_TEXTFILE:
+        _write_atomic(METRICS_TEXTFILE, render())
+    for key, entry in report['stages'].items():
+        logging.info(
+            f"{key}: {entry['seconds']:.2f}s, {entry['rows']} rows ({entry['rows_per_sec']:,.0f} rows/s), "
+            f"{entry['bytes_in'] / 1024 / 1024:.1f} MB in, {entry['bytes_out'] / 1024 / 1024:.1f} MB out"
+        )
+    logging.info(f'Wrote run report to {path}.')
+    return report
+
+def serve_metrics(port=METRICS_PORT):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logging.info(f'Serving Prometheus metrics on port {server.server_port}.')
+    return server
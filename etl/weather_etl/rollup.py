@@ -0,0 +1,100 @@
+import logging
+import os
+
+import pandas as pd
+
+from weather_etl.transform import COMPACT_KEYS
+
+DAILY_ROLLUP_TABLE = os.getenv('DAILY_ROLLUP_TABLE')
+MONTHLY_ROLLUP_TABLE = os.getenv('MONTHLY_ROLLUP_TABLE')
+
+# output column -> (hourly column, aggregation)
+ROLLUP_MEASURES = {
+    'temperature_2m_mean': ('temperature_2m', 'mean'),
+    'temperature_2m_min': ('temperature_2m', 'min'),
+    'temperature_2m_max': ('temperature_2m', 'max'),
+    'apparent_temperature_mean': ('apparent_temperature', 'mean'),
+    'relative_humidity_2m_mean': ('relative_humidity_2m', 'mean'),
+    'dew_point_2m_mean': ('dew_point_2m', 'mean'),
+    'cloud_cover_mean': ('cloud_cover', 'mean'),
+    'wind_speed_10m_mean': ('wind_speed_10m', 'mean'),
+    'wind_speed_10m_max': ('wind_speed_10m', 'max'),
+    'wind_gusts_10m_max': ('wind_gusts_10m', 'max'),
+    'precipitation_sum': ('precipitation', 'sum'),
+    'sunshine_duration_sum': ('sunshine_duration', 'sum'),
+    'hours': ('temperature_2m', 'size'),
+}
+
+def dominant_codes(df, keys):
+    counts = df.groupby(keys + ['weather_code'], observed=True).size().rename('n').reset_index()
+    # most frequent code per period, ties go to the higher (more severe) code
+    counts = counts.sort_values(keys + ['n', 'weather_code'], ascending=[True] * len(keys) + [False, False])
+    return counts.drop_duplicates(keys).set_index(keys)['weather_code']
+
+def rollup(df, period_column):
+    keys = [col for col in ['location_id'] if col in df.columns] + [period_column]
+    grouped = df.groupby(keys, observed=True)
+    result = grouped.agg(**{name: spec for name, spec in ROLLUP_MEASURES.items()})
+    result['sunshine_hours'] = result['sunshine_duration_sum'] / 3600
+    result['weather_code'] = dominant_codes(df, keys)
+    return result.reset_index()
+
+def daily_rollup(hourly_df):
+    return rollup(hourly_df, 'date_id')
+
+def monthly_rollup(hourly_df):
+    if pd.api.types.is_integer_dtype(hourly_df['date_id']):
+        month_ids = (hourly_df['date_id'] // 100).astype('int32')
+    else:
+        month_ids = hourly_df['date_id'].astype(str).str[:6]
+    df = hourly_df.assign(month_id=month_ids)
+    return rollup(df.drop(columns=['date_id']), 'month_id')
+
+def touched_months(date_ids):
+    return sorted({str(date_id)[:6] for date_id in date_ids})
+
+def fetch_hourly_for_months(sink, hourly_table, months, with_locations=False):
+    columns = sorted({col for col, _ in ROLLUP_MEASURES.values()} | {'date_id', 'weather_code'})
+    if with_locations:
+        columns.append('location_id')
+    # a plain range on date_id prunes partitions and works for both string and integer keys
+    first, last = f'{months[0]}01', f'{months[-1]}31'
+    if not COMPACT_KEYS:
+        first, last = f"'{first}'", f"'{last}'"
+    query = f"""
+        select {', '.join(columns)}
+        from {sink.quote(hourly_table)}
+        where date_id >= {first} and date_id <= {last}
+    """
+    df = sink.query(query)
+    return df[df['date_id'].astype(str).str[:6].isin(months)]
+
+def refresh_rollups(sink, hourly_table, date_ids, with_locations=False,
+                    daily_table=DAILY_ROLLUP_TABLE, monthly_table=MONTHLY_ROLLUP_TABLE):
+    if not daily_table and not monthly_table:
+        return
+    try:
+        date_ids = set(str(date_id) for date_id in date_ids)
+        months = touched_months(date_ids)
+        if not months:
+            return
+        keys = ['location_id'] if with_locations else []
+        hourly_df = fetch_hourly_for_months(sink, hourly_table, months, with_locations)
+        batches = {}
+        if daily_table:
+            batches[daily_table] = daily_rollup(hourly_df[hourly_df['date_id'].astype(str).isin(date_ids)])
+        if monthly_table:
+            batches[monthly_table] = monthly_rollup(hourly_df)
+        sink.load_many(
+            batches,
+            mode='upsert',
+            keys={daily_table: keys + ['date_id'], monthly_table: keys + ['month_id']},
+        )
+        logging.info(f'Refreshed rollups for {len(date_ids)} days in {len(months)} months.')
+    except Exception as e:
+        logging.error(f'Error refreshing rollups: {e}')
+        raise
+
+def rebuild_rollups(sink, hourly_table, start_date, end_date, with_locations=False):
+    date_ids = pd.date_range(start_date, end_date, freq='D').strftime('%Y%m%d')
+    refresh_rollups(sink, hourly_table, date_ids, with_locations)
@@ -0,0 +1,241 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from weather_etl.metrics import flush
+from weather_etl.state import STATE_DIR
+
+SCHEDULER_DB = os.getenv('SCHEDULER_DB', os.path.join(STATE_DIR, 'scheduler.sqlite'))
+SCHEDULER_WORKERS = int(os.getenv('SCHEDULER_WORKERS', 4))
+TASK_RETRIES = int(os.getenv('TASK_RETRIES', 3))
+TASK_RETRY_DELAY = float(os.getenv('TASK_RETRY_DELAY_SECONDS', 30))
+# upper bound on one sleep, so a changed clock or a suspended host is noticed within a minute
+MAX_SLEEP_SECONDS = 60
+
+# minute, hour, day of month, month, day of week (0 and 7 are both sunday)
+CRON_FIELDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+SCHEMA = """
+create table if not exists runs (
+    run_id integer primary key autoincrement,
+    dag text not null,
+    scheduled_for text,
+    started_at real not null,
+    finished_at real,
+    status text not null
+);
+create table if not exists task_runs (
+    run_id integer not null references runs (run_id),
+    task text not null,
+    attempt integer not null,
+    started_at real,
+    finished_at real,
+    status text not null,
+    error text
+);
+create index if not exists task_runs_run on task_runs (run_id, task);
+"""
+
+class RunStore:
+    def __init__(self, path=SCHEDULER_DB):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def start_run(self, dag, scheduled_for):
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "insert into runs (dag, scheduled_for, started_at, status) values (?, ?, ?, 'running')",
+                (dag, str(scheduled_for), time.time()),
+            )
+            return cursor.lastrowid
+
+    def finish_run(self, run_id, status):
+        with self.lock, self.conn:
+            self.conn.execute(
+                'update runs set finished_at = ?, status = ? where run_id = ?', (time.time(), status, run_id)
+            )
+
+    def record_task(self, run_id, task, attempt, status, started_at=None, finished_at=None, error=None):
+        with self.lock, self.conn:
+            self.conn.execute(
+                'insert into task_runs (run_id, task, attempt, started_at, finished_at, status, error) values (?, ?, ?, ?, ?, ?, ?)',
+                (run_id, task, attempt, started_at, finished_at, status, error),
+            )
+
+    def abandon_running(self):
+        # a run still marked running at startup died with the previous process
+        with self.lock, self.conn:
+            cursor = self.conn.execute("update runs set status = 'abandoned' where status = 'running'")
+            return cursor.rowcount
+
+    def last_run(self, dag, status=None):
+        query = 'select run_id, scheduled_for, started_at, finished_at, status from runs where dag = ?'
+        params = [dag]
+        if status is not None:
+            query += ' and status = ?'
+            params.append(status)
+        with self.lock:
+            return self.conn.execute(query + ' order by run_id desc limit 1', params).fetchone()
+
+    def task_history(self, run_id):
+        with self.lock:
+            return self.conn.execute(
+                'select task, attempt, status, finished_at - started_at, error from task_runs where run_id = ? order by rowid',
+                (run_id,),
+            ).fetchall()
+
+def parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-'))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f'Invalid cron field: {field!r}')
+        values.update(range(start, end + 1, step))
+    return values
+
+def parse_cron(expression):
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f'Cron expression needs 5 fields: {expression!r}')
+    minutes, hours, days, months, weekdays = (
+        parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELDS)
+    )
+    weekdays = {day % 7 for day in weekdays}
+    return {
+        'minutes': minutes, 'hours': hours, 'days': days, 'months': months, 'weekdays': weekdays,
+        # like cron, a restricted day of month and day of week match when either does
+        'either_day': fields[2] != '*' and fields[4] != '*',
+    }
+
+def _day_matches(cron, moment):
+    if moment.month not in cron['months']:
+        return False
+    day = moment.day in cron['days']
+    weekday = (moment.weekday() + 1) % 7 in cron['weekdays']
+    return day or weekday if cron['either_day'] else day and weekday
+
+def cron_matches(cron, moment):
+    return _day_matches(cron, moment) and moment.hour in cron['hours'] and moment.minute in cron['minutes']
+
+def next_fire(cron, after):
+    moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    # a 29 February schedule can be four years away
+    limit = moment + timedelta(days=366 * 4)
+    while moment < limit:
+        if not _day_matches(cron, moment):
+            moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+        elif moment.hour not in cron['hours']:
+            moment = (moment + timedelta(hours=1)).replace(minute=0)
+        elif moment.minute not in cron['minutes']:
+            moment += timedelta(minutes=1)
+        else:
+            return moment
+    raise ValueError('Cron expression never fires.')
+
+def task(name, func, deps=(), retries=TASK_RETRIES, retry_delay=TASK_RETRY_DELAY):
+    return {'name': name, 'func': func, 'deps': list(deps), 'retries': retries, 'retry_delay': retry_delay}
+
+def validate_dag(tasks):
+    names = [spec['name'] for spec in tasks]
+    if len(set(names)) != len(names):
+        raise ValueError('Duplicate task names in DAG.')
+    for spec in tasks:
+        unknown = [dep for dep in spec['deps'] if dep not in names]
+        if unknown:
+            raise ValueError(f"Task {spec['name']} depends on unknown tasks: {unknown}")
+    remaining = {spec['name']: set(spec['deps']) for spec in tasks}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps & remaining.keys()]
+        if not ready:
+            raise ValueError(f'DAG has a cycle between: {sorted(remaining)}')
+        for name in ready:
+            del remaining[name]
+
+def run_task(store, run, spec):
+    for attempt in range(1, spec['retries'] + 2):
+        started_at = time.time()
+        try:
+            result = spec['func'](run)
+            store.record_task(run['run_id'], spec['name'], attempt, 'success', started_at, time.time())
+            logging.info(f"Task {spec['name']} succeeded in {time.time() - started_at:.1f}s (attempt {attempt}).")
+            return result
+        except Exception as e:
+            final = attempt > spec['retries']
+            store.record_task(run['run_id'], spec['name'], attempt, 'failed' if final else 'retrying', started_at, time.time(), str(e))
+            logging.error(f"Task {spec['name']} failed on attempt {attempt}: {e}")
+            if final:
+                raise
+            time.sleep(spec['retry_delay'] * 2 ** (attempt - 1))
+
+def run_dag(store, dag, tasks, scheduled_for=None, context=None, max_workers=SCHEDULER_WORKERS):
+    validate_dag(tasks)
+    scheduled_for = scheduled_for or datetime.now()
+    run = {**(context or {}), 'dag': dag, 'scheduled_for': scheduled_for, 'run_id': store.start_run(dag, scheduled_for)}
+    logging.info(f"Starting run {run['run_id']} of {dag} scheduled for {scheduled_for}.")
+    pending = {spec['name']: spec for spec in tasks}
+    status = {}
+    running = {}
+    # each task starts as soon as its own dependencies succeed, not when a whole stage does
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for name, spec in list(pending.items()):
+                if any(status.get(dep) in ('failed', 'skipped') for dep in spec['deps']):
+                    status[name] = 'skipped'
+                    store.record_task(run['run_id'], name, 0, 'skipped')
+                    logging.warning(f'Task {name} skipped, an upstream task failed.')
+                    del pending[name]
+                elif all(status.get(dep) == 'success' for dep in spec['deps']):
+                    running[pool.submit(run_task, store, run, spec)] = name
+                    del pending[name]
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                status[name] = 'failed' if future.exception() else 'success'
+    run_status = 'success' if all(value == 'success' for value in status.values()) else 'failed'
+    store.finish_run(run['run_id'], run_status)
+    logging.info(f"Run {run['run_id']} of {dag} finished: {run_status}.")
+    flush(f"{dag}-{run['run_id']}", run_status)
+    return run['run_id'], status
+
+def serve(store, schedules, now=datetime.now, sleep=time.sleep):
+    abandoned = store.abandon_running()
+    if abandoned:
+        logging.warning(f'Marked {abandoned} interrupted runs as abandoned.')
+    crons = {schedule['dag']: parse_cron(schedule['cron']) for schedule in schedules}
+    next_runs = {dag: next_fire(cron, now()) for dag, cron in crons.items()}
+    for dag, moment in next_runs.items():
+        logging.info(f'Next run of {dag} at {moment}.')
+    while True:
+        dag = min(next_runs, key=next_runs.get)
+        delay = (next_runs[dag] - now()).total_seconds()
+        if delay > 0:
+            sleep(min(delay, MAX_SLEEP_SECONDS))
+            continue
+        schedule = next(schedule for schedule in schedules if schedule['dag'] == dag)
+        try:
+            run_dag(store, dag, schedule['tasks'](), next_runs[dag], schedule.get('context', lambda moment: {})(next_runs[dag]))
+        except Exception as e:
+            logging.error(f'Run of {dag} could not start: {e}')
+        # runs that were due while this one was busy are skipped, not queued
+        next_runs[dag] = next_fire(crons[dag], max(now(), next_runs[dag]))
+        logging.info(f'Next run of {dag} at {next_runs[dag]}.')
@@ -0,0 +1,465 @@
+import io
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pandas as pd
+
+from weather_etl.upsert import merge_statements, dedupe_batch
+from weather_etl.versions import bump_table_versions
+
+BACKEND = os.getenv('WAREHOUSE_BACKEND', 'bigquery')
+WAREHOUSE_PATH = os.getenv('WAREHOUSE_PATH')
+POSTGRES_DSN = os.getenv('POSTGRES_DSN')
+LOAD_WORKERS = int(os.getenv('LOAD_WORKERS', 4))
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+# fact tables are keyed by one of these, their first six characters name the month a row belongs to
+PARTITION_KEYS = ['date_id', 'month_id']
+
+def local_table_name(table_name):
+    return table_name.split('.')[-1]
+
+def partition_key(columns):
+    return next((col for col in PARTITION_KEYS if col in columns), None)
+
+def loaded_months(df):
+    key = partition_key(df.columns)
+    return set() if key is None else set(df[key].astype(str).str[:6].unique())
+
+def parquet_rows(path):
+    import pyarrow.parquet as pq
+    return pq.read_metadata(path).num_rows
+
+def parquet_columns(path):
+    import pyarrow.parquet as pq
+    return pq.read_schema(path).names
+
+def _done(result=None):
+    future = Future()
+    future.set_result(result)
+    return future
+
+class BaseSink:
+    dialect = None
+
+    def submit(self, df, table_name, mode='append', keys=None):
+        raise NotImplementedError
+
+    def submit_parquet(self, path, table_name, mode='append', keys=None):
+        return self.submit(pd.read_parquet(path), table_name, mode, keys)
+
+    def query(self, sql):
+        raise NotImplementedError
+
+    def execute(self, statements):
+        raise NotImplementedError(f'{type(self).__name__} does not support SQL statements.')
+
+    def table_exists(self, table_name):
+        raise NotImplementedError
+
+    def quote(self, table_name):
+        return f'"{local_table_name(table_name)}"'
+
+    def load(self, df, table_name, mode='append', keys=None):
+        result = self.wait([self.submit(df, table_name, mode, keys)])[0]
+        bump_table_versions([table_name], partitions={table_name: loaded_months(df)})
+        return result
+
+    def load_parquet(self, path, table_name, mode='append', keys=None):
+        result = self.wait([self.submit_parquet(path, table_name, mode, keys)])[0]
+        key = partition_key(parquet_columns(path))
+        months = set() if key is None else loaded_months(pd.read_parquet(path, columns=[key]))
+        bump_table_versions([table_name], partitions={table_name: months})
+        return result
+
+    def load_many(self, batches, mode='append', keys=None):
+        jobs = [self.submit(df, table_name, mode, (keys or {}).get(table_name)) for table_name, df in batches.items()]
+        results = self.wait(jobs)
+        bump_table_versions(list(batches), partitions={table_name: loaded_months(df) for table_name, df in batches.items()})
+        return results
+
+    def wait(self, jobs):
+        results = []
+        errors = []
+        for job in jobs:
+            try:
+                results.append(job.result())
+            except Exception as e:
+                errors.append(e)
+                logging.error(f'Error loading data: {e}')
+        if errors:
+            raise errors[0]
+        return results
+
+class BigQuerySink(BaseSink):
+    dialect = 'bigquery'
+
+    def __init__(self, project_id=None):
+        from google.cloud import bigquery
+        self.bigquery = bigquery
+        self.client = bigquery.Client(project=project_id)
+        self.pool = ThreadPoolExecutor(max_workers=LOAD_WORKERS)
+
+    def quote(self, table_name):
+        return f'`{table_name}`'
+
+    def submit(self, df, table_name, mode='append', keys=None):
+        if mode == 'upsert':
+            return self.pool.submit(self._upsert, df, table_name, keys)
+        job_config = self.bigquery.LoadJobConfig(
+            write_disposition='WRITE_APPEND',
+        )
+        job = self.client.load_table_from_dataframe(df, table_name, job_config=job_config)
+        return self.pool.submit(self._wait_job, job, df.shape[0], table_name)
+
+    def submit_parquet(self, path, table_name, mode='append', keys=None):
+        if mode == 'upsert':
+            return self.pool.submit(self._upsert_parquet, path, table_name, keys)
+        job_config = self.bigquery.LoadJobConfig(write_disposition='WRITE_APPEND')
+        job = self._load_parquet(path, table_name, job_config)
+        return self.pool.submit(self._wait_job, job, parquet_rows(path), table_name)
+
+    def _load_parquet(self, path, table_name, job_config):
+        job_config.source_format = self.bigquery.SourceFormat.PARQUET
+        with open(path, 'rb') as f:
+            return self.client.load_table_from_file(f, table_name, job_config=job_config)
+
+    def _wait_job(self, job, n_rows, table_name):
+        job.result()
+        logging.info(f'Loaded {n_rows} rows into table {table_name}.')
+        return n_rows
+
+    def _upsert(self, df, table_name, keys):
+        df = dedupe_batch(df, keys)
+        load = lambda staging, job_config: self.client.load_table_from_dataframe(df, staging, job_config=job_config)
+        return self._merge(load, table_name, keys, list(df.columns), df.shape[0])
+
+    def _upsert_parquet(self, path, table_name, keys):
+        load = lambda staging, job_config: self._load_parquet(path, staging, job_config)
+        return self._merge(load, table_name, keys, parquet_columns(path), parquet_rows(path))
+
+    def _merge(self, load, table_name, keys, columns, n_rows):
+        staging = f'{table_name}_staging_{uuid.uuid4().hex[:8]}'
+        try:
+            load(staging, self.bigquery.LoadJobConfig(write_disposition='WRITE_TRUNCATE')).result()
+            # tables only the ETL writes, like the rollups, have no DDL and take the staging schema
+            if not self.table_exists(table_name):
+                schema = self.client.get_table(staging).schema
+                self.client.create_table(self.bigquery.Table(table_name, schema=schema), exists_ok=True)
+                logging.info(f'Created table {table_name} from the schema of {staging}.')
+            for statement in merge_statements(table_name, staging, keys, columns):
+                self.client.query(statement).result()
+            logging.info(f'Merged {n_rows} rows into table {table_name} on {keys}.')
+            return n_rows
+        finally:
+            self.client.delete_table(staging, not_found_ok=True)
+
+    def query(self, sql):
+        return self.client.query(sql).to_dataframe()
+
+    def execute(self, statements):
+        for statement in statements:
+            self.client.query(statement).result()
+
+    def table_exists(self, table_name):
+        from google.api_core.exceptions import NotFound
+        try:
+            self.client.get_table(table_name)
+            return True
+        except NotFound:
+            return False
+
+class SQLiteSink(BaseSink):
+    dialect = 'sqlite'
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+
+    def submit(self, df, table_name, mode='append', keys=None):
+        table = local_table_name(table_name)
+        with self.lock:
+            if mode == 'upsert':
+                self._upsert(df, table, keys)
+            else:
+                df.to_sql(table, self.conn, if_exists='append', index=False)
+                logging.info(f'Loaded {df.shape[0]} rows into table {table}.')
+        return _done(df.shape[0])
+
+    def _upsert(self, df, table, keys):
+        df = dedupe_batch(df, keys)
+        staging = f'{table}_staging'
+        df.to_sql(staging, self.conn, if_exists='replace', index=False)
+        try:
+            exists = self.conn.execute(
+                "select 1 from sqlite_master where type = 'table' and name = ?", (table,)
+            ).fetchone()
+            if not exists:
+                df.head(0).to_sql(table, self.conn, index=False)
+            with self.conn:
+                for statement in merge_statements(table, staging, keys, list(df.columns), dialect='sqlite'):
+                    self.conn.execute(statement)
+            logging.info(f'Merged {df.shape[0]} rows into table {table} on {keys}.')
+        finally:
+            self.conn.execute(f'drop table if exists "{staging}"')
+
+    def query(self, sql):
+        with self.lock:
+            return pd.read_sql_query(sql, self.conn)
+
+    def execute(self, statements):
+        with self.lock, self.conn:
+            for statement in statements:
+                self.conn.execute(statement)
+
+    def table_exists(self, table_name):
+        with self.lock:
+            return self.conn.execute(
+                "select 1 from sqlite_master where type = 'table' and name = ?", (local_table_name(table_name),)
+            ).fetchone() is not None
+
+class DuckDBSink(BaseSink):
+    dialect = 'duckdb'
+
+    def __init__(self, path):
+        import duckdb
+        self.conn = duckdb.connect(path)
+        self.lock = threading.Lock()
+
+    def submit(self, df, table_name, mode='append', keys=None):
+        table = local_table_name(table_name)
+        if mode == 'upsert':
+            df = dedupe_batch(df, keys)
+        with self.lock:
+            self.conn.register('staging', df)
+            try:
+                self._load_staging(table, mode, keys, list(df.columns))
+            finally:
+                self.conn.unregister('staging')
+        logging.info(f'Loaded {df.shape[0]} rows into table {table} ({mode}).')
+        return _done(df.shape[0])
+
+    def submit_parquet(self, path, table_name, mode='append', keys=None):
+        table = local_table_name(table_name)
+        with self.lock:
+            # duckdb scans the file directly, the rows never pass through pandas
+            self.conn.execute(f"create or replace temp view staging as select * from read_parquet('{path}')")
+            try:
+                self._load_staging(table, mode, keys, parquet_columns(path))
+            finally:
+                self.conn.execute('drop view if exists staging')
+        n_rows = parquet_rows(path)
+        logging.info(f'Loaded {n_rows} rows from {path} into table {table} ({mode}).')
+        return _done(n_rows)
+
+    def _load_staging(self, table, mode, keys, columns):
+        self.conn.execute(f'create table if not exists "{table}" as select * from staging limit 0')
+        if mode == 'upsert':
+            self.conn.execute('begin transaction')
+            try:
+                for statement in merge_statements(table, 'staging', keys, columns, dialect='sqlite'):
+                    self.conn.execute(statement)
+                self.conn.execute('commit')
+            except Exception:
+                # an open transaction would swallow every later statement on the shared connection
+                self.conn.execute('rollback')
+                raise
+        else:
+            self.conn.execute(f'insert into "{table}" by name select * from staging')
+
+    def query(self, sql):
+        with self.lock:
+            return self.conn.execute(sql).df()
+
+    def execute(self, statements):
+        with self.lock:
+            self.conn.execute('begin transaction')
+            try:
+                for statement in statements:
+                    self.conn.execute(statement)
+                self.conn.execute('commit')
+            except Exception:
+                self.conn.execute('rollback')
+                raise
+
+    def table_exists(self, table_name):
+        with self.lock:
+            return self.conn.execute(
+                'select 1 from information_schema.tables where table_name = ?', [local_table_name(table_name)]
+            ).fetchone() is not None
+
+class ParquetSink(BaseSink):
+    dialect = 'duckdb'
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def table_dir(self, table_name):
+        return os.path.join(self.path, local_table_name(table_name))
+
+    def partitions(self, df):
+        # one directory per month of the table's date key, tables without one get a single directory
+        key = partition_key(df.columns)
+        if key is None:
+            return pd.Series('all', index=df.index)
+        return df[key].astype(str).str[:6]
+
+    def _parts(self, partition_dir):
+        if not os.path.isdir(partition_dir):
+            return []
+        return [os.path.join(partition_dir, f) for f in os.listdir(partition_dir) if f.endswith('.parquet')]
+
+    def _write_parts(self, df, table_dir):
+        for partition, frame in df.groupby(self.partitions(df), sort=True):
+            os.makedirs(os.path.join(table_dir, partition), exist_ok=True)
+            frame.to_parquet(os.path.join(table_dir, partition, f'part-{uuid.uuid4().hex}.parquet'), index=False)
+
+    def _rewrite(self, table_dir, df, partitions, merge):
+        # only the partitions in play are read back, every other month's files are left alone
+        batches = dict(list(df.groupby(self.partitions(df), sort=True)))
+        for partition in sorted(partitions):
+            existing = self._parts(os.path.join(table_dir, partition))
+            frames = [pd.read_parquet(f) for f in existing]
+            if not frames and partition not in batches:
+                continue
+            self._write_parts(merge(frames, batches.get(partition, df.head(0))), table_dir)
+            for f in existing:
+                os.remove(f)
+
+    def _partition_flat_files(self, table_dir):
+        # tables written before the sink partitioned its files keep them directly in the table directory
+        for f in self._parts(table_dir):
+            self._write_parts(pd.read_parquet(f), table_dir)
+            os.remove(f)
+
+    def submit(self, df, table_name, mode='append', keys=None):
+        table_dir = self.table_dir(table_name)
+        with self.lock:
+            os.makedirs(table_dir, exist_ok=True)
+            self._partition_flat_files(table_dir)
+            if mode == 'upsert':
+                df = dedupe_batch(df, keys)
+                self._rewrite(table_dir, df, set(self.partitions(df)), lambda frames, batch: pd.concat(
+                    [*frames, batch], ignore_index=True).drop_duplicates(subset=keys, keep='last'))
+            elif df.empty and not any(files for _, _, files in os.walk(table_dir)):
+                # an empty table still needs a file for the view to read its columns from
+                os.makedirs(os.path.join(table_dir, 'empty'), exist_ok=True)
+                df.to_parquet(os.path.join(table_dir, 'empty', 'part-empty.parquet'), index=False)
+            else:
+                self._write_parts(df, table_dir)
+        logging.info(f'Loaded {df.shape[0]} rows into {table_dir} ({mode}).')
+        return _done(df.shape[0])
+
+    def replace_partitions(self, df, table_name, date_ids):
+        # stands in for delete + insert, which plain Parquet files cannot run as SQL
+        table_dir = self.table_dir(table_name)
+        date_ids = {str(date_id) for date_id in date_ids}
+        months = {date_id[:6] for date_id in date_ids} | set(self.partitions(df))
+        with self.lock:
+            os.makedirs(table_dir, exist_ok=True)
+            self._partition_flat_files(table_dir)
+            self._rewrite(table_dir, df, months, lambda frames, batch: pd.concat(
+                [*[frame[~frame['date_id'].astype(str).isin(date_ids)] for frame in frames], batch], ignore_index=True))
+        logging.info(f'Replaced {len(date_ids)} date partitions of {table_dir} with {df.shape[0]} rows.')
+        return df.shape[0]
+
+    def submit_parquet(self, path, table_name, mode='append', keys=None):
+        key = partition_key(parquet_columns(path))
+        partitions = {'all'} if key is None else set(self.partitions(pd.read_parquet(path, columns=[key])))
+        # a staged file within one month is copied as is, anything else is split through pandas
+        if mode == 'upsert' or len(partitions) != 1:
+            return super().submit_parquet(path, table_name, mode, keys)
+        table_dir = self.table_dir(table_name)
+        partition_dir = os.path.join(table_dir, partitions.pop())
+        with self.lock:
+            os.makedirs(partition_dir, exist_ok=True)
+            self._partition_flat_files(table_dir)
+            shutil.copyfile(path, os.path.join(partition_dir, f'part-{uuid.uuid4().hex}.parquet'))
+        n_rows = parquet_rows(path)
+        logging.info(f'Copied {n_rows} rows from {path} into {partition_dir} ({mode}).')
+        return _done(n_rows)
+
+    def query(self, sql):
+        import duckdb
+        conn = duckdb.connect()
+        for table in os.listdir(self.path):
+            # ** also matches files a table still holds from before it was partitioned
+            pattern = os.path.join(self.path, table, '**', '*.parquet')
+            conn.execute(f"create view \"{table}\" as select * from read_parquet('{pattern}')")
+        return conn.execute(sql).df()
+
+    def table_exists(self, table_name):
+        return os.path.isdir(self.table_dir(table_name))
+
+class PostgresSink(BaseSink):
+    dialect = 'postgres'
+
+    def __init__(self, dsn):
+        from psycopg_pool import ConnectionPool
+        self.pool = ConnectionPool(dsn, min_size=1, max_size=LOAD_WORKERS, open=True)
+
+    def _copy(self, cursor, df, table):
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False)
+        cols = ', '.join(f'"{col}"' for col in df.columns)
+        with cursor.copy(f'copy "{table}" ({cols}) from stdin with (format csv)') as copy:
+            copy.write(buffer.getvalue())
+
+    def submit(self, df, table_name, mode='append', keys=None):
+        table = local_table_name(table_name)
+        with self.pool.connection() as conn, conn.cursor() as cursor:
+            if mode == 'upsert':
+                df = dedupe_batch(df, keys)
+                staging = f'{table}_staging'
+                cursor.execute(f'create temp table "{staging}" (like "{table}" including defaults) on commit drop')
+                self._copy(cursor, df, staging)
+                for statement in merge_statements(table, staging, keys, list(df.columns), dialect='postgres'):
+                    cursor.execute(statement)
+            else:
+                self._copy(cursor, df, table)
+        logging.info(f'Copied {df.shape[0]} rows into table {table} ({mode}).')
+        return _done(df.shape[0])
+
+    def query(self, sql):
+        with self.pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(sql)
+            return pd.DataFrame(cursor.fetchall(), columns=[col.name for col in cursor.description])
+
+    def execute(self, statements):
+        with self.pool.connection() as conn, conn.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def table_exists(self, table_name):
+        with self.pool.connection() as conn, conn.cursor() as cursor:
+            cursor.execute('select to_regclass(%s)', (f'"{local_table_name(table_name)}"',))
+            return cursor.fetchone()[0] is not None
+
+def create_sink(backend=BACKEND, project_id=None, path=WAREHOUSE_PATH):
+    if backend == 'bigquery':
+        return BigQuerySink(project_id)
+    if backend == 'sqlite':
+        return SQLiteSink(path or 'warehouse.db')
+    if backend == 'duckdb':
+        return DuckDBSink(path or 'warehouse.duckdb')
+    if backend == 'parquet':
+        return ParquetSink(path or 'warehouse')
+    if backend == 'postgres':
+        return PostgresSink(POSTGRES_DSN)
+    raise ValueError(f'Unknown warehouse backend: {backend}')
+
+def get_sink(project_id=None, backend=BACKEND):
+    key = (backend, project_id if backend == 'bigquery' else None)
+    with _sinks_lock:
+        if key not in _sinks:
+            _sinks[key] = create_sink(backend, project_id)
+            logging.info(f'Created {backend} sink.')
+        return _sinks[key]
@@ -0,0 +1,105 @@
+import os
+
+# frames whose target table is not configured are skipped, so air quality is opt-in via AIR_QUALITY_TABLE
+COMBINED_FRAMES = [frame.strip() for frame in os.getenv('COMBINED_FRAMES', 'hourly,daily,air_quality').split(',') if frame.strip()]
+
+# each endpoint is called once per location batch with every frame that reads from it
+ENDPOINTS = {
+    'weather': {
+        'url_env': 'URL_PATH',
+        'params': {'timezone': 'auto', 'wind_speed_unit': 'ms', 'timeformat': 'unixtime'},
+    },
+    'air_quality': {
+        'url_env': 'AIR_QUALITY_URL',
+        'default_url': 'https://air-quality-api.open-meteo.com/v1/air-quality',
+        'params': {'timezone': 'auto', 'timeformat': 'unixtime'},
+    },
+}
+
+# frame -> endpoint, response block, target table, merge keys and variables with the SDK accessor dtype
+FRAMES = {
+    'hourly': {
+        'endpoint': 'weather',
+        'block': 'hourly',
+        'table_env': 'HOURLY_WEATHER_TABLE',
+        'keys': ['location_id', 'id'],
+        'variables': {
+            'temperature_2m': 'float32',
+            'relative_humidity_2m': 'float32',
+            'dew_point_2m': 'float32',
+            'apparent_temperature': 'float32',
+            'precipitation': 'float32',
+            'weather_code': 'float32',
+            'cloud_cover': 'float32',
+            'wind_speed_10m': 'float32',
+            'wind_direction_10m': 'float32',
+            'wind_gusts_10m': 'float32',
+            'is_day': 'float32',
+            'sunshine_duration': 'float32',
+        },
+    },
+    'daily': {
+        'endpoint': 'weather',
+        'block': 'daily',
+        'table_env': 'DAILY_WEATHER_TABLE',
+        'keys': ['location_id', 'date_id'],
+        'variables': {
+            'weather_code': 'float32',
+            'sunrise': 'int64',
+            'sunset': 'int64',
+            'daylight_duration': 'float32',
+        },
+    },
+    'air_quality': {
+        'endpoint': 'air_quality',
+        'block': 'hourly',
+        'table_env': 'AIR_QUALITY_TABLE',
+        'keys': ['location_id', 'id'],
+        'variables': {
+            'pm10': 'float32',
+            'pm2_5': 'float32',
+            'carbon_monoxide': 'float32',
+            'nitrogen_dioxide': 'float32',
+            'sulphur_dioxide': 'float32',
+            'ozone': 'float32',
+            'us_aqi': 'float32',
+            'european_aqi': 'float32',
+        },
+    },
+}
+
+# dimension -> target table and the variable its loader has always read the warehouse project from
+DIMENSIONS = {
+    'date': {'table_env': 'DATE_TABLE', 'project_env': 'BQ_PROJECT_ID'},
+    'time': {'table_env': 'TIME_TABLE', 'project_env': 'PROJECT_ID'},
+    'timeshift': {'table_env': 'TIMESHIFT_TABLE', 'project_env': 'GG_PROJECT_ID', 'sheet': 'timeshift'},
+    'weather_code': {'table_env': 'WEATHER_CODE_TABLE', 'project_env': 'GOOGLE_CLOUD_PROJECT', 'sheet': 'weather_code'},
+}
+
+def frame_variables(frame):
+    return list(FRAMES[frame]['variables'])
+
+def frame_keys(frame, columns):
+    return [key for key in FRAMES[frame]['keys'] if key in columns]
+
+def frame_table(frame):
+    return os.getenv(FRAMES[frame]['table_env'])
+
+def active_frames(frames=COMBINED_FRAMES):
+    return [frame for frame in frames if frame_table(frame)]
+
+def endpoint_url(endpoint):
+    spec = ENDPOINTS[endpoint]
+    return os.getenv(spec['url_env'], spec.get('default_url'))
+
+def endpoint_frames(frames):
+    grouped = {}
+    for frame in frames:
+        grouped.setdefault(FRAMES[frame]['endpoint'], []).append(frame)
+    return grouped
+
+def dimension_table(name):
+    return os.getenv(DIMENSIONS[name]['table_env'])
+
+def dimension_project(name):
+    return os.getenv(DIMENSIONS[name]['project_env'])
@@ -0,0 +1,39 @@
+import json
+import os
+import threading
+
+STATE_DIR = os.getenv('ETL_STATE_DIR', '.etl_state')
+
+_lock = threading.Lock()
+
+def state_path(name):
+    return os.path.join(STATE_DIR, f'{name}.json')
+
+def read_state(name):
+    path = state_path(name)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _write_state(name, state):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    tmp_path = state_path(name) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, state_path(name))
+
+def update_state(name, **values):
+    with _lock:
+        state = read_state(name)
+        state.update(values)
+        _write_state(name, state)
+        return state
+
+def remove_state(name, *keys):
+    with _lock:
+        state = read_state(name)
+        for key in keys:
+            state.pop(key, None)
+        _write_state(name, state)
+        return state
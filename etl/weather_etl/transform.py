@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+COMPACT_KEYS = os.getenv('COMPACT_KEYS', '0') == '1'
+KEY_COLUMNS = ['id', 'date_id', 'time_id', 'month_id', 'weather_code', 'is_day']
+# air quality frames share the hourly keys but carry no code columns
+CODE_COLUMNS = ['weather_code', 'is_day']
+
+def format_ints(values, width):
+    # format each distinct value once, then broadcast through the factorized codes
+    codes, uniques = pd.factorize(np.asarray(values, dtype=np.int64))
+    labels = np.array([str(value).zfill(width) for value in uniques], dtype=object)
+    return labels[codes]
+
+def date_ids(dates):
+    dates = pd.Series(dates)
+    values = dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day
+    return pd.Series(format_ints(values, 8), index=dates.index, dtype=str)
+
+def time_ids(dates):
+    dates = pd.Series(dates)
+    values = dates.dt.hour * 100 + dates.dt.minute
+    return pd.Series(format_ints(values, 4), index=dates.index, dtype=str)
+
+def date_keys(dates):
+    dates = pd.Series(dates)
+    return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).astype(np.int32)
+
+def time_keys(dates):
+    dates = pd.Series(dates)
+    return (dates.dt.hour * 100 + dates.dt.minute).astype(np.int16)
+
+def code_keys(values):
+    return pd.Series(values).astype(np.int16)
+
+def clock_times(dates):
+    dates = pd.Series(dates)
+    minutes = dates.dt.hour * 60 + dates.dt.minute
+    codes, uniques = pd.factorize(np.asarray(minutes, dtype=np.int64))
+    labels = np.array([f'{value // 60:02d}:{value % 60:02d}' for value in uniques], dtype=object)
+    return pd.Series(labels[codes], index=dates.index, dtype=str)
+
+def zero_pad_codes(values, width=2):
+    values = pd.Series(values)
+    return pd.Series(format_ints(values.astype(np.int64), width), index=values.index, dtype=str)
+
+def to_nullable_floats(df, exclude=KEY_COLUMNS):
+    columns = [col for col in df.select_dtypes(include='number').columns if col not in exclude]
+    return df.astype({col: 'Float64' for col in columns})
+
+def transform_hourly_frame(df, compact=COMPACT_KEYS):
+    if compact:
+        df['date_id'] = date_keys(df['date'])
+        df['time_id'] = time_keys(df['date'])
+        for col in CODE_COLUMNS:
+            if col in df.columns:
+                df[col] = code_keys(df[col])
+        df['id'] = df['date_id'].astype(np.int64) * 10000 + df['time_id']
+    else:
+        df['date_id'] = date_ids(df['date'])
+        df['time_id'] = time_ids(df['date'])
+        for col in CODE_COLUMNS:
+            if col in df.columns:
+                df[col] = zero_pad_codes(df[col])
+        df['id'] = df['date_id'] + df['time_id']
+    df = df.drop(columns=['date'])
+    return to_nullable_floats(df)
+
+def transform_daily_frame(df, target_timezone, compact=COMPACT_KEYS):
+    if compact:
+        df['date_id'] = date_keys(df['date'])
+        df['weather_code'] = code_keys(df['weather_code'])
+    else:
+        df['date_id'] = date_ids(df['date'])
+        df['weather_code'] = zero_pad_codes(df['weather_code'])
+    df = df.drop(columns=['date'])
+    for col in ['sunrise', 'sunset']:
+        df[col] = clock_times(pd.to_datetime(df[col], unit='s', utc=True).dt.tz_convert(target_timezone))
+    return to_nullable_floats(df)
@@ -0,0 +1,50 @@
+import logging
+
+import pandas as pd
+
+from weather_etl.state import read_state, update_state
+
+def merge_statements(target, staging, keys, columns, dialect='bigquery'):
+    if dialect == 'bigquery':
+        on = ' and '.join(f't.{key} = s.{key}' for key in keys)
+        updates = ', '.join(f'{col} = s.{col}' for col in columns if col not in keys)
+        insert_cols = ', '.join(columns)
+        insert_vals = ', '.join(f's.{col}' for col in columns)
+        return [f"""
+            merge `{target}` as t
+            using `{staging}` as s
+            on {on}
+            when matched then update set {updates}
+            when not matched then insert ({insert_cols}) values ({insert_vals})
+        """]
+
+    # engines without MERGE (sqlite, older duckdb/postgres): delete matched keys, then insert the batch
+    on = ' and '.join(f'"{target}"."{key}" = s."{key}"' for key in keys)
+    cols = ', '.join(f'"{col}"' for col in columns)
+    return [
+        f'delete from "{target}" where exists (select 1 from "{staging}" as s where {on})',
+        f'insert into "{target}" ({cols}) select {cols} from "{staging}"',
+    ]
+
+def dedupe_batch(df, keys):
+    deduped = df.drop_duplicates(subset=keys, keep='last')
+    if len(deduped) < len(df):
+        logging.warning(f'Dropped {len(df) - len(deduped)} duplicate keys from batch.')
+    return deduped
+
+def get_watermark(table_name):
+    return read_state('watermarks').get(table_name)
+
+def record_watermark(table_name, date_id):
+    current = get_watermark(table_name)
+    if current is None or str(date_id) > current:
+        update_state('watermarks', **{table_name: str(date_id)})
+        logging.info(f'Watermark for {table_name} advanced to {date_id}.')
+
+def incremental_date_range(date_range, watermark):
+    if watermark is None:
+        return date_range
+    start = max(pd.Timestamp(date_range['start_date']), pd.Timestamp(watermark) + pd.Timedelta(days=1))
+    if start > pd.Timestamp(date_range['end_date']):
+        return None
+    return {**date_range, 'start_date': start.strftime('%Y-%m-%d')}
@@ -0,0 +1,31 @@
+import json
+import logging
+import os
+import threading
+import time
+
+TABLE_VERSIONS_PATH = os.getenv('TABLE_VERSIONS_PATH')
+# table -> month -> version of the last load that touched it, the dashboard replica re-pulls the months that moved
+PARTITIONS_KEY = '_partitions'
+
+_lock = threading.Lock()
+
+def bump_table_versions(table_names, path=TABLE_VERSIONS_PATH, partitions=None):
+    if not path:
+        return
+    with _lock:
+        versions = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                versions = json.load(f)
+        version = f'{time.time():.6f}'
+        for table_name in table_names:
+            versions[table_name.split('.')[-1]] = version
+        for table_name, months in (partitions or {}).items():
+            table_partitions = versions.setdefault(PARTITIONS_KEY, {}).setdefault(table_name.split('.')[-1], {})
+            table_partitions.update({str(month): version for month in months})
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(versions, f, indent=2, sort_keys=True)
+        os.replace(path + '.tmp', path)
+    logging.info(f'Bumped table versions for {", ".join(table_names)}.')
@@ -0,0 +1,101 @@
+import logging
+import os
+
+from weather_etl.sink import ParquetSink
+from weather_etl.transform import COMPACT_KEYS
+from weather_etl.versions import bump_table_versions
+
+WIDE_WEATHER_TABLE = os.getenv('WIDE_WEATHER_TABLE')
+
+MEASURES = [
+    'temperature_2m',
+    'relative_humidity_2m',
+    'dew_point_2m',
+    'apparent_temperature',
+    'precipitation',
+    'cloud_cover',
+    'wind_speed_10m',
+    'wind_gusts_10m',
+    'wind_direction_10m',
+    'sunshine_duration',
+]
+
+def wide_columns(with_locations=False):
+    location = ['location_id'] if with_locations else []
+    return ['id', *location, 'date_id', 'time_id', 'date', 'quarter', 'month', 'year', 'time', 'is_day', 'weather_code',
+            *MEASURES, 'sunrise', 'sunset', 'daylight_duration']
+
+def wide_select(sink, where, with_locations=False):
+    table = lambda env_name: sink.quote(os.getenv(env_name))
+    location_column = 'hw.location_id,' if with_locations else ''
+    location_join = ' and hw.location_id = dw.location_id' if with_locations else ''
+    measures = ',\n            '.join(f'hw.{col}' for col in MEASURES)
+    return f"""
+        select
+            hw.id,
+            {location_column}
+            hw.date_id,
+            hw.time_id,
+            d.date,
+            d.quarter,
+            d.month,
+            d.year,
+            t.time,
+            ts.name as is_day,
+            wc.name as weather_code,
+            {measures},
+            dw.sunrise,
+            dw.sunset,
+            dw.daylight_duration
+        from {table('HOURLY_WEATHER_TABLE')} as hw
+        join {table('TIMESHIFT_TABLE')} as ts on hw.is_day = ts.id
+        join {table('DATE_TABLE')} as d on hw.date_id = d.id
+        join {table('TIME_TABLE')} as t on hw.time_id = t.id
+        join {table('WEATHER_CODE_TABLE')} as wc on hw.weather_code = wc.id
+        left join {table('DAILY_WEATHER_TABLE')} as dw on hw.date_id = dw.date_id{location_join}
+        {where}
+    """
+
+def create_statement(sink, wide_table, with_locations=False):
+    select = wide_select(sink, 'where 1 = 0', with_locations)
+    if sink.dialect == 'bigquery':
+        return f'create table if not exists {sink.quote(wide_table)} partition by date as {select}'
+    return f'create table if not exists {sink.quote(wide_table)} as {select}'
+
+def date_id_literals(date_ids):
+    if COMPACT_KEYS:
+        return ', '.join(str(int(date_id)) for date_id in date_ids)
+    return ', '.join(f"'{date_id}'" for date_id in date_ids)
+
+def refresh_wide_table(sink, date_ids, with_locations=False, wide_table=WIDE_WEATHER_TABLE):
+    if not wide_table:
+        return
+    try:
+        date_ids = sorted({str(date_id) for date_id in date_ids})
+        if not date_ids:
+            return
+        # hourly and daily loads both trigger a refresh, so whichever lands first waits for the other
+        missing = [name for name in ['HOURLY_WEATHER_TABLE', 'DAILY_WEATHER_TABLE']
+                   if not sink.table_exists(os.getenv(name))]
+        if missing:
+            logging.info(f'Skipping {wide_table} refresh until {", ".join(missing)} is loaded.')
+            return
+        in_list = date_id_literals(date_ids)
+        where = f'where hw.date_id in ({in_list})'
+        if isinstance(sink, ParquetSink):
+            sink.replace_partitions(sink.query(wide_select(sink, where, with_locations)), wide_table, date_ids)
+            bump_table_versions([wide_table], partitions={wide_table: {date_id[:6] for date_id in date_ids}})
+            logging.info(f'Rebuilt {len(date_ids)} date partitions of {wide_table}.')
+            return
+        sink.execute([
+            create_statement(sink, wide_table, with_locations),
+            f'delete from {sink.quote(wide_table)} where date_id in ({in_list})',
+            # named columns, a table created from the shipped schema also has location_id in single-location mode
+            f'insert into {sink.quote(wide_table)} ({", ".join(wide_columns(with_locations))}) '
+            f'{wide_select(sink, where, with_locations)}',
+        ])
+        bump_table_versions([wide_table], partitions={wide_table: {date_id[:6] for date_id in date_ids}})
+        logging.info(f'Rebuilt {len(date_ids)} date partitions of {wide_table}.')
+    except Exception as e:
+        logging.error(f'Error refreshing wide table: {e}')
+        raise
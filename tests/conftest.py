@@ -0,0 +1,17 @@
+import re
+from pathlib import Path
+
+import pytest
+
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / 'db' / 'weather dashboard.sql'
+
+def create_shipped_tables(conn, names, path=SCHEMA_PATH):
+    # DuckDB runs the Postgres DDL once the range partitioning is dropped, the partitions themselves are skipped
+    for statement in path.read_text().split(';'):
+        match = re.match(r'\s*CREATE TABLE "(\w+)" \(', statement)
+        if match and match.group(1) in names:
+            conn.execute(re.sub(r'\)\s*PARTITION BY RANGE \([^)]*\)\s*$', ')', statement.strip()))
+
+@pytest.fixture
+def shipped_schema():
+    return create_shipped_tables
@@ -0,0 +1,74 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from weather_etl import state
+from weather_etl.backfill import (
+    fetch_loaded_date_ids, find_missing_windows, run_backfill, split_date_range,
+)
+from weather_etl.sink import DuckDBSink
+
+@pytest.fixture(autouse=True)
+def state_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(state, 'STATE_DIR', str(tmp_path / 'state'))
+
+def test_split_date_range_cuts_at_month_starts():
+    assert split_date_range('2024-01-15', '2024-03-10') == [
+        {'start_date': '2024-01-15', 'end_date': '2024-01-31'},
+        {'start_date': '2024-02-01', 'end_date': '2024-02-29'},
+        {'start_date': '2024-03-01', 'end_date': '2024-03-10'},
+    ]
+    assert split_date_range('2024-02-01', '2024-02-01') == [{'start_date': '2024-02-01', 'end_date': '2024-02-01'}]
+    weeks = split_date_range('2024-01-01', '2024-01-31', freq='7D')
+    assert len(weeks) == 5 and weeks[-1] == {'start_date': '2024-01-29', 'end_date': '2024-01-31'}
+
+def test_split_date_range_rejects_a_reversed_range():
+    with pytest.raises(ValueError):
+        split_date_range('2024-02-01', '2024-01-01')
+
+def test_failed_windows_are_resumed_on_the_next_run():
+    windows = split_date_range('2024-01-01', '2024-04-30')
+    processed = []
+    lock = threading.Lock()
+
+    def flaky(window):
+        with lock:
+            processed.append(window['start_date'])
+        if window['start_date'] == '2024-02-01':
+            raise RuntimeError('rate limited')
+
+    with pytest.raises(RuntimeError, match='1 windows failed'):
+        run_backfill('hourly', windows, flaky, max_workers=2)
+    assert sorted(processed) == ['2024-01-01', '2024-02-01', '2024-03-01', '2024-04-01']
+
+    processed.clear()
+    run_backfill('hourly', windows, lambda window: processed.append(window['start_date']))
+    # only the window that failed runs again
+    assert processed == ['2024-02-01']
+    processed.clear()
+    run_backfill('hourly', windows, lambda window: processed.append(window['start_date']))
+    assert processed == []
+
+def test_gaps_become_windows_split_at_month_starts():
+    dim_dates = pd.date_range('2024-01-01', '2024-03-31').strftime('%Y%m%d')
+    loaded = set(dim_dates) - {'20240105', '20240106', '20240130', '20240131', '20240201', '20240315'}
+    assert find_missing_windows(loaded, dim_dates, end_date='2024-03-20') == [
+        {'start_date': '2024-01-05', 'end_date': '2024-01-06'},
+        {'start_date': '2024-01-30', 'end_date': '2024-01-31'},
+        {'start_date': '2024-02-01', 'end_date': '2024-02-01'},
+        {'start_date': '2024-03-15', 'end_date': '2024-03-15'},
+    ]
+    # days after the end date are not gaps yet
+    assert find_missing_windows(set(), dim_dates, end_date='2024-01-02') == [
+        {'start_date': '2024-01-01', 'end_date': '2024-01-02'},
+    ]
+
+def test_partly_loaded_days_count_as_gaps():
+    sink = DuckDBSink(':memory:')
+    periods = pd.date_range('2024-01-01', '2024-01-03 23:00', freq='h')
+    hourly = pd.DataFrame({'date_id': periods.strftime('%Y%m%d'), 'temperature_2m': 1.0})
+    # the last day only got half its hours
+    sink.load(hourly.iloc[:-12], 'p.d.hourly_weather_data')
+    assert fetch_loaded_date_ids(sink, 'p.d.hourly_weather_data') == {'20240101', '20240102', '20240103'}
+    assert fetch_loaded_date_ids(sink, 'p.d.hourly_weather_data', min_rows=24) == {'20240101', '20240102'}
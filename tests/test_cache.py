@@ -0,0 +1,100 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import cache
+from cache import QueryCache, TableVersions, cache_key, query_tables
+
+QUERY = 'select * from `p.d.hourly_weather_data` as hw join `p.d.dim_date` as d on hw.date_id = d.id'
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'time', clock)
+    monkeypatch.delenv('REPLICA_DIR', raising=False)
+    return clock
+
+def frame(value):
+    return pd.DataFrame({'date_id': ['20240101'], 'temperature_2m': [value]})
+
+def write_versions(path, versions, mtime):
+    path.write_text(json.dumps(versions))
+    # TableVersions rereads the file when its mtime moves
+    os.utime(path, (mtime, mtime))
+
+def test_key_ignores_whitespace_but_not_params():
+    assert cache_key('select  *\n from t', {'a': 1}) == cache_key('select * from t', {'a': 1})
+    assert cache_key('select * from t', {'a': 1}) != cache_key('select * from t', {'a': 2})
+    assert query_tables(QUERY) == ['dim_date', 'hourly_weather_data']
+
+def test_entries_expire_after_the_ttl(clock):
+    query_cache = QueryCache(ttl=60, versions=TableVersions(None))
+    query_cache.set(QUERY, None, frame(1.0))
+    clock.now += 59
+    pd.testing.assert_frame_equal(query_cache.get(QUERY), frame(1.0))
+    clock.now += 2
+    assert query_cache.get(QUERY) is None
+    assert (query_cache.hits, query_cache.misses) == (1, 1)
+
+def test_least_recently_used_entry_is_evicted(clock):
+    query_cache = QueryCache(max_entries=2, versions=TableVersions(None))
+    for value in [1.0, 2.0]:
+        query_cache.set(QUERY, {'v': value}, frame(value))
+    # reading the first entry makes the second the oldest
+    assert query_cache.get(QUERY, {'v': 1.0}) is not None
+    query_cache.set(QUERY, {'v': 3.0}, frame(3.0))
+    assert query_cache.get(QUERY, {'v': 2.0}) is None
+    assert query_cache.get(QUERY, {'v': 1.0}) is not None and query_cache.get(QUERY, {'v': 3.0}) is not None
+
+def test_a_load_into_a_queried_table_invalidates(clock, tmp_path):
+    path = tmp_path / 'versions.json'
+    write_versions(path, {'hourly_weather_data': '1', 'dim_date': '1'}, 1)
+    query_cache = QueryCache(versions=TableVersions(str(path)))
+    query_cache.set(QUERY, None, frame(1.0))
+    other = 'select * from `p.d.air_quality_data`'
+    query_cache.set(other, None, frame(2.0))
+
+    write_versions(path, {'hourly_weather_data': '2', 'dim_date': '1'}, 2)
+    assert query_cache.get(QUERY) is None
+    # a query over untouched tables keeps its entry
+    pd.testing.assert_frame_equal(query_cache.get(other), frame(2.0))
+
+def test_returned_frames_are_copies(clock):
+    query_cache = QueryCache(versions=TableVersions(None))
+    query_cache.set(QUERY, None, frame(1.0))
+    df = query_cache.get(QUERY)
+    df['temperature_2m'] = 9.0
+    assert query_cache.get(QUERY)['temperature_2m'].tolist() == [1.0]
+
+def test_disk_entries_are_shared_and_checked_like_memory_ones(clock, tmp_path):
+    path = tmp_path / 'versions.json'
+    write_versions(path, {'hourly_weather_data': '1'}, 1)
+    writer = QueryCache(ttl=60, cache_dir=str(tmp_path / 'cache'), versions=TableVersions(str(path)))
+    writer.set(QUERY, None, frame(1.0))
+
+    # another worker process starts with an empty memory cache
+    reader = QueryCache(ttl=60, cache_dir=str(tmp_path / 'cache'), versions=TableVersions(str(path)))
+    pd.testing.assert_frame_equal(reader.get(QUERY), frame(1.0))
+    reader.clear()
+    write_versions(path, {'hourly_weather_data': '2'}, 2)
+    assert reader.get(QUERY) is None
+    assert os.listdir(tmp_path / 'cache') == []
+
+def test_disk_cache_evicts_the_oldest_entries_past_its_budget(clock, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    query_cache = QueryCache(cache_dir=str(cache_dir), disk_max_bytes=10**9, versions=TableVersions(None))
+    query_cache.set(QUERY, {'v': 1}, frame(1.0))
+    size = sum(os.path.getsize(cache_dir / name) for name in os.listdir(cache_dir))
+    os.utime(cache_dir / f"{cache_key(QUERY, {'v': 1})}.json", (1, 1))
+    query_cache.disk_max_bytes = size + size // 2
+    query_cache.set(QUERY, {'v': 2}, frame(2.0))
+    assert sorted(os.listdir(cache_dir)) == sorted(f"{cache_key(QUERY, {'v': 2})}{ext}" for ext in ['.json', '.parquet'])
@@ -0,0 +1,102 @@
+import functools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import climatology as dashboard_climatology
+from weather_etl.climatology import (
+    BINS, LocationClimatology, calendar_days, fold_observations, histogram_percentiles, location_file, pool_days,
+)
+
+def observations(start, end, temperature=20.0, location_id=None):
+    periods = pd.date_range(start, end, freq='h')
+    df = pd.DataFrame({
+        'date_id': periods.strftime('%Y%m%d'),
+        'time_id': periods.strftime('%H%M'),
+        'temperature_2m': temperature,
+        'relative_humidity_2m': 80.0,
+        'precipitation': 0.0,
+    })
+    if location_id is not None:
+        df['location_id'] = location_id
+    return df
+
+def test_leap_day_has_its_own_slot():
+    days = calendar_days(pd.to_datetime(['2023-02-28', '2023-03-01', '2024-02-29', '2024-03-01', '2023-12-31', '2024-12-31']))
+    assert days.tolist() == [58, 60, 59, 60, 365, 365]
+
+def test_percentiles_interpolate_inside_the_bin():
+    edges = np.arange(0, 11, 1.0)
+    counts = np.stack([np.ones(10, dtype=np.uint32), np.zeros(10, dtype=np.uint32)])
+    counts[1, 3] = 4
+    bands = histogram_percentiles(counts, edges, [10, 50, 90])
+    np.testing.assert_allclose(bands[0], [1.0, 5.0, 9.0])
+    # every value sits in [3, 4), spread evenly across it
+    np.testing.assert_allclose(bands[1], [3.1, 3.5, 3.9], rtol=1e-6)
+    empty = histogram_percentiles(np.zeros((1, 10), dtype=np.uint32), edges, [50])
+    assert np.isnan(empty).all()
+
+def test_pooling_wraps_around_the_year():
+    rng = np.random.default_rng(0)
+    counts = rng.integers(0, 5, size=(366, 2, 3)).astype(np.uint16)
+    pooled = pool_days(counts, window_days=3)
+    for day in [0, 2, 180, 364, 365]:
+        window = [(day + offset) % 366 for offset in range(-3, 4)]
+        np.testing.assert_array_equal(pooled[day], counts[window].sum(axis=0))
+    np.testing.assert_array_equal(pool_days(counts, window_days=0), counts)
+
+def test_each_hour_is_folded_once():
+    climatology = LocationClimatology()
+    df = observations('2024-01-01', '2024-01-02 23:00')
+    df.loc[5, 'temperature_2m'] = np.nan
+    df.loc[6, 'temperature_2m'] = 99.0
+    assert climatology.fold(df) == 48
+    # replaying an overlapping window only adds the new hours
+    assert climatology.fold(observations('2024-01-02', '2024-01-03 23:00')) == 24
+    temperature = climatology.hist['temperature_2m']
+    assert temperature.sum() == 71 and temperature[[0, 1, 2]].sum(axis=(1, 2)).tolist() == [23, 24, 24]
+    # values past the last edge land in the end bin
+    assert temperature[0, 6, -1] == 1
+    assert climatology.hist['precipitation'].sum() == 72
+    with pytest.raises(ValueError):
+        climatology.fold(observations('1939-12-31', '1939-12-31 01:00'))
+
+def test_patched_bands_match_a_full_recompute():
+    climatology = LocationClimatology()
+    for year in range(2015, 2024):
+        climatology.fold(observations(f'{year}-01-01', f'{year}-12-31 23:00', 10.0 + year - 2015))
+    climatology.saved_bands = climatology.bands()
+    climatology.touched.clear()
+    climatology.fold(observations('2024-03-01', '2024-03-02 23:00', 35.0))
+    patched = climatology.updated_bands()
+    for measure, bands in climatology.bands().items():
+        np.testing.assert_array_equal(patched[measure], bands)
+    # ten years of 10 to 19 degrees, then one warm pair of days
+    p50 = patched['temperature_2m'][:, :, 2]
+    assert p50[60, 12] > p50[200, 12]
+
+def test_dashboard_reads_the_bands_the_etl_writes(tmp_path, monkeypatch):
+    df = pd.concat([
+        observations('2023-02-20', '2023-03-10 23:00', 10.0, 'hanoi'),
+        observations('2024-02-20', '2024-03-10 23:00', 20.0, 'hanoi'),
+        observations('2024-02-20', '2024-03-10 23:00', 30.0, 'hcmc'),
+    ], ignore_index=True)
+    assert fold_observations(df, str(tmp_path), bands='all') == len(df)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['hanoi.npz', 'hcmc.npz']
+    monkeypatch.setattr(dashboard_climatology, 'load_bands', functools.partial(dashboard_climatology.load_bands, climatology_dir=str(tmp_path)))
+    assert dashboard_climatology.location_file('hanoi', str(tmp_path)) == location_file(str(tmp_path), 'hanoi')
+
+    periods = pd.DatetimeIndex(['2025-03-01 12:00', '2024-03-01 12:00', '2024-02-29 12:00'])
+    bands = dashboard_climatology.load_bands('hanoi')
+    assert bands['percentiles'] == [10, 25, 50, 75, 90] and set(BINS) < set(bands)
+    days, hours = dashboard_climatology.calendar_slots(periods)
+    assert days.tolist() == [60, 60, 59] and hours.tolist() == [12, 12, 12]
+    view = pd.DataFrame({'period': periods, 'temperature_2m': 25.0})
+    hanoi = dashboard_climatology.anomalies(view, 'temperature_2m', 'hanoi')
+    # 1 March is the same slot in leap and common years, and pools both of them
+    assert hanoi.iloc[0] == hanoi.iloc[1] and 10.0 < 25.0 - hanoi.iloc[0] < 20.5
+    # every hcmc value sits in the [30, 30.5) bin, so its median is the middle of it
+    hcmc = dashboard_climatology.anomalies(view, 'temperature_2m', 'hcmc')
+    assert hcmc.tolist() == pytest.approx([25.0 - 30.25] * 3)
+    assert dashboard_climatology.anomalies(view, 'temperature_2m', 'danang') is None
@@ -0,0 +1,101 @@
+import functools
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import downsample
+
+FILTERS = ('2024-01-01', '2024-01-10', 'hour', ('temperature_2m',), ('hanoi',))
+BUDGET = 50
+
+@pytest.fixture
+def tab(monkeypatch, tmp_path):
+    monkeypatch.setenv('FIGURE_CACHE_DIR', str(tmp_path / 'figures'))
+    # the file name has a space, so it is loaded the way the app loads its tabs
+    path = os.path.join(os.path.dirname(__file__), '..', 'dashboard', 'tabs', 'daily weather.py')
+    spec = importlib.util.spec_from_file_location('daily_weather', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, 'point_budget', functools.partial(downsample.point_budget, BUDGET, 1))
+    monkeypatch.setattr(module, 'baseline_bands', lambda *args: None)
+    return module
+
+def hourly(start, end):
+    periods = pd.date_range(start, end, freq='h')
+    rng = np.random.default_rng(len(periods))
+    return pd.DataFrame({
+        'period': periods,
+        'location_id': 'hanoi',
+        'temperature_2m': rng.normal(25, 3, len(periods)),
+        'precipitation': rng.exponential(0.2, len(periods)),
+        'wind_gusts_10m': 5.0,
+        'weather_code': 'Clear sky',
+    })
+
+def figures(tab, df):
+    trend = tab.trend_figure(df, FILTERS[3])
+    precipitation = tab.precipitation_figure(df)
+    watermark = {
+        'filters': list(FILTERS),
+        'versions': [],
+        'earliest': df['period'].min().isoformat(),
+        'latest': df['period'].max().isoformat(),
+        'summary': tab.summary_parts(df),
+        'trend': tab.trace_keys(trend),
+        'precipitation': tab.trace_keys(precipitation),
+        'trend_points': tab.trace_points(trend),
+        'precipitation_points': tab.trace_points(precipitation),
+    }
+    return trend, precipitation, watermark
+
+def drawn(figure):
+    # what the browser holds, the Patch operations act on plain lists
+    return {'data': [{'x': list(trace['x']), 'y': list(trace['y'])} for trace in figure['data']]}
+
+def test_patched_rows_keep_their_order_on_both_sides(tab):
+    trend, _, watermark = figures(tab, hourly('2024-01-02', '2024-01-02 23:00'))
+    trend = drawn(trend)
+    points = list(trend['data'][0]['x'])
+    later = tab.trend_traces(hourly('2024-01-03', '2024-01-03 00:00'), FILTERS[3])
+    earlier = tab.trend_traces(hourly('2024-01-01 22:00', '2024-01-01 23:00'), FILTERS[3])
+    counts = tab.patch_traces(trend, watermark['trend'], watermark['trend_points'], later, 'extend')
+    counts = tab.patch_traces(trend, watermark['trend'], counts, earlier, 'prepend')
+    assert counts == [27]
+    assert trend['data'][0]['x'] == [*earlier[0].x, *points, *later[0].x]
+    assert len(trend['data'][0]['y']) == 27
+
+def test_trace_past_twice_the_budget_is_not_patched(tab):
+    trend, _, watermark = figures(tab, hourly('2024-01-01', '2024-01-05 23:00'))
+    trend = drawn(trend)
+    assert watermark['trend_points'] == [BUDGET]
+    within = tab.trend_traces(hourly('2024-01-06', '2024-01-07 23:00'), FILTERS[3])
+    counts = tab.patch_traces(trend, watermark['trend'], watermark['trend_points'], within, 'extend')
+    assert counts == [BUDGET + 48]
+    past = tab.trend_traces(hourly('2024-01-08', '2024-01-08 02:00'), FILTERS[3])
+    assert tab.patch_traces(trend, watermark['trend'], counts, past, 'extend') is None
+    # a location without a trace yet cannot be patched either
+    other = hourly('2024-01-08', '2024-01-08 02:00').assign(location_id='hcmc')
+    assert tab.patch_traces(trend, watermark['trend'], counts, tab.trend_traces(other, FILTERS[3]), 'extend') is None
+
+def test_update_past_the_budget_rebuilds_downsampled_figures(tab, monkeypatch):
+    history = hourly('2024-01-01', '2024-01-10 23:00')
+    monkeypatch.setattr(tab, 'fetch_window', lambda filters, side, start, end: history[
+        (history['period'] > pd.Timestamp(start)) & (history['period'] <= pd.Timestamp(end))
+    ])
+    monkeypatch.setattr(tab, 'full_update', lambda filters: (figures(tab, history), 'rebuilt'))
+    _, _, watermark = figures(tab, history[history['period'] < '2024-01-04'])
+
+    # a day of new rows is sent as a patch
+    trend, precipitation, _, watermark = tab.patch_update(FILTERS, watermark, [('extend', watermark['latest'], '2024-01-04 23:00')], [])
+    assert type(trend).__name__ == 'Patch' and type(precipitation).__name__ == 'Patch'
+    assert watermark['trend_points'] == [BUDGET + 24] and watermark['latest'] == '2024-01-04T23:00:00'
+
+    # two more days would take the trace past twice its budget
+    rebuilt, status = tab.patch_update(FILTERS, watermark, [('extend', watermark['latest'], '2024-01-06 23:00')], [])
+    assert status == 'rebuilt'
+    trend, precipitation, watermark = rebuilt
+    assert all(len(trace['x']) <= BUDGET for trace in trend['data'] + precipitation['data'])
+    assert watermark['trend_points'] == [BUDGET]
@@ -0,0 +1,66 @@
+import functools
+
+import pandas as pd
+import pytest
+
+import data
+import metrics
+from cache import QueryCache
+
+QUERY = 'select * from `p.d.hourly_weather_data`'
+
+def make_batch(start, rows):
+    return pd.DataFrame({
+        'date_id': [f'202401{day:02d}' for day in range(start + 1, start + rows + 1)],
+        'temperature_2m': [float(i) for i in range(rows)],
+        'weather_code': ['Overcast' if i % 2 else f'Code {start}' for i in range(rows)],
+        'is_day': ['Day'] * rows,
+    })
+
+@pytest.fixture
+def backend(monkeypatch):
+    pulled = []
+
+    def iter_query_batches(query, params=None):
+        for start in [0, 3, 6]:
+            pulled.append(start)
+            yield make_batch(start, 3)
+
+    monkeypatch.setattr(data, 'iter_query_batches', iter_query_batches)
+    monkeypatch.setattr(data, 'apply_dtypes', functools.partial(data.apply_dtypes, compact=True))
+    monkeypatch.setattr(data, 'COMPACT_KEYS', True)
+    monkeypatch.setattr(data, 'query_cache', QueryCache(cache_dir=None))
+    monkeypatch.setattr(metrics, '_conn', None)
+    return pulled
+
+def test_iter_data_yields_typed_batches_as_they_arrive(backend):
+    batches = data.iter_data(QUERY)
+    first = next(batches)
+    # the caller gets the first batch before the backend is asked for the second
+    assert backend == [0]
+    assert len(first) == 3
+    assert first['temperature_2m'].dtype == 'float32'
+    assert isinstance(first['weather_code'].dtype, pd.CategoricalDtype)
+    assert len(list(batches)) == 2 and backend == [0, 3, 6]
+    assert metrics.snapshot()[data.query_source(QUERY)]['rows'] == 9
+
+def test_iter_data_caches_the_whole_result(backend):
+    streamed = data.concat_frames(list(data.iter_data(QUERY)))
+    cached = list(data.iter_data(QUERY))
+    assert len(cached) == 1 and backend == [0, 3, 6]
+    pd.testing.assert_frame_equal(cached[0], streamed)
+    assert metrics.snapshot()['cache']['rows'] == 9
+
+def test_fetch_data_streams_through_iter_data(backend):
+    df = data.fetch_data(QUERY, stream=True)
+    assert len(df) == 9 and backend == [0, 3, 6]
+    # categories of every batch survive the concatenation
+    assert set(df['weather_code'].cat.categories) == {'Overcast', 'Code 0', 'Code 3', 'Code 6'}
+    pd.testing.assert_frame_equal(data.fetch_data(QUERY, stream=True), df)
+    assert backend == [0, 3, 6]
+
+def test_fetch_data_reads_whole_without_compact_dtypes(backend, monkeypatch):
+    monkeypatch.setattr(data, 'COMPACT_KEYS', False)
+    monkeypatch.setattr(data, 'run_query', lambda query, params=None: make_batch(0, 9))
+    df = data.fetch_data(QUERY, stream=True)
+    assert len(df) == 9 and backend == []
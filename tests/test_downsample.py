@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from downsample import downsample_frame, lttb_indices, minmax_indices, point_budget
+
+def series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = pd.date_range('2024-01-01', periods=n, freq='h', tz='Asia/Ho_Chi_Minh')
+    return x, rng.normal(25, 4, n).cumsum() / 10
+
+def test_point_budget_follows_the_chart_width():
+    assert point_budget(1200, 2) == 2400
+    assert point_budget(1, 0.5) == 3
+
+@pytest.mark.parametrize('n_out', [3, 4, 100, 999])
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_budget_is_respected_and_endpoints_kept(method, n_out):
+    x, y = series(1000)
+    indices = lttb_indices(x, y, n_out) if method == 'lttb' else minmax_indices(y, n_out)
+    assert len(indices) <= n_out
+    assert indices[0] == 0 and indices[-1] == 999
+    assert (np.diff(indices) > 0).all()
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_short_series_are_returned_whole(method):
+    x, y = series(50)
+    indices = lttb_indices(x, y, 50) if method == 'lttb' else minmax_indices(y, 80)
+    assert indices.tolist() == list(range(50))
+
+def test_lttb_fills_the_budget_and_keeps_a_spike():
+    x, y = series(1000)
+    y[437] = 1000.0
+    indices = lttb_indices(x, y, 100)
+    assert len(indices) == 100 and 437 in indices
+
+def test_minmax_keeps_every_bucket_extreme():
+    y = np.zeros(1000)
+    y[[10, 500, 990]] = [5.0, 7.0, 9.0]
+    y[[250, 750]] = -3.0
+    kept = set(minmax_indices(y, 20).tolist())
+    assert {10, 500, 990, 250, 750} <= kept
+
+def test_frame_is_sampled_per_group_and_measure():
+    x, y = series(2000)
+    df = pd.concat([
+        pd.DataFrame({'period': x, 'location_id': location_id, 'temperature_2m': y + i, 'precipitation': np.abs(y)})
+        for i, location_id in enumerate(['hanoi', 'hcmc'])
+    ], ignore_index=True)
+    df.loc[5, 'temperature_2m'] = np.nan
+    sampled = downsample_frame(df, 'period', ['temperature_2m', 'precipitation'], n_out=50, by='location_id')
+    for _, part in sampled.groupby(['location_id', 'measure']):
+        assert len(part) <= 50 and part['value'].notna().all()
+        assert part['period'].iloc[0] == x[0] and part['period'].iloc[-1] == x[-1]
+
+def test_zoomed_frame_is_clipped_before_sampling():
+    x, y = series(2000)
+    df = pd.DataFrame({'period': x, 'temperature_2m': y})
+    sampled = downsample_frame(df, 'period', ['temperature_2m'], n_out=50, x_range=('2024-02-01', '2024-02-10'))
+    assert len(sampled) == 50
+    assert sampled['period'].min() == pd.Timestamp('2024-02-01', tz='Asia/Ho_Chi_Minh')
+    assert sampled['period'].max() == pd.Timestamp('2024-02-10', tz='Asia/Ho_Chi_Minh')
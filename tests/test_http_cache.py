@@ -0,0 +1,117 @@
+from datetime import date
+
+import pytest
+
+from weather_etl import http_cache
+from weather_etl.http_cache import CachePolicySession, cache_key, expire_after, open_cache
+
+ARCHIVE = 'https://archive-api.open-meteo.com/v1/archive'
+FORECAST = 'https://api.open-meteo.com/v1/forecast'
+AIR_QUALITY = 'https://air-quality-api.open-meteo.com/v1/air-quality'
+TODAY = date(2024, 6, 15)
+TTL = http_cache.HTTP_CACHE_RECENT_TTL
+
+class Response:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+class Session:
+    def __init__(self):
+        self.requests = []
+        self.status_code = 200
+
+    def get(self, url, params=None, **kwargs):
+        self.requests.append(('GET', url))
+        return Response(f'{url} {len(self.requests)}'.encode(), self.status_code)
+
+    def post(self, url, data=None, **kwargs):
+        self.requests.append(('POST', url))
+        return Response(f'{url} {len(self.requests)}'.encode(), self.status_code)
+
+@pytest.fixture(params=['sqlite', 'filesystem'])
+def cache(request, tmp_path):
+    return open_cache(request.param, str(tmp_path / request.param), max_mb=1)
+
+def window(start, end, **params):
+    return {'latitude': [21.03, 10.82], 'longitude': [105.85, 106.63], 'start_date': start, 'end_date': end, **params}
+
+@pytest.mark.parametrize('params, ttl', [
+    # archive windows that ended before the settle day never change again
+    (window('2024-01-01', '2024-01-31'), None),
+    (window('2024-06-01', '2024-06-13'), None),
+    # the settle day and anything reaching today or later may still be revised
+    (window('2024-06-01', '2024-06-14'), TTL),
+    (window('2024-06-01', '2024-06-20'), TTL),
+    # forecast and air quality requests sized in days from now are always recent
+    ({'latitude': 21.03, 'longitude': 105.85, 'forecast_days': 7}, TTL),
+    ({'latitude': 21.03, 'longitude': 105.85, 'past_days': 2, 'forecast_days': 1}, TTL),
+    ({'latitude': 21.03, 'longitude': 105.85, 'current': ['pm10', 'pm2_5']}, TTL),
+    (window('2024-01-01', '2024-01-31', past_days=2), TTL),
+])
+def test_policy_follows_the_requested_window(params, ttl):
+    assert expire_after(params, TODAY) == ttl
+
+def test_key_is_normalized_but_separates_endpoints_and_methods():
+    params = window('2024-01-01', '2024-01-31', hourly=['temperature_2m', 'rain'], timezone='auto')
+    reordered = {name: params[name] for name in reversed(list(params))}
+    joined = {**params, 'hourly': 'temperature_2m,rain', 'latitude': '21.03,10.82', 'format': None}
+    assert cache_key('get', ARCHIVE + '/', reordered) == cache_key('GET', ARCHIVE, params) == cache_key('GET', ARCHIVE, joined)
+    assert cache_key('GET', ARCHIVE, params) != cache_key('GET', AIR_QUALITY, params)
+    assert cache_key('GET', ARCHIVE, params) != cache_key('POST', ARCHIVE, params)
+    assert cache_key('GET', ARCHIVE, params) != cache_key('GET', ARCHIVE, {**params, 'end_date': '2024-02-01'})
+
+def test_session_serves_settled_archive_windows_and_refetches_recent_ones(cache, monkeypatch):
+    now = {'time': 1_000_000.0}
+    monkeypatch.setattr(http_cache.time, 'time', lambda: now['time'])
+    monkeypatch.setattr(http_cache, 'settled_before', lambda today=None: date(2024, 6, 14))
+    session = Session()
+    cached = CachePolicySession(session, cache)
+    archive = window('2024-01-01', '2024-01-31')
+    forecast = {'latitude': 21.03, 'longitude': 105.85, 'forecast_days': 7}
+
+    first = cached.get(ARCHIVE, params=archive).content
+    cached.get(FORECAST, params=forecast)
+    cached.post(AIR_QUALITY, data=forecast)
+    assert len(session.requests) == 3
+
+    now['time'] += TTL - 1
+    assert cached.get(ARCHIVE, params=archive).content == first
+    cached.get(FORECAST, params=forecast)
+    cached.post(AIR_QUALITY, data=forecast)
+    assert len(session.requests) == 3
+
+    now['time'] += 2
+    assert cached.get(ARCHIVE, params=archive).content == first
+    cached.get(FORECAST, params=forecast)
+    cached.post(AIR_QUALITY, data=forecast)
+    assert session.requests[3:] == [('GET', FORECAST), ('POST', AIR_QUALITY)]
+    stats = cache.summary()
+    assert (stats['hits'], stats['misses'], stats['expired'], stats['stored']) == (4, 5, 2, 5)
+
+def test_failed_responses_are_not_cached(cache):
+    session = Session()
+    cached = CachePolicySession(session, cache)
+    session.status_code = 429
+    assert cached.get(ARCHIVE, params=window('2024-01-01', '2024-01-31')).status_code == 429
+    session.status_code = 200
+    assert cached.get(ARCHIVE, params=window('2024-01-01', '2024-01-31')).status_code == 200
+    assert len(session.requests) == 2 and cache.summary()['stored'] == 1
+
+def test_least_recently_used_responses_are_evicted_past_the_cap(cache):
+    cache.max_bytes = 2500
+    for key in ['a', 'b']:
+        cache.set(key * 64, key.encode() * 1000, None)
+    # reading the first response makes the second the oldest
+    assert cache.get('a' * 64) is not None
+    cache.set('c' * 64, b'c' * 1000, None)
+    assert cache.get('b' * 64) is None
+    assert cache.get('a' * 64) is not None and cache.get('c' * 64) is not None
+    assert cache.total <= cache.max_bytes and cache.summary()['evicted'] == 1
+
+def test_expired_entries_are_dropped_when_the_cache_reopens(tmp_path):
+    cache = open_cache('sqlite', str(tmp_path / 'cache.sqlite'))
+    cache.set('recent', b'x' * 100, -1)
+    cache.set('archive', b'y' * 100, None)
+    reopened = open_cache('sqlite', str(tmp_path / 'cache.sqlite'))
+    assert reopened.total == 100 and reopened.get('archive') == b'y' * 100
@@ -0,0 +1,20 @@
+import json
+
+from locations import location_options
+
+def test_location_options_read_csv(tmp_path):
+    path = tmp_path / 'locations.csv'
+    path.write_text('location_id,latitude,longitude\nhanoi,21.03,105.85\nhcmc,10.76,106.66\n')
+    assert location_options(str(path)) == [{'label': 'hanoi', 'value': 'hanoi'}, {'label': 'hcmc', 'value': 'hcmc'}]
+
+def test_location_options_read_json_with_the_etl_fallbacks(tmp_path):
+    path = tmp_path / 'locations.json'
+    # ids fall back to the name, then the row number, as they did when the ETL loaded the file
+    path.write_text(json.dumps([
+        {'name': 'hanoi', 'latitude': 21.03, 'longitude': 105.85},
+        {'latitude': 10.76, 'longitude': 106.66},
+    ]))
+    assert [option['value'] for option in location_options(str(path))] == ['hanoi', '1']
+
+def test_location_options_without_a_file():
+    assert location_options(None) == []
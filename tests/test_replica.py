@@ -0,0 +1,89 @@
+import functools
+import os
+
+import pandas as pd
+import pytest
+
+import replica
+from cache import TableVersions
+from weather_etl import sink as sink_module
+from weather_etl.sink import DuckDBSink
+from weather_etl.versions import bump_table_versions
+
+KEYS = ['location_id', 'id']
+
+def batch(start, end, value):
+    periods = pd.date_range(start, end, freq='6h')
+    return pd.DataFrame({
+        'id': periods.strftime('%Y%m%d%H%M'),
+        'location_id': 'hanoi',
+        'date_id': periods.strftime('%Y%m%d'),
+        'temperature_2m': value,
+    })
+
+@pytest.fixture
+def setup(monkeypatch, tmp_path):
+    versions_path = str(tmp_path / 'versions.json')
+    replica_dir = tmp_path / 'replica'
+    replica_dir.mkdir()
+    monkeypatch.setenv('HOURLY_WEATHER_TABLE', 'p.d.hourly')
+    monkeypatch.setenv('TABLE_VERSIONS_PATH', versions_path)
+    monkeypatch.setenv('REPLICA_DIR', str(replica_dir))
+    for env_name in [*replica.FACT_TABLES, *replica.DIMENSION_TABLES]:
+        if env_name != 'HOURLY_WEATHER_TABLE':
+            monkeypatch.delenv(env_name, raising=False)
+    monkeypatch.setattr(sink_module, 'bump_table_versions', functools.partial(bump_table_versions, path=versions_path))
+    warehouse = DuckDBSink(':memory:')
+    queries = []
+
+    def warehouse_query(query, params):
+        queries.append(params)
+        return warehouse.conn.execute(query, params).df()
+
+    def sync(state):
+        state['hourly'] = replica.sync_table('HOURLY_WEATHER_TABLE', 'date_id', state, warehouse_query, 'duckdb')
+        replica.write_state(state)
+        return state
+
+    return warehouse, sync, queries, replica_dir / 'hourly', versions_path
+
+def replica_rows(table_dir):
+    return pd.concat([pd.read_parquet(table_dir / name) for name in sorted(os.listdir(table_dir))], ignore_index=True)
+
+def test_backfilled_month_reaches_the_replica(setup):
+    warehouse, sync, queries, table_dir, _ = setup
+    warehouse.load(batch('2024-01-01', '2024-03-31 18:00', 1.0), 'p.d.hourly', mode='upsert', keys=KEYS)
+    state = sync({})
+    assert state['hourly']['watermark'] == '202403'
+    february = os.path.getmtime(table_dir / '202402.parquet')
+
+    # a backfill rewrites January while April arrives as usual
+    warehouse.load(batch('2024-01-10', '2024-01-12 18:00', 5.0), 'p.d.hourly', mode='upsert', keys=KEYS)
+    warehouse.load(batch('2024-04-01', '2024-04-02 18:00', 1.0), 'p.d.hourly', mode='upsert', keys=KEYS)
+    state = sync(state)
+
+    assert sorted(queries[-1].values()) == ['20240101', '20240201', '20240301']
+    assert state['hourly']['watermark'] == '202404'
+    assert os.path.getmtime(table_dir / '202402.parquet') == february
+    df = replica_rows(table_dir)
+    backfilled = df['date_id'].between('20240110', '20240112')
+    assert len(df) == 4 * (91 + 2) and backfilled.sum() == 12
+    assert df.loc[backfilled, 'temperature_2m'].eq(5.0).all() and df.loc[~backfilled, 'temperature_2m'].eq(1.0).all()
+
+    # nothing loaded since, so only the watermark month is read again
+    sync(state)
+    assert list(queries[-1].values()) == ['20240401']
+
+def test_cache_sees_a_load_once_the_replica_has_it(setup):
+    warehouse, sync, _, _, versions_path = setup
+    warehouse.load(batch('2024-01-01', '2024-01-31 18:00', 1.0), 'p.d.hourly', mode='upsert', keys=KEYS)
+    state = sync({})
+    versions = TableVersions(versions_path)
+    before = versions.snapshot(['hourly'])
+    assert before == {'hourly': versions.current()['hourly']}
+
+    warehouse.load(batch('2024-01-05', '2024-01-05 18:00', 2.0), 'p.d.hourly', mode='upsert', keys=KEYS)
+    # the ETL moved on, but the replica still serves the old rows, so cached reads of them stay valid
+    assert versions.snapshot(['hourly']) == before
+    sync(state)
+    assert versions.snapshot(['hourly']) == {'hourly': versions.current()['hourly']} != before
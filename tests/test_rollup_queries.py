@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+from weather_etl.rollup import daily_rollup, monthly_rollup
+import query_builder
+
+DASHBOARD_DIR = Path(__file__).resolve().parents[1] / 'dashboard'
+COLUMNS = ['temperature_2m', 'precipitation', 'wind_gusts_10m']
+AGGREGATIONS = {'wind_gusts_10m': 'max'}
+
+@pytest.fixture
+def warehouse(monkeypatch):
+    monkeypatch.setenv('HOURLY_WEATHER_TABLE', 'p.d.hourly')
+    monkeypatch.setenv('DAILY_ROLLUP_TABLE', 'p.d.daily_rollup')
+    monkeypatch.setenv('MONTHLY_ROLLUP_TABLE', 'p.d.monthly_rollup')
+    rng = np.random.default_rng(0)
+    periods = pd.date_range('2020-01-01', '2020-02-29 23:00', freq='h')
+    hourly = pd.concat([
+        pd.DataFrame({
+            'location_id': location_id,
+            'date_id': periods.strftime('%Y%m%d'),
+            'time_id': periods.strftime('%H%M'),
+            'temperature_2m': rng.normal(10, 5, len(periods)),
+            'apparent_temperature': rng.normal(8, 5, len(periods)),
+            'relative_humidity_2m': rng.uniform(20, 100, len(periods)),
+            'dew_point_2m': rng.normal(5, 3, len(periods)),
+            'cloud_cover': rng.uniform(0, 100, len(periods)),
+            'wind_speed_10m': rng.uniform(0, 20, len(periods)),
+            'wind_gusts_10m': rng.uniform(0, 40, len(periods)),
+            'precipitation': rng.exponential(0.3, len(periods)),
+            'sunshine_duration': rng.uniform(0, 3600, len(periods)),
+            'weather_code': rng.choice(['0', '3', '61'], len(periods)),
+        })
+        for location_id in ['a', 'b']
+    ], ignore_index=True)
+    conn = duckdb.connect()
+    conn.register('hourly_df', hourly)
+    conn.register('daily_df', daily_rollup(hourly))
+    conn.register('monthly_df', monthly_rollup(hourly))
+    for name in ['hourly', 'daily', 'monthly']:
+        table = 'hourly' if name == 'hourly' else f'{name}_rollup'
+        conn.execute(f'create table {table} as select * from {name}_df')
+    return conn
+
+def run(conn, built):
+    query, params = built
+    return conn.execute(query, params).df()
+
+@pytest.mark.parametrize('granularity', ['day', 'month'])
+@pytest.mark.parametrize('locations', [None, ['a'], ['a', 'b']])
+@pytest.mark.parametrize('window', [('2020-01-01', '2020-02-29'), ('2020-01-05', '2020-02-20')])
+def test_rollup_matches_hourly(warehouse, granularity, locations, window):
+    args = (*window, locations, COLUMNS, granularity, AGGREGATIONS)
+    rollup = query_builder.build_query(*args, use_rollups=True, dialect='duckdb', use_wide=False)
+    raw = query_builder.build_query(*args, use_rollups=False, dialect='duckdb', use_wide=False)
+    if granularity == 'day' or window == ('2020-01-01', '2020-02-29'):
+        assert '"hourly"' not in rollup[0]
+
+    sort = ['period', 'location_id'] if locations else ['period']
+    expected = run(warehouse, raw).sort_values(sort, ignore_index=True)
+    actual = run(warehouse, rollup).sort_values(sort, ignore_index=True)
+    assert len(actual) == expected['period'].nunique() * (len(locations) if locations else 1)
+    pd.testing.assert_frame_equal(actual[expected.columns], expected, check_dtype=False)
+
+def test_partial_month_window_reads_hourly_rows(warehouse):
+    query, _ = query_builder.build_query('2020-01-05', '2020-02-20', ['a'], COLUMNS, 'month', AGGREGATIONS, dialect='duckdb', use_wide=False)
+    assert '"monthly_rollup"' not in query
+    query, _ = query_builder.build_query('2020-01-01', '2020-02-29', ['a'], COLUMNS, 'month', AGGREGATIONS, dialect='duckdb', use_wide=False)
+    assert '"monthly_rollup"' in query
+
+def test_raw_query_needs_only_the_joined_tables(monkeypatch):
+    monkeypatch.setenv('HOURLY_WEATHER_TABLE', 'p.d.hourly')
+    for env_name in ['DATE_TABLE', 'TIME_TABLE', 'TIMESHIFT_TABLE', 'WEATHER_CODE_TABLE', 'DAILY_WEATHER_TABLE']:
+        monkeypatch.delenv(env_name, raising=False)
+    query, _ = query_builder.build_query(columns=COLUMNS, dialect='duckdb', use_wide=False)
+    assert 'join' not in query
+    with pytest.raises(ValueError, match='DATE_TABLE is not set'):
+        query_builder.build_query(columns=['date', *COLUMNS], dialect='duckdb', use_wide=False)
+
+def test_data_imports_without_table_settings(tmp_path):
+    env = {name: value for name, value in os.environ.items() if not name.endswith('_TABLE')}
+    # run from an empty directory so no .env fills the settings back in
+    result = subprocess.run([sys.executable, '-c', 'import data'], cwd=tmp_path, capture_output=True, text=True,
+                            env={**env, 'PYTHONPATH': str(DASHBOARD_DIR)})
+    assert result.returncode == 0, result.stderr
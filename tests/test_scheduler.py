@@ -0,0 +1,129 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from weather_etl import scheduler
+from weather_etl.scheduler import RunStore, next_fire, parse_cron, run_dag, serve, task, validate_dag
+
+@pytest.fixture
+def store(tmp_path):
+    return RunStore(str(tmp_path / 'scheduler.sqlite'))
+
+def test_cron_fields_expand_lists_ranges_and_steps():
+    cron = parse_cron('*/15 1-3,22 * * 7')
+    assert cron['minutes'] == {0, 15, 30, 45}
+    assert cron['hours'] == {1, 2, 3, 22}
+    assert cron['weekdays'] == {0} and not cron['either_day']
+    assert parse_cron('5/20 * * * *')['minutes'] == {5, 25, 45}
+
+@pytest.mark.parametrize('expression', ['* * * *', '60 * * * *', '* 5-2 * * *', '*/0 * * * *', '* * 0 * *'])
+def test_invalid_cron_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        parse_cron(expression)
+
+def test_next_fire_rolls_over_hours_days_and_years():
+    daily = parse_cron('30 1 * * *')
+    assert next_fire(daily, datetime(2024, 3, 1, 1, 29, 59)) == datetime(2024, 3, 1, 1, 30)
+    # a run at exactly the fire time schedules the next day
+    assert next_fire(daily, datetime(2024, 3, 1, 1, 30)) == datetime(2024, 3, 2, 1, 30)
+    assert next_fire(daily, datetime(2024, 12, 31, 23, 59)) == datetime(2025, 1, 1, 1, 30)
+    assert next_fire(parse_cron('0 0 29 2 *'), datetime(2024, 3, 1)) == datetime(2028, 2, 29)
+
+def test_day_of_month_and_weekday_match_either_when_both_are_set():
+    # the 13th, or any friday
+    cron = parse_cron('0 12 13 * 5')
+    assert next_fire(cron, datetime(2024, 9, 1)) == datetime(2024, 9, 6, 12)
+    assert next_fire(cron, datetime(2024, 9, 12, 13)) == datetime(2024, 9, 13, 12)
+    # with a wildcard day of month only the weekday counts
+    assert next_fire(parse_cron('0 12 * * 5'), datetime(2024, 9, 7)) == datetime(2024, 9, 13, 12)
+
+def test_dag_validation_finds_unknown_tasks_and_cycles():
+    noop = lambda run: None
+    with pytest.raises(ValueError, match='unknown'):
+        validate_dag([task('a', noop, ['missing'])])
+    with pytest.raises(ValueError, match='cycle'):
+        validate_dag([task('a', noop), task('b', noop, ['a', 'c']), task('c', noop, ['b'])])
+    with pytest.raises(ValueError, match='Duplicate'):
+        validate_dag([task('a', noop), task('a', noop)])
+
+def test_tasks_start_after_their_own_dependencies(store):
+    order = []
+    lock = threading.Lock()
+
+    def record(name):
+        def run_task(run):
+            with lock:
+                order.append(name)
+        return run_task
+
+    tasks = [
+        task('derived', record('derived'), ['hourly', 'daily']),
+        task('hourly', record('hourly'), ['date_dim', 'time_dim']),
+        task('daily', record('daily'), ['date_dim']),
+        task('date_dim', record('date_dim')),
+        task('time_dim', record('time_dim')),
+    ]
+    run_id, status = run_dag(store, 'weather', tasks, datetime(2024, 3, 1, 1, 30))
+    assert set(status.values()) == {'success'}
+    for spec in tasks:
+        assert all(order.index(dep) < order.index(spec['name']) for dep in spec['deps'])
+    assert store.last_run('weather')[4] == 'success' and store.last_run('weather')[0] == run_id
+
+def test_failed_task_is_retried_and_its_dependents_skipped(store, monkeypatch):
+    monkeypatch.setattr(scheduler.time, 'sleep', lambda seconds: None)
+    calls = []
+
+    def broken(run):
+        calls.append(run['scheduled_for'])
+        raise RuntimeError('api down')
+
+    tasks = [
+        task('hourly', broken, retries=2),
+        task('daily', lambda run: None),
+        task('derived', lambda run: None, ['hourly', 'daily']),
+    ]
+    run_id, status = run_dag(store, 'weather', tasks)
+    assert status == {'hourly': 'failed', 'daily': 'success', 'derived': 'skipped'}
+    assert len(calls) == 3
+    history = [(name, attempt, result) for name, attempt, result, _, _ in store.task_history(run_id)]
+    assert [row for row in history if row[0] != 'daily'] == [
+        ('hourly', 1, 'retrying'), ('hourly', 2, 'retrying'), ('hourly', 3, 'failed'), ('derived', 0, 'skipped'),
+    ]
+    assert store.last_run('weather')[4] == 'failed'
+
+class Stop(Exception):
+    pass
+
+def test_serve_runs_at_fire_times_and_skips_missed_ones(store):
+    clock = {'now': datetime(2024, 3, 1, 0, 0)}
+    runs = []
+
+    def run_task(run):
+        runs.append(run['scheduled_for'])
+        # the first run overruns the next fire time
+        if len(runs) == 1:
+            clock['now'] = datetime(2024, 3, 2, 2, 0)
+
+    def sleep(seconds):
+        assert 0 < seconds <= scheduler.MAX_SLEEP_SECONDS
+        if len(runs) == 2:
+            raise Stop
+        clock['now'] += timedelta(seconds=seconds)
+
+    schedules = [{'dag': 'weather', 'cron': '30 1 * * *', 'tasks': lambda: [task('load', run_task, retries=0)]}]
+    with pytest.raises(Stop):
+        serve(store, schedules, now=lambda: clock['now'], sleep=sleep)
+    assert runs == [datetime(2024, 3, 1, 1, 30), datetime(2024, 3, 3, 1, 30)]
+
+def test_weather_dag_loads_facts_after_dimensions_and_derived_tables_last():
+    from weather_etl import jobs
+    tasks = jobs.weather_tasks()
+    validate_dag(tasks)
+    deps = {spec['name']: set(spec['deps']) for spec in tasks}
+    dimensions = {name for name, names in deps.items() if not names}
+    assert dimensions == {'date_dim', 'time_dim', 'timeshift_dim', 'weather_code_dim'}
+    assert deps['hourly_weather'] == deps['daily_weather'] == dimensions
+    assert deps['derived_tables'] == {'hourly_weather', 'daily_weather'}
+    # a run loads the day before its scheduled time
+    assert jobs.run_context(datetime(2024, 3, 1, 1, 30)) == {'date_range': {'start_date': '2024-02-29', 'end_date': '2024-02-29'}}
@@ -0,0 +1,85 @@
+import os
+
+import pandas as pd
+import pytest
+
+from weather_etl.sink import ParquetSink
+
+KEYS = ['location_id', 'id']
+TABLE = 'p.d.hourly_weather_data'
+
+def batch(start, end, value, location_ids=('hanoi', 'hcmc')):
+    periods = pd.date_range(start, end, freq='6h')
+    return pd.concat([pd.DataFrame({
+        'id': periods.strftime('%Y%m%d%H%M'),
+        'location_id': location_id,
+        'date_id': periods.strftime('%Y%m%d'),
+        'temperature_2m': value,
+    }) for location_id in location_ids], ignore_index=True)
+
+def files(sink):
+    table_dir = sink.table_dir(TABLE)
+    return {partition: sorted(os.listdir(os.path.join(table_dir, partition))) for partition in sorted(os.listdir(table_dir))}
+
+def rows(sink):
+    return sink.query('select * from hourly_weather_data order by location_id, id')
+
+@pytest.fixture
+def sink(tmp_path):
+    return ParquetSink(str(tmp_path / 'warehouse'))
+
+def test_append_writes_one_directory_per_month(sink):
+    sink.load(batch('2024-01-30', '2024-02-02 18:00', 1.0), TABLE)
+    sink.load(batch('2024-02-03', '2024-02-03 18:00', 1.0), TABLE)
+    assert list(files(sink)) == ['202401', '202402']
+    assert len(files(sink)['202402']) == 2
+    assert len(rows(sink)) == 2 * 4 * 5
+
+def test_upsert_rewrites_only_the_touched_months(sink):
+    sink.load(batch('2024-01-01', '2024-03-31 18:00', 1.0), TABLE, mode='upsert', keys=KEYS)
+    before = files(sink)
+    sink.load(batch('2024-02-10', '2024-02-11 18:00', 2.0, ['hanoi']), TABLE, mode='upsert', keys=KEYS)
+    after = files(sink)
+    assert after['202401'] == before['202401'] and after['202403'] == before['202403']
+    assert after['202402'] != before['202402'] and len(after['202402']) == 1
+
+    df = rows(sink)
+    assert len(df) == 2 * 4 * 91 and not df.duplicated(KEYS).any()
+    updated = df['location_id'].eq('hanoi') & df['date_id'].between('20240210', '20240211')
+    assert updated.sum() == 8 and df.loc[updated, 'temperature_2m'].eq(2.0).all()
+    assert df.loc[~updated, 'temperature_2m'].eq(1.0).all()
+
+def test_rerunning_an_upsert_leaves_the_table_unchanged(sink):
+    sink.load(batch('2024-01-25', '2024-02-05 18:00', 1.0), TABLE, mode='upsert', keys=KEYS)
+    first = rows(sink)
+    sink.load(batch('2024-01-25', '2024-02-05 18:00', 1.0), TABLE, mode='upsert', keys=KEYS)
+    pd.testing.assert_frame_equal(rows(sink), first)
+    assert {partition: len(parts) for partition, parts in files(sink).items()} == {'202401': 1, '202402': 1}
+
+def test_replace_partitions_swaps_whole_dates(sink):
+    sink.load(batch('2024-01-01', '2024-02-29 18:00', 1.0), TABLE)
+    before = files(sink)
+    sink.replace_partitions(batch('2024-01-10', '2024-01-10 18:00', 3.0, ['hanoi']), TABLE, ['20240110', '20240111'])
+    assert files(sink)['202402'] == before['202402']
+    df = rows(sink)
+    assert not df['date_id'].eq('20240111').any()
+    replaced = df[df['date_id'] == '20240110']
+    assert replaced['location_id'].tolist() == ['hanoi'] * 4 and replaced['temperature_2m'].eq(3.0).all()
+    assert len(df) == 2 * 4 * 60 - 2 * 4 * 2 + 4
+
+def test_staged_file_is_copied_into_its_month(sink, tmp_path):
+    path = tmp_path / 'staged.parquet'
+    batch('2024-03-01', '2024-03-02 18:00', 1.0).to_parquet(path, index=False)
+    sink.load_parquet(str(path), TABLE)
+    assert list(files(sink)) == ['202403']
+    assert len(rows(sink)) == 16
+
+def test_flat_files_from_before_partitioning_are_moved(sink):
+    table_dir = sink.table_dir(TABLE)
+    os.makedirs(table_dir)
+    batch('2024-01-31', '2024-02-01 18:00', 1.0).to_parquet(os.path.join(table_dir, 'part-old.parquet'), index=False)
+    assert len(rows(sink)) == 16
+    sink.load(batch('2024-02-01', '2024-02-01 18:00', 2.0), TABLE, mode='upsert', keys=KEYS)
+    assert list(files(sink)) == ['202401', '202402']
+    df = rows(sink)
+    assert len(df) == 16 and df.loc[df['date_id'] == '20240201', 'temperature_2m'].eq(2.0).all()
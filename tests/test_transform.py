@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from weather_etl.arrow import transform_hourly_table
+from weather_etl.transform import transform_daily_frame, transform_hourly_frame
+from transform_benchmark import (
+    assert_same_output, legacy_daily_transform, legacy_hourly_transform, make_daily_frame, make_hourly_frame,
+)
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_hourly_transform_matches_legacy(seed):
+    response = make_hourly_frame(240, seed)
+    # missing readings have to come out as nulls on both paths
+    response.loc[[3, 50, 200], ['precipitation', 'temperature_2m']] = np.nan
+    assert_same_output(legacy_hourly_transform(response.copy()), transform_hourly_frame(response.copy()))
+
+@pytest.mark.parametrize('target_timezone', ['UTC', 'Asia/Ho_Chi_Minh', 'America/Los_Angeles'])
+def test_daily_transform_matches_legacy(target_timezone):
+    response = make_daily_frame(60)
+    assert_same_output(
+        legacy_daily_transform(response.copy(), target_timezone),
+        transform_daily_frame(response.copy(), target_timezone),
+    )
+
+def located_frames(n_rows):
+    return pd.concat([make_hourly_frame(n_rows).assign(location_id=location_id) for location_id in ['hanoi', 'hcmc']],
+                     ignore_index=True)
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_hourly_ids_carry_no_location_in_either_mode(compact):
+    response = located_frames(48)
+    expected = response['date'].dt.strftime('%Y%m%d%H%M').tolist()
+    pandas_ids = transform_hourly_frame(response.copy(), compact)['id']
+    table = pa.Table.from_pandas(response, preserve_index=False)
+    # the arrow path gets second resolution timestamps from the SDK blocks
+    table = table.set_column(table.schema.get_field_index('date'), 'date', table['date'].cast(pa.timestamp('s', tz='UTC')))
+    arrow_ids = transform_hourly_table(table, compact)['id'].to_pylist()
+    # rows are told apart by (location_id, id), so both locations share the same hour ids
+    for ids in [pandas_ids.tolist(), arrow_ids]:
+        assert [str(value) for value in ids] == expected
+        assert isinstance(ids[0], int) == compact
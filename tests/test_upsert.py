@@ -0,0 +1,116 @@
+import json
+
+import duckdb
+import pandas as pd
+import pytest
+
+from weather_etl import daily, state
+from weather_etl.sink import create_sink
+from weather_etl.upsert import get_watermark, incremental_date_range, merge_statements, record_watermark
+
+KEYS = ['location_id', 'date_id']
+TABLE = 'p.d.daily_weather_data'
+
+def batch(start, end, value, location_ids=('hanoi', 'hcmc')):
+    dates = pd.date_range(start, end, freq='D').strftime('%Y%m%d')
+    return pd.DataFrame([
+        {'location_id': location_id, 'date_id': date_id, 'temperature_2m_max': value}
+        for location_id in location_ids for date_id in dates
+    ])
+
+def rows(sink):
+    df = sink.query('select * from daily_weather_data order by location_id, date_id')
+    assert not df.duplicated(KEYS).any()
+    return df
+
+@pytest.fixture(params=['sqlite', 'duckdb'])
+def sink(request, tmp_path):
+    return create_sink(request.param, path=str(tmp_path / f'warehouse.{request.param}'))
+
+@pytest.fixture
+def state_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(state, 'STATE_DIR', str(tmp_path / 'state'))
+    return tmp_path / 'state'
+
+def test_upsert_replaces_matched_keys_and_inserts_new_ones(sink):
+    sink.load(batch('2024-01-01', '2024-01-03', 1.0), TABLE, mode='upsert', keys=KEYS)
+    sink.load(batch('2024-01-03', '2024-01-04', 2.0, ['hanoi']), TABLE, mode='upsert', keys=KEYS)
+    df = rows(sink)
+    assert len(df) == 7
+    updated = df['location_id'].eq('hanoi') & df['date_id'].ge('20240103')
+    assert df.loc[updated, 'temperature_2m_max'].eq(2.0).all()
+    assert df.loc[~updated, 'temperature_2m_max'].eq(1.0).all()
+
+def test_upsert_keeps_the_last_row_of_a_duplicated_key(sink):
+    df = pd.concat([batch('2024-01-01', '2024-01-02', 1.0), batch('2024-01-02', '2024-01-02', 5.0)], ignore_index=True)
+    sink.load(df, TABLE, mode='upsert', keys=KEYS)
+    df = rows(sink)
+    assert len(df) == 4
+    assert df.loc[df['date_id'] == '20240102', 'temperature_2m_max'].eq(5.0).all()
+
+def test_rerunning_a_load_leaves_the_table_unchanged(sink):
+    sink.load(batch('2024-01-01', '2024-01-05', 1.0), TABLE, mode='upsert', keys=KEYS)
+    first = rows(sink)
+    sink.load(batch('2024-01-01', '2024-01-05', 1.0), TABLE, mode='upsert', keys=KEYS)
+    pd.testing.assert_frame_equal(rows(sink), first)
+
+def test_overlapping_windows_keep_the_later_load(sink):
+    sink.load(batch('2024-01-01', '2024-01-10', 1.0), TABLE, mode='upsert', keys=KEYS)
+    sink.load(batch('2024-01-08', '2024-01-15', 2.0), TABLE, mode='upsert', keys=KEYS)
+    df = rows(sink)
+    assert len(df) == 2 * 15
+    later = df['date_id'] >= '20240108'
+    assert df.loc[later, 'temperature_2m_max'].eq(2.0).all() and df.loc[~later, 'temperature_2m_max'].eq(1.0).all()
+
+def test_bigquery_merge_statement_upserts():
+    conn = duckdb.connect()
+    conn.register('first', batch('2024-01-01', '2024-01-03', 1.0))
+    conn.register('second', batch('2024-01-03', '2024-01-04', 2.0))
+    conn.execute('create table target as select * from first')
+    conn.execute('create table staging as select * from second')
+    for statement in merge_statements('target', 'staging', KEYS, ['location_id', 'date_id', 'temperature_2m_max']):
+        # BigQuery lets MERGE omit INTO and quotes with backticks, DuckDB needs both spelled out
+        conn.execute(statement.replace('merge `', 'merge into `').replace('`', '"'))
+    df = conn.execute('select * from target order by location_id, date_id').df()
+    assert len(df) == 8
+    assert df.groupby('date_id')['temperature_2m_max'].first().tolist() == [1.0, 1.0, 2.0, 2.0]
+
+def test_watermark_only_moves_forward_and_persists(state_dir):
+    assert get_watermark('daily_weather_data') is None
+    record_watermark('daily_weather_data', '20240110')
+    record_watermark('daily_weather_data', '20240105')
+    assert get_watermark('daily_weather_data') == '20240110'
+    # a later run reads it back from disk
+    assert json.loads((state_dir / 'watermarks.json').read_text()) == {'daily_weather_data': '20240110'}
+
+def test_interrupted_load_resumes_after_the_watermark(sink, state_dir):
+    date_range = {'start_date': '2024-01-01', 'end_date': '2024-01-20'}
+    # the first run only got through the 10th
+    sink.load(batch('2024-01-01', '2024-01-10', 1.0), TABLE, mode='upsert', keys=KEYS)
+    record_watermark('daily_weather_data', '20240110')
+
+    pending = incremental_date_range(date_range, get_watermark('daily_weather_data'))
+    assert pending == {'start_date': '2024-01-11', 'end_date': '2024-01-20'}
+    sink.load(batch(pending['start_date'], pending['end_date'], 1.0), TABLE, mode='upsert', keys=KEYS)
+    record_watermark('daily_weather_data', '20240120')
+
+    assert len(rows(sink)) == 2 * 20
+    assert incremental_date_range(date_range, get_watermark('daily_weather_data')) is None
+
+@pytest.mark.parametrize('location_ids', [[None], ['hanoi', 'hcmc']])
+def test_shipped_daily_table_holds_one_row_per_location_day(shipped_schema, location_ids):
+    sink = create_sink('duckdb', path=':memory:')
+    shipped_schema(sink.conn, ['daily_weather_data'])
+    df = batch('2024-01-01', '2024-01-03', 1.0, location_ids).rename(columns={'temperature_2m_max': 'daylight_duration'})
+    # single-location loads carry no location_id and merge on the date alone, like the daily pipeline
+    if location_ids == [None]:
+        df = df.drop(columns='location_id')
+    keys = daily.merge_keys(df.columns)
+    for value in [1.0, 2.0]:
+        sink.load(df.assign(daylight_duration=value), TABLE, mode='upsert', keys=keys)
+    stored = sink.query('select * from daily_weather_data order by location_id, date_id')
+    assert len(stored) == len(df) and stored['daylight_duration'].eq(2.0).all()
+    assert stored['location_id'].notna().all()
+    # a plain append of a day already loaded is rejected rather than stored twice
+    with pytest.raises(duckdb.ConstraintException):
+        sink.load(df.iloc[:1], TABLE)
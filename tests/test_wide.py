@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+from weather_etl.sink import DuckDBSink
+from weather_etl.wide import MEASURES, refresh_wide_table
+
+TABLES = {
+    'HOURLY_WEATHER_TABLE': 'hourly_weather_data',
+    'DAILY_WEATHER_TABLE': 'daily_weather_data',
+    'DATE_TABLE': 'dim_date',
+    'TIME_TABLE': 'dim_time',
+    'TIMESHIFT_TABLE': 'times_of_day',
+    'WEATHER_CODE_TABLE': 'weather_code',
+}
+WIDE_TABLE = 'p.d.wide_weather_data'
+
+@pytest.fixture
+def sink(monkeypatch, shipped_schema):
+    for env_name, name in TABLES.items():
+        monkeypatch.setenv(env_name, f'p.d.{name}')
+    sink = DuckDBSink(':memory:')
+    shipped_schema(sink.conn, [*TABLES.values(), 'wide_weather_data'])
+    dates = pd.date_range('2024-01-01', '2024-01-02', freq='D')
+    sink.conn.execute("insert into weather_code values ('00', 'Clear sky'), ('03', 'Overcast')")
+    sink.conn.execute("insert into times_of_day values ('00', 'Night'), ('01', 'Day')")
+    sink.conn.register('dates', pd.DataFrame({'id': dates.strftime('%Y%m%d'), 'date': dates.date}))
+    sink.conn.execute('insert into dim_date select id, date, year(date), quarter(date), month(date), day(date) from dates')
+    sink.conn.execute("insert into dim_time select lpad(cast(h * 100 as varchar), 4, '0'), make_time(h, 0, 0), h from range(24) t(h)")
+    return sink
+
+def load_facts(sink, location_ids):
+    periods = pd.date_range('2024-01-01', periods=48, freq='h')
+    hourly = pd.concat([pd.DataFrame({
+        'id': periods.strftime('%Y%m%d%H%M'),
+        'location_id': location_id,
+        'date_id': periods.strftime('%Y%m%d'),
+        'time_id': periods.strftime('%H%M'),
+        **{measure: float(i) for i, measure in enumerate(MEASURES)},
+        'weather_code': '03',
+        'is_day': '01',
+    }) for location_id in location_ids], ignore_index=True)
+    daily = pd.DataFrame([
+        {'location_id': location_id, 'date_id': date_id, 'weather_code': '03', 'sunrise': '06:10', 'sunset': '17:40',
+         'daylight_duration': 41400.0}
+        for location_id in location_ids for date_id in ['20240101', '20240102']
+    ])
+    # single-location loads carry no location_id, the shipped tables default it to ''
+    columns = lambda df: [col for col in df.columns if col != 'location_id' or location_ids != [None]]
+    for table, df in [('hourly_weather_data', hourly), ('daily_weather_data', daily)]:
+        sink.conn.register('rows', df[columns(df)])
+        sink.conn.execute(f'insert into {table} by name select * from rows')
+        sink.conn.unregister('rows')
+
+@pytest.mark.parametrize('location_ids', [[None], ['hanoi', 'hcmc']])
+def test_refresh_writes_into_the_shipped_wide_table(sink, location_ids):
+    load_facts(sink, location_ids)
+    with_locations = location_ids != [None]
+    for _ in range(2):
+        # a re-run replaces the same date partitions instead of adding to them
+        refresh_wide_table(sink, ['20240101', '20240102'], with_locations, WIDE_TABLE)
+    wide = sink.query('select * from wide_weather_data order by location_id, date_id, time_id')
+    assert len(wide) == 48 * len(location_ids)
+    assert wide['location_id'].tolist() == [location_id for location_id in location_ids for _ in range(48)]
+    assert (wide['quarter'] == 1).all() and (wide['month'] == 1).all() and (wide['year'] == 2024).all()
+    assert pd.to_datetime(wide['date']).dt.strftime('%Y%m%d').tolist() == wide['date_id'].tolist()
+    assert (wide['weather_code'] == 'Overcast').all() and (wide['is_day'] == 'Day').all()
+    for i, measure in enumerate(MEASURES):
+        assert (wide[measure] == i).all(), measure
+    assert (wide['sunrise'] == '06:10').all() and (wide['daylight_duration'] == 41400).all()